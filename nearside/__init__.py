@@ -20,25 +20,48 @@
 from __future__ import division
 from __future__ import print_function
 from __future__ import absolute_import
-from six.moves import range  #use range instead of xrange
 #-----------------------------------------------------------------------------
 
-import json
-import os
-from os.path import dirname
 import sys
+import importlib
 
+from nearside._pkg_info import info as _info
 
-import nearside.probe as probe
-from nearside.spherical.structures import *
+__version__ = _info['version']
+__author__ = _info['author']
 
+# The subpackages, and the structures that used to be imported here, are 
+# loaded the first time they are accessed (PEP 562). A plain 'import nearside'
+# doesn't import numpy or spherepy.
 
-with open(dirname(__file__) + '/pkg_info.json') as fp:
-    _info = json.load(fp)
+_submodules = ['probe', 'file_handler', 'spherical', 'planar', 'cylindrical',
+               'pipeline', 'cache', 'checkpoint', 'service', 'cli']
 
-__version__ = _info['version']
-__author__ = _info['author']
+_structures = ['SphericalScalarCoeffs',
+               'SphericalVectorCoeffs',
+               'VectorCoefsStack',
+               'ChannelCoefs',
+               'stack_coefs',
+               'SphericalMeasurementScalarUniform',
+               'SphericalMeasurementTransverseUniform',
+               'SphericalMeasurementScalarNonUniform',
+               'SphericalMeasurementTransverseNonUniform']
+
+def __getattr__(name):
+
+    if name in _submodules:
+        return importlib.import_module('nearside.' + name)
 
+    elif name in _structures:
+        structures = importlib.import_module('nearside.spherical.structures')
+        return getattr(structures, name)
 
+    raise AttributeError("module 'nearside' has no attribute '%s'" % name)
 
+def __dir__():
+    return sorted(set(globals()) | set(_submodules) | set(_structures))
 
+if sys.version_info < (3, 7):
+    # Module level __getattr__ isn't supported, import everything up front.
+    import nearside.probe as probe
+    from nearside.spherical.structures import *
@@ -0,0 +1,93 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+               _lazy: defer importing modules until they are used
+
+Each NearSide measurement file is usually processed in a fresh interpreter,
+so import time matters. lazy_module returns a module object whose import is
+deferred until one of its attributes is first accessed.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+#-----------------------------------------------------------------------------
+
+#---------------------------------------------------------------------Built-ins
+import sys
+import importlib
+
+#==============================================================================
+# Functions
+#==============================================================================
+
+def lazy_module(name):
+    """Return the module *name* without executing it. The module is executed
+    the first time one of its attributes is accessed. If the module has 
+    already been imported, it is simply returned. On interpreters without
+    importlib.util.LazyLoader the module is imported right away."""
+
+    if name in sys.modules:
+        return sys.modules[name]
+
+    try:
+        from importlib.util import find_spec, module_from_spec, LazyLoader
+    except ImportError:
+        return importlib.import_module(name)
+
+    spec = find_spec(name)
+    if spec is None:
+        # let the normal machinery raise the ImportError
+        return importlib.import_module(name)
+
+    spec.loader = LazyLoader(spec.loader)
+    module = module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+
+    return module
+
+def lazy_exports(package, submodules, exports, default):
+    """Return the PEP 562 module __getattr__ and __dir__ of the package 
+    *package*. The names in *submodules* are imported as submodules, a name 
+    of the dict *exports* is taken from the submodule it maps to and any 
+    other name from the submodule *default*. Nothing is imported before an
+    attribute is first accessed."""
+
+    def __getattr__(name):
+
+        if name in submodules:
+            return importlib.import_module(package + '.' + name)
+
+        if not name.startswith('__'):
+            module = importlib.import_module(package + '.' + 
+                                             exports.get(name, default))
+            if hasattr(module, name):
+                return getattr(module, name)
+
+        raise AttributeError("module '%s' has no attribute '%s'" % 
+                             (package, name))
+
+    def __dir__():
+        names = set(sys.modules[package].__dict__)
+        return sorted(names | set(submodules) | set(exports))
+
+    return (__getattr__, __dir__)
@@ -0,0 +1,26 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""Package information. This is kept in a Python module, rather than a data
+file, so that the version can be looked up at import time without opening 
+and parsing a file. setup.py reads this file as well."""
+
+info = {"version": "0.0.1",
+        "download_url": "https://github.com/rdireen/nearside/tarball/0.0.1",
+        "author": "Randy Direen",
+        "email": "nearside@direentech.com"
+       }
@@ -0,0 +1,343 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+            cache: memoization of whole processing stages
+
+A StageCache keeps the results of stages (transforms, probe translations,
+probe corrections, ...) under a content hash of their input arrays and
+parameters. Recent results are held in memory, least recently used first
+out, and every result is also written to an optional directory that is
+shared by processes and runs. Reprocessing the same raw files with only
+downstream settings changed turns the upstream stages into cache hits.
+
+    >>> cache = nearside.cache.StageCache(path = 'stage_cache')
+    >>> translate = cache.wrap(nearside.spherical.translate_symmetric_probe)
+    >>> R = translate(60, probe, 27.0)     # computed
+    >>> R = translate(60, probe, 27.0)     # from memory
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#---------------------------------------------------------------------Built-ins
+import collections
+import functools
+import json
+import numbers
+import os
+import tempfile
+import threading
+
+#---------------------------------------------------------------------3rd Party
+import numpy as np
+import six
+
+#------------------------------------------------------------------------Custom
+from nearside.checkpoint import content_hash, replace_file
+
+#==============================================================================
+# Functions
+#==============================================================================
+
+def _describe(value, items):
+    """JSON description of the stage argument *value*. Its arrays are 
+    appended to *items*, which are hashed by content. Raises TypeError for
+    arguments that can't be hashed by content."""
+
+    if value is None or isinstance(value, (bool,) + six.string_types):
+        return value
+    elif isinstance(value, numbers.Integral):
+        return int(value)
+    elif isinstance(value, numbers.Real):
+        return float(value)
+    elif isinstance(value, numbers.Complex):
+        return ['complex', value.real, value.imag]
+    elif isinstance(value, np.ndarray):
+        items.append(value)
+        return ['array', len(items) - 1]
+    elif hasattr(value, 'scoef1'):
+        items.extend([value.scoef1._vec, value.scoef2._vec])
+        return ['VectorCoefs', value.nmax, value.mmax, len(items) - 2]
+    elif hasattr(value, 'vec1'):
+        # VectorCoefsStack, or SymmetricCoefs with their symmetry
+        items.extend([value.vec1, value.vec2])
+        return [type(value).__name__, value.nmax, value.mmax, 
+                repr(getattr(value, 'symmetry', None)), len(items) - 2]
+    elif hasattr(value, 'u') and hasattr(value, 'mumax'):
+        items.append(value.u)
+        return ['ChannelCoefs', value.nmax, value.mmax, len(items) - 1]
+    elif isinstance(value, (list, tuple)):
+        return [type(value).__name__, [_describe(v, items) for v in value]]
+    elif isinstance(value, dict):
+        pairs = [(_describe(k, items), v) for (k, v) in value.items()]
+        pairs.sort(key=lambda p: json.dumps(p[0], sort_keys=True))
+        return ['dict', [[k, _describe(v, items)] for (k, v) in pairs]]
+    else:
+        raise TypeError("the stage cache can't hash an argument of type " +
+                        type(value).__name__)
+
+def stage_key(name, args, kwargs):
+    """Content hash of a call of the stage *name*. Arrays and coefficients
+    (also inside lists, tuples and dicts) are hashed by content, numbers, 
+    strings and None by value.
+
+    Raises:
+      TypeError: Is raised for an argument of any other type.
+
+    """
+
+    items = []
+    described = [_describe(a, items) for a in args]
+    named = dict((k, _describe(kwargs[k], items)) for k in sorted(kwargs))
+
+    return content_hash(*items, stage=name, args=described, kwargs=named)
+
+def _nbytes(value):
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    elif hasattr(value, 'scoef1'):
+        return value.scoef1._vec.nbytes + value.scoef2._vec.nbytes
+    elif hasattr(value, 'vec1'):
+        return value.vec1.nbytes + value.vec2.nbytes
+    elif hasattr(value, 'u') and hasattr(value, 'mumax'):
+        return value.u.nbytes
+    else:
+        return 0
+
+def _encode(value):
+    """The arrays that are written to the disk tier, None for results that
+    are only kept in memory."""
+
+    if isinstance(value, np.ndarray):
+        return {'kind': 'array', 'a': value}
+    elif hasattr(value, 'scoef1'):
+        return {'kind': 'vcoefs', 'vec1': value.scoef1._vec,
+                'vec2': value.scoef2._vec,
+                'orders': [value.nmax, value.mmax]}
+    elif hasattr(value, 'symmetry'):
+        # SymmetricCoefs, m = -1 stands for any m
+        sym = value.symmetry
+        return {'kind': 'symmetric', 'vec1': value.vec1, 'vec2': value.vec2,
+                'orders': [value.nmax, value.mmax],
+                'symmetry': [sym.xz, sym.yz, -1 if sym.m is None else sym.m]}
+    elif hasattr(value, 'vec1'):
+        return {'kind': 'stack', 'vec1': value.vec1, 'vec2': value.vec2,
+                'orders': [value.nmax, value.mmax]}
+    else:
+        return None
+
+def _decode(arrays):
+
+    kind = str(arrays['kind'])
+    if kind == 'array':
+        return arrays['a']
+
+    (nmax, mmax) = [int(v) for v in arrays['orders']]
+    if kind == 'vcoefs':
+        import spherepy as sp
+        return sp.VectorCoefs(arrays['vec1'], arrays['vec2'], nmax, mmax)
+    elif kind == 'symmetric':
+        from nearside.spherical.symmetry import Symmetry, SymmetricCoefs
+        (xz, yz, m) = [int(v) for v in arrays['symmetry']]
+        sym = Symmetry(xz, yz, None if m < 0 else m)
+        return SymmetricCoefs(arrays['vec1'], arrays['vec2'], nmax, mmax, 
+                              sym)
+    else:
+        from nearside.spherical.structures import VectorCoefsStack
+        return VectorCoefsStack(arrays['vec1'], arrays['vec2'], nmax, mmax)
+
+#==============================================================================
+# Objects
+#==============================================================================
+
+class StageCache(object):
+    """Two-tier cache of stage results.
+
+    Args:
+      memory_bytes (int, optional): Size of the in-memory tier; the least
+      recently used results are dropped beyond it.
+
+      path (str, optional): Directory of the disk tier, none by default.
+      Results that are arrays, VectorCoefs, VectorCoefsStack or 
+      SymmetricCoefs objects are written there as .npz files.
+
+      disk_bytes (int, optional): Size of the disk tier; the files that
+      were least recently used are removed beyond it.
+
+    """
+    def __init__(self, memory_bytes=1 << 28, path=None, disk_bytes=1 << 34):
+
+        if path is not None and not os.path.isdir(path):
+            os.makedirs(path)
+
+        self._memory_bytes = memory_bytes
+        self._path = path
+        self._disk_bytes = disk_bytes
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # a copy sent to a worker process only shares the disk tier
+        return {'memory_bytes': self._memory_bytes, 'path': self._path,
+                'disk_bytes': self._disk_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state['memory_bytes'], state['path'],
+                      state['disk_bytes'])
+
+    def __repr__(self):
+        return ("StageCache(entries = {0}, memory = {1} bytes, " +
+                "path = {2})").format(len(self._entries), self._size,
+                                      self._path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def path(self):
+        """Directory of the disk tier (None without one)."""
+        return self._path
+
+    def _file(self, key):
+        return os.path.join(self._path, key + '.npz')
+
+    def get(self, key):
+        """The result filed under *key*, None if there is none."""
+
+        with self._lock:
+            if key in self._entries:
+                # OrderedDict.move_to_end is missing on Python 2.7
+                entry = self._entries.pop(key)
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[0]
+
+        if self._path is not None:
+            try:
+                with np.load(self._file(key)) as f:
+                    value = _decode(f)
+                os.utime(self._file(key), None)
+            except (IOError, OSError, KeyError, ValueError):
+                value = None
+            if value is not None:
+                self._remember(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """Files *value* under *key* in both tiers."""
+
+        self._remember(key, value)
+
+        arrays = _encode(value)
+        if self._path is not None and arrays is not None:
+            (fd, tmp) = tempfile.mkstemp(suffix='.tmp', dir=self._path)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, **arrays)
+                replace_file(tmp, self._file(key))
+            except BaseException:
+                os.remove(tmp)
+                raise
+            self._evict_disk()
+
+    def _remember(self, key, value):
+
+        n = _nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            if n > self._memory_bytes:
+                return
+            self._entries[key] = (value, n)
+            self._size += n
+            while self._size > self._memory_bytes:
+                (_, (_, m)) = self._entries.popitem(last=False)
+                self._size -= m
+
+    def _evict_disk(self):
+        """Removes the least recently used files beyond disk_bytes."""
+
+        files = []
+        for name in os.listdir(self._path):
+            if name.endswith('.npz'):
+                p = os.path.join(self._path, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, p))
+
+        total = sum(f[1] for f in files)
+        for (_, size, p) in sorted(files):
+            if total <= self._disk_bytes:
+                break
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Empties the memory tier (the disk tier is kept)."""
+
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def call(self, name, function, *args, **kwargs):
+        """Returns function(*args, **kwargs), from the cache if a call of
+        the stage *name* with the same inputs was seen before. The inputs 
+        are keyed with stage_key, which raises TypeError for arguments that
+        can't be hashed by content."""
+
+        key = stage_key(name, args, kwargs)
+        value = self.get(key)
+        if value is None:
+            value = function(*args, **kwargs)
+            self.put(key, value)
+
+        return value
+
+    def wrap(self, function, name=None):
+        """*function* with its results cached under the stage *name* (the
+        module and name of the function by default)."""
+
+        if name is None:
+            name = function.__module__ + '.' + function.__name__
+
+        @functools.wraps(function)
+        def cached(*args, **kwargs):
+            return self.call(name, function, *args, **kwargs)
+
+        return cached
@@ -0,0 +1,164 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+          checkpoint: record finished work of long processing runs
+
+A Checkpoint is a directory of the products of finished frequencies (the
+translated probe data R and the corrected coefficients), each filed under a
+content hash of everything it was computed from. A run that restarts with
+the same checkpoint skips the frequencies whose inputs are unchanged and
+recomputes the ones whose export, probe or settings changed.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#---------------------------------------------------------------------Built-ins
+import hashlib
+import json
+import os
+import tempfile
+
+#---------------------------------------------------------------------3rd Party
+import numpy as np
+
+#==============================================================================
+# Functions
+#==============================================================================
+
+def content_hash(*items, **params):
+    """sha1 hex digest of *items* (arrays, VectorCoefs or VectorCoefsStack,
+    names of files or of directories, whose contents are hashed) and of the
+    keyword arguments *params* (any JSON values)."""
+
+    h = hashlib.sha1()
+    for item in items:
+        _update(h, item)
+    h.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+
+    return h.hexdigest()
+
+def replace_file(src, dst):
+    """Renames *src* to *dst*, replacing *dst*. os.replace (Python 3.3+) is
+    atomic; before 3.3 os.rename is used, which is atomic on POSIX but on
+    Windows needs *dst* removed first."""
+
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    elif os.name == 'nt':
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+    else:
+        os.rename(src, dst)
+
+def _update(h, item):
+
+    from nearside import file_handler
+
+    if hasattr(item, 'scoef1'):
+        item = (item.scoef1._vec, item.scoef2._vec)
+    elif hasattr(item, 'vec1'):
+        item = (item.vec1, item.vec2)
+
+    if isinstance(item, (tuple, list)):
+        for i in item:
+            _update(h, i)
+    elif isinstance(item, str) and os.path.isdir(item):
+        for name in sorted(os.listdir(item)):
+            h.update(name.encode('utf-8'))
+            _update(h, os.path.join(item, name))
+    elif isinstance(item, str):
+        with open(item, 'rb') as f:
+            while True:
+                b = f.read(file_handler.block_size)
+                if not b:
+                    break
+                h.update(b)
+    else:
+        a = np.ascontiguousarray(item)
+        h.update(str((a.dtype.str, a.shape)).encode('utf-8'))
+        h.update(a.tobytes())
+
+#==============================================================================
+# Objects
+#==============================================================================
+
+class Checkpoint(object):
+    """Products of finished work in the directory *path* (created if
+    needed). Every product is written to a temporary file and renamed, so
+    a run that is killed never leaves a partial entry.
+
+    Example::
+
+        >>> stats = nearside.pipeline.run(files, 'probe', 3.0, 'results',
+        ...                               checkpoint = 'run.ckpt')
+
+    """
+    def __init__(self, path):
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._path = path
+
+    @property
+    def path(self):
+        """The directory of the checkpoint."""
+        return self._path
+
+    def __repr__(self):
+        return "Checkpoint('{0}')".format(self._path)
+
+    def _file(self, kind, key):
+        return os.path.join(self._path, kind + '_' + key + '.npz')
+
+    def has(self, kind, key):
+        """True if the product *kind* (e.g. 'R') of *key* is recorded."""
+        return os.path.exists(self._file(kind, key))
+
+    def load(self, kind, key):
+        """The dict of arrays saved for *kind* and *key*, None if there is
+        none."""
+
+        try:
+            with np.load(self._file(kind, key)) as f:
+                return dict((k, f[k]) for k in f.files)
+        except IOError:
+            return None
+
+    def save(self, kind, key, **arrays):
+        """Records the arrays of the product *kind* of *key*."""
+
+        (fd, tmp) = tempfile.mkstemp(suffix='.npz', dir=self._path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            replace_file(tmp, self._file(kind, key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def mark(self, kind, key):
+        """Records that the step *kind* of *key* is done."""
+        self.save(kind, key)
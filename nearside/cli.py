@@ -0,0 +1,152 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+                 cli: the nearside command line program
+
+    nearside process scan/*.txt --probe probe --radius 3.0 --output results
+                     --jobs 8
+    nearside serve chambers.json --jobs 16
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#---------------------------------------------------------------------Built-ins
+import argparse
+import sys
+
+#==============================================================================
+# Functions
+#==============================================================================
+
+def _read_options(args):
+
+    return {'data_format': args.data_format,
+            'phase_unit': args.phase_unit,
+            'amplitude_unit': args.amplitude_unit,
+            'angle_unit': args.angle_unit}
+
+def _add_read_arguments(parser):
+
+    parser.add_argument('--data-format', default='real_imag',
+                        choices=['real_imag', 'amplitude_phase'],
+                        help='how the complex columns are stored')
+    parser.add_argument('--phase-unit', default='deg', choices=['deg', 'rad'])
+    parser.add_argument('--amplitude-unit', default='linear',
+                        choices=['linear', 'db'])
+    parser.add_argument('--angle-unit', default='deg', choices=['deg', 'rad'],
+                        help='unit of the theta and phi columns')
+
+def _process(args):
+
+    from nearside import pipeline
+
+    stats = pipeline.run(args.files, args.probe, args.radius, args.output,
+                         nmax=args.nmax, mmax=args.mmax, jobs=args.jobs,
+                         read_options=_read_options(args),
+                         checkpoint=args.checkpoint, cache=args.cache)
+    print(pipeline.throughput(stats))
+    if stats['skipped']:
+        print('{0} of {1} files loaded from the checkpoint'.format(
+              stats['skipped'], stats['files']))
+
+    return 0
+
+def _serve(args):
+
+    if sys.version_info < (3, 7):
+        print('nearside serve needs Python 3.7 or later', file=sys.stderr)
+        return 2
+
+    import asyncio
+    import logging
+    from nearside import service
+
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(message)s')
+    s = service.Service(service.chambers_from_config(args.config),
+                        jobs=args.jobs, poll=args.poll)
+    try:
+        asyncio.run(s.drain() if args.drain else s.run())
+    except KeyboardInterrupt:
+        pass
+
+    for (name, st) in s.stats.items():
+        print('{0}: {1} files, {2} failed'.format(name, st['files'],
+                                                   st['failed']))
+
+    return 0
+
+def parser():
+    """The argparse.ArgumentParser of the nearside program."""
+
+    p = argparse.ArgumentParser(prog='nearside',
+                                description='Antenna near-field processing.')
+    sub = p.add_subparsers(dest='command')
+    sub.required = True
+
+    s = sub.add_parser('process', help='probe correct spherical scans, ' +
+                       'one export per frequency')
+    s.add_argument('files', nargs='+', help='the exports')
+    s.add_argument('--probe', required=True,
+                   help='probe coefficient store')
+    s.add_argument('--radius', required=True, type=float,
+                   help='radius of the measurement sphere (m)')
+    s.add_argument('--output', required=True,
+                   help='result store, appended to if it exists')
+    s.add_argument('--nmax', type=int, default=None)
+    s.add_argument('--mmax', type=int, default=None)
+    s.add_argument('--jobs', '-j', type=int, default=1,
+                   help='number of worker processes')
+    s.add_argument('--checkpoint', default=None,
+                   help='directory recording finished frequencies, a ' +
+                   'rerun skips them')
+    s.add_argument('--cache', default=None,
+                   help='directory of the stage cache shared by runs')
+    _add_read_arguments(s)
+    s.set_defaults(func=_process)
+
+    s = sub.add_parser('serve', help='process the exports of several ' +
+                       'chambers as they arrive')
+    s.add_argument('config', help='JSON list of chambers (the arguments ' +
+                   'of nearside.service.Chamber)')
+    s.add_argument('--jobs', '-j', type=int, default=None,
+                   help='number of worker processes, all CPUs by default')
+    s.add_argument('--poll', type=float, default=1.0,
+                   help='seconds between directory checks')
+    s.add_argument('--drain', action='store_true',
+                   help='process the files that are there and exit')
+    s.set_defaults(func=_serve)
+
+    return p
+
+def main(argv=None):
+    """Entry point of the nearside console script."""
+
+    args = parser().parse_args(argv)
+
+    return args.func(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
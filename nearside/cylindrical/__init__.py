@@ -23,7 +23,17 @@ from __future__ import absolute_import
 from six.moves import range  #use range instead of xrange
 #-----------------------------------------------------------------------------
 
-import json
-import os
-from os.path import dirname
-import sys
\ No newline at end of file
+import sys
+
+from nearside._lazy import lazy_exports
+
+# The operations are imported the first time they are accessed (PEP 562).
+
+_submodules = ['structures', 'standard_operations']
+
+(__getattr__, __dir__) = lazy_exports(__name__, _submodules, {},
+                                      'standard_operations')
+
+if sys.version_info < (3, 7):
+    # Module level __getattr__ isn't supported, import everything up front.
+    from nearside.cylindrical.standard_operations import *
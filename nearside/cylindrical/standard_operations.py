@@ -0,0 +1,155 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+   cylindrical_standard_operations: mode spectrum of cylindrical scans
+
+The cylindrical mode spectrum 
+c_n(h) = 1 / 2pi int int E(phi, z) exp(-1j (n phi + h z)) dphi dz of a scan
+on arbitrary points, e.g. a continuous helical scan, is evaluated directly
+with a type 1 non-uniform FFT in (phi, z), see nearside.planar.low_level.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#--------------------------------------------------------------------3rd Party
+import numpy as np
+
+#------------------------------------------------------------------------Custom
+from nearside.planar import low_level as nufft
+from .structures import CylindricalMeasurementTransverseNonUniform
+
+#=============================================================================
+# Global Declarations
+#=============================================================================
+
+gaussian = nufft.gaussian
+kaiser_bessel = nufft.kaiser_bessel
+
+#=============================================================================
+# Operations
+#=============================================================================
+
+def helical_points( nturns, samples_per_turn, pitch, z0 = 0.0 ):
+    """The points and quadrature weights of a continuous helical scan that
+    starts at phi = 0, z = z0 and advances *pitch* in z per turn.
+
+    Example::
+
+        >>> (phi, z, w) = nearside.cylindrical.helical_points(40, 360,
+        ...                                                   0.25 * lam)
+
+    Args:
+      nturns (float): Number of turns.
+
+      samples_per_turn (int): Samples taken during each turn.
+
+      pitch (float): Advance in z per turn.
+
+      z0 (float, optional): z of the first sample.
+
+    Returns:
+      tuple: (phi, z, weights). Every sample represents the area 
+      2 pi pitch / samples_per_turn of the (phi, z) plane.
+
+    """
+
+    j = np.arange( int( round( nturns * samples_per_turn ) ) )
+    phi = (2.0 * np.pi * j / samples_per_turn) % (2.0 * np.pi)
+    z = z0 + pitch * j / samples_per_turn
+    w = np.full( len( j ), 2.0 * np.pi * pitch / samples_per_turn )
+
+    return (phi, z, w)
+
+def cylindrical_mode_spectrum( measurement, nmax, hmax, dh = None,
+                               eps = 1e-10, kernel = kaiser_bessel ):
+    """Computes the cylindrical mode spectrum of a non-uniform cylindrical
+    scan for the modes n = -nmax..nmax and h = dh * (-M / 2 .. M / 2 - 1)
+    covering [-hmax, hmax).
+
+    phi is the periodic variable of the transform as it is and z is 
+    scaled by dh around the centre of the scan, so the samples are spread
+    onto the oversampled grid, transformed with one FFT and deconvolved.
+    The spreading kernels are cached per scan geometry: both components and
+    every frequency that uses the same hmax and dh reuse them, so pass the
+    largest k of a sweep as hmax.
+
+    Example::
+
+        >>> (n, h, c) = nearside.cylindrical.cylindrical_mode_spectrum(
+        ...                                              m, 60, k_max)
+        >>> (cphi, cz) = c
+
+    Args:
+      measurement (CylindricalMeasurementTransverseNonUniform): The scan.
+
+      nmax (int): Largest abs(n).
+
+      hmax (float): Largest abs(h), usually k.
+
+      dh (float, optional): Spacing of h. The default (and largest 
+      allowed) is 2 pi / L, with L the length of the scan in z.
+
+      eps (float, optional): Relative accuracy of the transform.
+
+      kernel (str, optional): kaiser_bessel or gaussian.
+
+    Returns:
+      tuple: (n, h, c). c has shape (2, ..., 2 nmax + 1, len(h)) for the 
+      phi and z components.
+
+    Raises:
+      TypeError: Is raised if measurement isn't a 
+      CylindricalMeasurementTransverseNonUniform object.
+
+      ValueError: Is raised if dh is too large for the length of the scan.
+
+    """
+
+    if not isinstance( measurement, CylindricalMeasurementTransverseNonUniform ):
+        raise TypeError("measurement must be a " +
+                        "CylindricalMeasurementTransverseNonUniform")
+
+    z = measurement.z
+    zc = (np.max( z ) + np.min( z )) / 2.0
+    half = max( (np.max( z ) - np.min( z )) / 2.0, 1e-300 )
+    if dh is None:
+        dh = np.pi / half
+    elif dh * half > np.pi * (1 + 1e-12):
+        raise ValueError("dh must not be larger than 2 pi / L")
+
+    M = 2 * int( np.ceil( hmax / dh ) )
+    plan = nufft.nufft_plan( measurement.phi, dh * (z - zc),
+                             (2 * nmax + 1, M), eps, kernel )
+
+    data = np.stack( [measurement.ephi, measurement.ez] )
+    c = plan.type1( measurement.weights * data ) / (2.0 * np.pi)
+
+    n = np.arange( -nmax, nmax + 1 )
+    h = dh * np.arange( -(M // 2), M - M // 2 )
+
+    # back to the origin z = 0
+    c *= np.exp( -1j * h * zc )
+
+    return (n, h, c)
@@ -33,24 +33,23 @@ from __future__ import absolute_import
 from six.moves import range  #use range instead of xrange
 #-----------------------------------------------------------------------------
 
-#---------------------------------------------------------------------Built-ins
-
-import json
-from os.path import dirname
-
 #--------------------------------------------------------------------3rd Party
 import numpy as np
-import spherepy as sp
 
 #------------------------------------------------------------------------Custom
+from nearside._lazy import lazy_module
 import nearside.probe as pb
 
+sp = lazy_module('spherepy')
+
 #==============================================================================
 # Global Declarations
 #==============================================================================
 
 
 err_msg = {}
+err_msg['nu_size'] = "phi, z, the weights and the samples (along the " + \
+                     "last axis) must have the same length"
 
 
 #=============================================================================
@@ -85,4 +84,51 @@ class CylindricalMeasurementScalarNonUniform(object):
     pass
 
 class CylindricalMeasurementTransverseNonUniform(object):
-    pass
\ No newline at end of file
+    """Holds the two transverse components (ephi, ez) of a cylindrical
+    measurement taken at arbitrary points (phi, z) of the scan cylinder,
+    e.g. the samples of a continuous helical scan (see helical_points). 
+    *weights* are the (phi, z) areas that the samples represent. The 
+    samples may be stacked along leading axes (e.g. frequency); the points
+    are along the last axis.
+    """
+    def __init__(self, phi, z, ephi, ez, weights):
+
+        self._phi = np.asarray(phi, dtype=np.float64).ravel()
+        self._z = np.asarray(z, dtype=np.float64).ravel()
+        self._weights = np.asarray(weights, dtype=np.float64).ravel()
+        self._ephi = np.asarray(ephi)
+        self._ez = np.asarray(ez)
+
+        J = len(self._phi)
+        if (len(self._z) != J or len(self._weights) != J or 
+            self._ephi.shape != self._ez.shape or
+            self._ephi.ndim == 0 or self._ephi.shape[-1] != J):
+            raise ValueError(err_msg['nu_size'])
+
+    @property
+    def phi(self):
+        """phi of the sample points."""
+        return self._phi
+
+    @property
+    def z(self):
+        """z of the sample points."""
+        return self._z
+
+    @property
+    def weights(self):
+        """The (phi, z) area represented by each sample."""
+        return self._weights
+
+    @property
+    def ephi(self):
+        """The measured phi component."""
+        return self._ephi
+
+    @property
+    def ez(self):
+        """The measured z component."""
+        return self._ez
+
+    def __len__(self):
+        return len(self._phi)
\ No newline at end of file
@@ -33,21 +33,636 @@ from __future__ import absolute_import
 from six.moves import range  #use range instead of xrange
 #-----------------------------------------------------------------------------
 
+#---------------------------------------------------------------------Built-ins
+import json
+import multiprocessing
+import os
+import warnings
+import zlib
+
 #---------------------------------------------------------------------3rd Party
 import numpy as np
 
+#==============================================================================
+# Global Declarations
+#==============================================================================
+
+# Formats of the complex columns
+real_imag = 'real_imag'
+amplitude_phase = 'amplitude_phase'
+
+# Bytes parsed at a time
+block_size = 1 << 25
+
+_comment_chars = '#!%;'
+
+# Files of a CoefficientStore directory
+_store_header = 'header.json'
+_store_index = 'index.bin'
+_store_data = 'chunks.bin'
+_store_frequencies = 'frequencies.bin'
+
 #==============================================================================
 # Functions
 #==============================================================================
 
-def read_planar_measurement(filename):
-    pass
+def _is_numeric(text):
+    try:
+        [float(t) for t in text.split()]
+        return True
+    except ValueError:
+        return False
+
+def _header_value(text):
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+def read_ascii_header(filename):
+    """Reads the header block of a whitespace separated ASCII export. The 
+    header ends at the first line that holds only numbers. Header lines of 
+    the form 'key: value' or 'key = value' (optionally behind a comment 
+    character) are returned in a dict with lower case keys; numeric values 
+    are converted to float.
+
+    Returns:
+      tuple: (header, offset), offset is the byte position of the data.
+    """
+
+    header = {}
+    offset = 0
+
+    with open(filename, 'rb') as f:
+        for line in f:
+            text = line.decode('latin-1').strip()
+            if text and _is_numeric(text):
+                break
+            offset += len(line)
+
+            text = text.lstrip(_comment_chars).strip()
+            for sep in (':', '='):
+                if sep in text:
+                    (key, value) = text.split(sep, 1)
+                    header[key.strip().lower()] = _header_value(value.strip())
+                    break
+
+    return (header, offset)
+
+def _count_lines(filename, offset):
+    """Upper bound of the number of data rows, counted in large blocks."""
+
+    n = 0
+    last = b'\n'
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        while True:
+            b = f.read(block_size)
+            if not b:
+                break
+            n += b.count(b'\n')
+            last = b[-1:]
+    if last != b'\n':
+        n += 1
+
+    return n
+
+def _parse_block(text):
+    """Parses the complete lines *text* into a 2D array. Comment and blank
+    lines are skipped; a line with a different number of values than the
+    others, or with a value that isn't a number, raises a ValueError. 
+    Returns None if there are no data lines."""
+
+    with warnings.catch_warnings():
+        # a block of only comment lines is not an error
+        warnings.simplefilter('ignore', UserWarning)
+        v = np.loadtxt(text.splitlines(), dtype=np.float64, 
+                       comments=list(_comment_chars), ndmin=2)
+
+    if v.size == 0:
+        return None
+
+    return v
+
+def read_ascii_columns(filename, columns, data_format=real_imag, 
+                       phase_unit='deg', amplitude_unit='linear'):
+    """Reads the numeric block of a whitespace separated ASCII export.
+
+    The file is parsed in blocks of *block_size* bytes by numpy's loadtxt
+    into arrays that are allocated up front, so multi-GB files are read 
+    without going through Python line by line. Comment lines (starting with
+    one of #!%;) and blank lines in the data are skipped.
+
+    Example::
+
+        >>> (h, d) = nearside.file_handler.read_ascii_columns('scan.txt',
+        ...               {'x': 0, 'y': 1, 'ex': (2, 3), 'ey': (4, 5)},
+        ...               nearside.file_handler.amplitude_phase, 
+        ...               amplitude_unit = 'db')
+
+    Args:
+      filename (str): The file.
+
+      columns (dict): Maps names to a column index (a real array) or to a
+      pair of column indices (a complex array).
+
+      data_format (str, optional): real_imag or amplitude_phase, how the
+      pairs are stored.
+
+      phase_unit (str, optional): 'deg' or 'rad'.
+
+      amplitude_unit (str, optional): 'linear' or 'db' (20 log10).
+
+    Returns:
+      tuple: (header, data), see read_ascii_header. data maps the names of
+      *columns* to the arrays.
+
+    Raises:
+      ValueError: Is raised if a data line has the wrong number of values
+      or an option isn't known.
+
+    """
+
+    if data_format not in (real_imag, amplitude_phase):
+        raise ValueError("data_format must be real_imag or amplitude_phase")
+    if phase_unit not in ('deg', 'rad'):
+        raise ValueError("phase_unit must be 'deg' or 'rad'")
+    if amplitude_unit not in ('linear', 'db'):
+        raise ValueError("amplitude_unit must be 'linear' or 'db'")
+
+    (header, offset) = read_ascii_header(filename)
+    nrows = _count_lines(filename, offset)
+
+    data = {}
+    for (name, col) in columns.items():
+        if np.isscalar(col):
+            data[name] = np.empty(nrows, dtype=np.float64)
+        else:
+            data[name] = np.empty(nrows, dtype=np.complex128)
+
+    ncols = None
+    row = 0
+    rest = b''
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        while True:
+            b = f.read(block_size)
+            if b:
+                b = rest + b
+                cut = b.rfind(b'\n') + 1
+                (b, rest) = (b[:cut], b[cut:])
+            else:
+                (b, rest) = (rest, b'')
+            if not b:
+                if not rest:
+                    break
+                continue
+
+            v = _parse_block(b.decode('latin-1'))
+            if v is None:
+                continue
+            if ncols is None:
+                ncols = v.shape[1]
+            elif v.shape[1] != ncols:
+                raise ValueError("every data line must have " + 
+                                 str(ncols) + " values")
+            n = len(v)
+
+            for (name, col) in columns.items():
+                out = data[name][row:row + n]
+                if np.isscalar(col):
+                    out[:] = v[:, col]
+                elif data_format == real_imag:
+                    out.real = v[:, col[0]]
+                    out.imag = v[:, col[1]]
+                else:
+                    a = v[:, col[0]]
+                    p = v[:, col[1]]
+                    if amplitude_unit == 'db':
+                        a = 10.0 ** (a / 20.0)
+                    if phase_unit == 'deg':
+                        p = np.radians(p)
+                    out[:] = a * np.exp(1j * p)
+            row += n
+
+    for name in data:
+        data[name] = data[name][:row]
+
+    return (header, data)
+
+def read_ascii_files(filenames, columns, data_format=real_imag, 
+                     phase_unit='deg', amplitude_unit='linear', 
+                     threads=None):
+    """Reads several exports (e.g. one per frequency or polarization) with 
+    read_ascii_columns in a pool of *threads* threads (one per file, up to
+    the number of CPUs, by default). Returns the list of (header, data) in 
+    the order of *filenames*."""
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    filenames = list(filenames)
+    if threads is None:
+        threads = min(len(filenames), multiprocessing.cpu_count())
+
+    def read(name):
+        return read_ascii_columns(name, columns, data_format, phase_unit,
+                                  amplitude_unit)
+
+    with ThreadPoolExecutor(max_workers=max(threads, 1)) as pool:
+        return list(pool.map(read, filenames))
+
+def read_planar_measurement(filename, columns=None, data_format=real_imag,
+                            phase_unit='deg', amplitude_unit='linear'):
+    """Reads a planar export into a PlanarMeasurementTransverseNonUniform.
+
+    The default columns are x, y, ex (two columns), ey (two columns). A 
+    'w' column holds the quadrature weights; without it the points must 
+    form a rectangular grid, whose cell area is used.
+    """
+
+    from nearside.planar.structures import \
+                                PlanarMeasurementTransverseNonUniform
+
+    if columns is None:
+        columns = {'x': 0, 'y': 1, 'ex': (2, 3), 'ey': (4, 5)}
+
+    (header, d) = read_ascii_columns(filename, columns, data_format, 
+                                     phase_unit, amplitude_unit)
+
+    if 'w' in d:
+        w = d['w']
+    else:
+        ux = np.unique(d['x'])
+        uy = np.unique(d['y'])
+        if len(ux) * len(uy) != len(d['x']) or len(ux) < 2 or len(uy) < 2:
+            raise ValueError("the points aren't a rectangular grid, " + 
+                             "a 'w' column is needed")
+        w = np.full(len(d['x']), np.mean(np.diff(ux)) * 
+                                 np.mean(np.diff(uy)))
+
+    return PlanarMeasurementTransverseNonUniform(d['x'], d['y'], d['ex'], 
+                                                 d['ey'], w)
 
 def write_planar_measurement(filename):
     pass
 
-def read_probe_data(filename):
-    pass
+def read_spherical_measurement(filename, columns=None, 
+                               data_format=real_imag, phase_unit='deg', 
+                               amplitude_unit='linear', angle_unit='deg'):
+    """Reads a spherical export into a 
+    SphericalMeasurementTransverseNonUniform (which also holds samples on a
+    uniform grid, see SpiralGridding). The default columns are theta, phi, 
+    etheta (two columns), ephi (two columns); the angles are in degrees 
+    unless *angle_unit* is 'rad'.
+    """
+
+    from nearside.spherical.structures import \
+                                SphericalMeasurementTransverseNonUniform
+
+    if columns is None:
+        columns = {'theta': 0, 'phi': 1, 'etheta': (2, 3), 'ephi': (4, 5)}
+
+    (header, d) = read_ascii_columns(filename, columns, data_format, 
+                                     phase_unit, amplitude_unit)
+
+    (theta, phi) = (d['theta'], d['phi'])
+    if angle_unit == 'deg':
+        (theta, phi) = (np.radians(theta), np.radians(phi))
+
+    return SphericalMeasurementTransverseNonUniform(theta, phi, d['etheta'],
+                                                    d['ephi'])
+
+
+#==============================================================================
+# Result store
+#==============================================================================
+
+class CoefficientStore(object):
+    """Append-only store of coefficient sets on a frequency x state grid, 
+    e.g. one set per frequency and AUT state (beam, port, ...) of a 
+    measurement campaign.
+
+    The store is a directory. Each appended frequency is cut into chunks of
+    *state_chunk* states, (optionally) zlib compressed and appended to one
+    data file, and the position of every chunk is appended to an index. 
+    Opening a store reads only the header and the index, and read only 
+    decompresses the chunks that hold the requested sets, so the cost of 
+    looking at one frequency doesn't depend on the size of the campaign.
+
+    Storing a frequency again (replace, update) appends new chunks and 
+    overwrites the index entries of that frequency, so a store holds every 
+    frequency once.
+
+    Example::
+
+        >>> s = CoefficientStore.create('campaign', 60, 60, nstates = 16)
+        >>> for (f, c) in zip(frequencies, coefficients):
+        ...     s.append(f, c)       # VectorCoefsStack of shape (16,)
+        >>> s = CoefficientStore('campaign')
+        >>> c = s.read(s.nearest(10e9), states = [0, 3])
+
+    Args:
+      path (str): Directory of the store.
+
+      mode (str, optional): 'r' to read, 'a' to read and append.
+
+    Raises:
+      IOError: Is raised if the store doesn't exist.
+
+    """
+    def __init__(self, path, mode='r'):
+
+        if mode not in ('r', 'a'):
+            raise ValueError("mode must be 'r' or 'a'")
+
+        with open(os.path.join(path, _store_header), 'r') as f:
+            h = json.load(f)
+
+        self._path = path
+        self._mode = mode
+        self._nmax = h['nmax']
+        self._mmax = h['mmax']
+        self._nstates = h['nstates']
+        self._state_chunk = h['state_chunk']
+        self._dtype = np.dtype(h['dtype'])
+        self._compression = h['compression']
+        self._level = h['level']
+
+        N = self._nmax + 1
+        self._size = N + self._mmax * (2 * N - self._mmax - 1)
+        self._nchunks = -(-self._nstates // self._state_chunk)
+
+        # an append that was interrupted leaves data without index entries, 
+        # or index entries without a frequency; both are ignored
+        index = np.fromfile(os.path.join(path, _store_index), 
+                            dtype='<i8').reshape(-1, 2)
+        freqs = np.fromfile(os.path.join(path, _store_frequencies), 
+                            dtype='<f8')
+        nf = min(len(freqs), len(index) // self._nchunks)
+        self._index = index[:nf * self._nchunks].reshape(nf, 
+                                                         self._nchunks, 2)
+        self._frequencies = freqs[:nf]
+
+        if mode == 'a':
+            for (name, n) in ((_store_index, 16 * nf * self._nchunks),
+                              (_store_frequencies, 8 * nf)):
+                with open(os.path.join(path, name), 'r+b') as d:
+                    d.truncate(n)
+
+    @classmethod
+    def create(cls, path, nmax, mmax, nstates=1, dtype=np.complex128,
+               compression='zlib', level=6, state_chunk=None):
+        """Creates an empty store in the new directory *path* and opens it 
+        for appending.
+
+        Args:
+          path (str): Directory of the store, must not exist.
+
+          nmax (int): nmax of the coefficients.
+
+          mmax (int): mmax of the coefficients.
+
+          nstates (int, optional): Number of sets per frequency.
+
+          dtype (numpy.dtype, optional): complex128 or complex64.
+
+          compression (str, optional): 'zlib' or None.
+
+          level (int, optional): zlib compression level, 1 to 9.
+
+          state_chunk (int, optional): Number of states per chunk, by 
+          default all states of a frequency are one chunk.
+
+        Returns:
+          CoefficientStore: The store, opened with mode 'a'.
+
+        """
+
+        if mmax > nmax:
+            raise ValueError("mmax must not be larger than nmax")
+        if compression not in ('zlib', None):
+            raise ValueError("compression must be 'zlib' or None")
+        dtype = np.dtype(dtype)
+        if dtype not in (np.complex128, np.complex64):
+            raise ValueError("dtype must be complex128 or complex64")
+        if state_chunk is None:
+            state_chunk = nstates
+
+        os.makedirs(path)
+        for name in (_store_index, _store_data, _store_frequencies):
+            open(os.path.join(path, name), 'wb').close()
+
+        h = {'nmax': nmax, 'mmax': mmax, 'nstates': nstates,
+             'state_chunk': max(1, min(state_chunk, nstates)),
+             'dtype': dtype.str, 'compression': compression, 
+             'level': level}
+        with open(os.path.join(path, _store_header), 'w') as f:
+            json.dump(h, f, indent=2)
+
+        return cls(path, 'a')
+
+    @property
+    def nmax(self):
+        """Largest n value."""
+        return self._nmax
+
+    @property
+    def mmax(self):
+        """Largest abs(m) value."""
+        return self._mmax
+
+    @property
+    def nstates(self):
+        """Number of sets per frequency."""
+        return self._nstates
+
+    @property
+    def frequencies(self):
+        """The frequencies in the store, in the order they were appended."""
+        return self._frequencies.copy()
+
+    def __len__(self):
+        return len(self._frequencies)
+
+    def __repr__(self):
+        return ("CoefficientStore('{0}', nfrequencies = {1}, nstates = {2}, "
+                "nmax = {3}, mmax = {4})").format(self._path, len(self), 
+                                                  self._nstates, self._nmax,
+                                                  self._mmax)
+
+    def nearest(self, frequency):
+        """Index of the stored frequency closest to *frequency*."""
+        return int(np.argmin(np.abs(self._frequencies - frequency)))
+
+    def append(self, frequency, coefficients):
+        """Appends the sets of one frequency (a VectorCoefsStack of shape 
+        (nstates,), or a sequence of nstates VectorCoefs) or of several 
+        frequencies (a VectorCoefsStack of shape (len(frequency), nstates)).
+        """
+
+        if self._mode != 'a':
+            raise IOError("the store isn't open for appending")
+
+        f = np.atleast_1d(np.asarray(frequency, dtype='<f8'))
+        index = self._write_chunks(len(f), coefficients)
+
+        # the index is written after the data, and the frequencies last
+        with open(os.path.join(self._path, _store_index), 'ab') as d:
+            d.write(index.tobytes())
+        with open(os.path.join(self._path, _store_frequencies), 'ab') as d:
+            d.write(f.tobytes())
+
+        self._index = np.concatenate([self._index, index])
+        self._frequencies = np.concatenate([self._frequencies, f])
+
+    def replace(self, index, coefficients):
+        """Replaces the sets of the stored frequency with the index *index*
+        (see append for *coefficients*, of one frequency). The new chunks 
+        are appended to the data and the index entries of the frequency are
+        overwritten, the old chunks are left unused in the data file."""
+
+        if self._mode != 'a':
+            raise IOError("the store isn't open for appending")
+
+        index = np.arange(len(self))[index]
+        entries = self._write_chunks(1, coefficients)
+
+        # the data is on disk before the index points to it
+        with open(os.path.join(self._path, _store_index), 'r+b') as d:
+            d.seek(16 * self._nchunks * index)
+            d.write(entries.tobytes())
+
+        self._index[index] = entries[0]
+
+    def update(self, frequency, coefficients):
+        """Stores the sets of one frequency: replaces them if *frequency* is
+        already in the store, else appends them."""
+
+        k = np.flatnonzero(self._frequencies == frequency)
+        if len(k) > 0:
+            self.replace(k[-1], coefficients)
+        else:
+            self.append(frequency, coefficients)
+
+    def _write_chunks(self, nf, coefficients):
+        """Appends the chunks of *nf* frequencies to the data file, returns
+        their index entries."""
+
+        from nearside.spherical.structures import (VectorCoefsStack, 
+                                                   stack_coefs)
+
+        if not isinstance(coefficients, VectorCoefsStack):
+            coefficients = stack_coefs(coefficients)
+        if (coefficients.nmax != self._nmax or 
+            coefficients.mmax != self._mmax):
+            raise ValueError("nmax and mmax must match the store")
+
+        shape = (nf, self._nstates, self._size)
+        try:
+            v = np.stack([coefficients.vec1.reshape(shape),
+                          coefficients.vec2.reshape(shape)], axis=2)
+        except ValueError:
+            raise ValueError("coefficients must have the shape (" + 
+                             str(self._nstates) + ",) or (len(frequency), " +
+                             str(self._nstates) + ")")
+        v = v.astype(self._dtype.newbyteorder('<'))
+
+        datafile = os.path.join(self._path, _store_data)
+        offset = os.path.getsize(datafile)
+        index = np.empty((nf, self._nchunks, 2), dtype='<i8')
+        with open(datafile, 'ab') as d:
+            for k in range(nf):
+                for c in range(self._nchunks):
+                    b = v[k, c * self._state_chunk:
+                          (c + 1) * self._state_chunk].tobytes()
+                    if self._compression == 'zlib':
+                        b = zlib.compress(b, self._level)
+                    d.write(b)
+                    index[k, c] = (offset, len(b))
+                    offset += len(b)
+            d.flush()
+            os.fsync(d.fileno())
+
+        return index
+
+    def read(self, frequencies, states=None):
+        """Reads the sets of the frequency indices *frequencies* (an int, a 
+        slice or a sequence) and the *states* (a sequence, all by default).
+
+        Returns:
+          VectorCoefsStack: Of shape (len(states),) for an int, else 
+          (number of frequencies, len(states)).
+
+        """
+
+        from nearside.spherical.structures import VectorCoefsStack
+
+        scalar = np.isscalar(frequencies)
+        fi = np.arange(len(self))[frequencies]
+        fi = np.atleast_1d(fi)
+        if states is None:
+            si = np.arange(self._nstates)
+        else:
+            si = np.arange(self._nstates)[np.asarray(states)]
+            si = np.atleast_1d(si)
+
+        out = np.empty((len(fi), len(si), 2, self._size), dtype=self._dtype)
+        chunks = si // self._state_chunk
+
+        with open(os.path.join(self._path, _store_data), 'rb') as d:
+            for (k, f) in enumerate(fi):
+                for c in np.unique(chunks):
+                    (offset, nbytes) = self._index[f, c]
+                    d.seek(offset)
+                    b = d.read(nbytes)
+                    if self._compression == 'zlib':
+                        b = zlib.decompress(b)
+                    v = np.frombuffer(b, dtype=self._dtype.newbyteorder('<'))
+                    v = v.reshape(-1, 2, self._size)
+                    sel = chunks == c
+                    out[k, sel] = v[si[sel] - c * self._state_chunk]
+
+        if scalar:
+            out = out[0]
+
+        return VectorCoefsStack(out[..., 0, :], out[..., 1, :], self._nmax,
+                                self._mmax)
+
+def read_probe_data(path, frequency):
+    """Reads the probe coefficients (a spherepy.VectorCoefs) closest to 
+    *frequency* from the probe store *path*, see write_probe_data.
+
+    Raises:
+      ValueError: Is raised if the store is empty or the closest frequency
+      is more than 0.1 % away.
+
+    """
+
+    import spherepy as sp
+
+    s = CoefficientStore(path)
+    if len(s) == 0:
+        raise ValueError("the probe store '" + str(path) + "' is empty")
+
+    k = s.nearest(frequency)
+    if abs(s.frequencies[k] - frequency) > 1e-3 * frequency:
+        raise ValueError("no probe data within 0.1 % of " + str(frequency))
+
+    c = s.read(k, states=[0])
+    return sp.VectorCoefs(c.vec1[0], c.vec2[0], c.nmax, c.mmax)
+
+def write_probe_data(path, frequencies, coefficients):
+    """Writes the probe coefficients (a sequence of spherepy.VectorCoefs 
+    with the same nmax, mmax, one per frequency) to a new CoefficientStore 
+    *path* with one state."""
+
+    from nearside.spherical.structures import VectorCoefsStack
+
+    coefficients = list(coefficients)
+    c = coefficients[0]
+    s = CoefficientStore.create(path, c.nmax, c.mmax)
+    for (f, c) in zip(frequencies, coefficients):
+        s.append(f, VectorCoefsStack(c.scoef1._vec[None], 
+                                     c.scoef2._vec[None], c.nmax, c.mmax))
 
-def write_probe_data(filename):
-    pass
\ No newline at end of file
+    return s
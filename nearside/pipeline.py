@@ -0,0 +1,431 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+        pipeline: batch processing of spherical near-field measurements
+
+Every frequency of a measurement is an ASCII export on the uniform grid
+theta = linspace(0, pi, nrows), phi = 2 pi k / ncols, with the frequency (in
+Hz) in its header. Each file goes through the stages
+
+    read       file_handler.read_spherical_measurement
+    transform  the samples to coefficients (vcoefs_from_pattern)
+    translate  translate_symmetric_probe to the measurement radius
+    correct    probe_correct
+
+independently of the others, so the frequencies are spread over a pool of
+worker processes. The corrected coefficients are appended to a
+CoefficientStore. Planar exports are read and transformed to their plane
+wave spectrum by read_planar and planar_spectrum.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#---------------------------------------------------------------------Built-ins
+import os
+import time
+
+#---------------------------------------------------------------------3rd Party
+import numpy as np
+
+#------------------------------------------------------------------------Custom
+from nearside import file_handler
+from nearside.cache import StageCache
+from nearside.checkpoint import Checkpoint, content_hash
+
+#==============================================================================
+# Global Declarations
+#==============================================================================
+
+# Speed of light in vacuum (m/s)
+c0 = 299792458.0
+
+stages = ('read', 'transform', 'translate', 'correct', 'write')
+
+_frequency_keys = ('frequency', 'freq', 'frequency_hz')
+
+#==============================================================================
+# Stages
+#==============================================================================
+
+def measurement_frequency(header, filename=''):
+    """The frequency (Hz) in the header of an export."""
+
+    for key in _frequency_keys:
+        if isinstance(header.get(key), float):
+            return float(header[key])
+
+    raise ValueError("no frequency in the header of '" + str(filename) +
+                     "'")
+
+def grid_pattern(measurement):
+    """Sorts the samples of a spherical measurement onto the grid
+    theta = linspace(0, pi, nrows), phi = 2 pi k / ncols, returns (et, ep)
+    with shape (nrows, ncols).
+
+    Raises:
+      ValueError: Is raised if the samples don't cover that grid.
+
+    """
+
+    theta = np.asarray(measurement.theta)
+    phi = np.mod(np.asarray(measurement.phi), 2 * np.pi)
+    nrows = len(np.unique(np.round(theta, 9)))
+    ncols = len(np.unique(np.round(phi, 9)))
+
+    if nrows * ncols != len(theta) or nrows < 3:
+        raise ValueError("the samples must lie on a uniform theta, phi grid")
+
+    # phi close to 2 pi belongs to the first column
+    col = np.round(phi * ncols / (2 * np.pi)).astype(np.int64) % ncols
+    row = np.round(theta * (nrows - 1) / np.pi).astype(np.int64)
+    if (np.max(np.abs(theta - np.pi * row / (nrows - 1))) > 1e-6 or
+        np.max(np.abs(np.angle(np.exp(1j * (phi - 2 * np.pi * col / ncols)))))
+        > 1e-6):
+        raise ValueError("the samples must lie on a uniform theta, phi grid")
+
+    et = np.zeros((nrows, ncols), dtype=np.complex128)
+    ep = np.zeros((nrows, ncols), dtype=np.complex128)
+    et[row, col] = measurement.etheta
+    ep[row, col] = measurement.ephi
+
+    return (et, ep)
+
+def transform_stage(et, ep, nmax=None, mmax=None):
+    """Coefficients (a spherepy.VectorCoefs) of the gridded samples, by
+    default with the largest nmax and mmax the grid resolves."""
+
+    import spherepy as sp
+    from nearside.spherical import low_level
+
+    (nrows, ncols) = et.shape
+    if nmax is None:
+        nmax = min(nrows - 2, (ncols - 1) // 2)
+    if mmax is None:
+        mmax = min(nmax, (ncols - 1) // 2)
+
+    (vec1, vec2) = low_level.vcoefs_from_pattern(et, ep, nmax, mmax)
+
+    return sp.VectorCoefs(vec1, vec2, nmax, mmax)
+
+def translate_stage(probe, nmax, kr):
+    """R of translate_symmetric_probe for the probe coefficients *probe*."""
+
+    from nearside.spherical import standard_operations
+
+    return standard_operations.translate_symmetric_probe(nmax, probe, kr)
+
+def correct_stage(coefficients, R):
+    """probe_correct of the measured coefficients."""
+
+    from nearside.spherical import standard_operations
+
+    return standard_operations.probe_correct(coefficients, R)
+
+def read_spherical(filename, probe, read_options=None):
+    """The read stage of a spherical export: returns a dict with the
+    'frequency', the 'measurement', the 'probe' coefficients at that
+    frequency (from the probe store *probe*), the size of the file in
+    'bytes' and 'seconds'."""
+
+    t = time.time()
+    (header, _) = file_handler.read_ascii_header(filename)
+    frequency = measurement_frequency(header, filename)
+    m = file_handler.read_spherical_measurement(filename,
+                                                **(read_options or {}))
+    p = file_handler.read_probe_data(probe, frequency)
+
+    return {'frequency': frequency, 'measurement': m, 'probe': p,
+            'bytes': os.path.getsize(filename),
+            'seconds': {'read': time.time() - t}}
+
+def correct_spherical(data, radius, nmax=None, mmax=None, checkpoint=None,
+                      cache=None):
+    """The transform, translate and correct stages of the output of
+    read_spherical. Returns a dict with the 'frequency', the corrected
+    'coefficients', the translated probe data 'R', 'bytes' and the
+    'seconds' of all stages. With a *checkpoint* the R of a probe, nmax and
+    kr that were seen before is loaded instead of computed. With a
+    StageCache *cache* every stage is looked up there first."""
+
+    seconds = dict(data['seconds'])
+    if cache is None:
+        stage = lambda name, f, *args: f(*args)
+    else:
+        stage = lambda name, f, *args: cache.call('pipeline.' + name, f,
+                                                  *args)
+
+    t = time.time()
+    (et, ep) = grid_pattern(data['measurement'])
+    c = stage('transform', transform_stage, et, ep, nmax, mmax)
+    seconds['transform'] = time.time() - t
+
+    t = time.time()
+    kr = 2 * np.pi * data['frequency'] / c0 * radius
+    if checkpoint is None:
+        R = stage('translate', translate_stage, data['probe'], c.nmax, kr)
+    else:
+        key = content_hash(data['probe'], nmax=c.nmax, kr=kr)
+        saved = checkpoint.load('R', key)
+        if saved is None:
+            R = stage('translate', translate_stage, data['probe'], c.nmax,
+                      kr)
+            checkpoint.save('R', key, R=R)
+        else:
+            R = saved['R']
+    seconds['translate'] = time.time() - t
+
+    t = time.time()
+    c = stage('correct', correct_stage, c, R)
+    seconds['correct'] = time.time() - t
+
+    return {'frequency': data['frequency'], 'coefficients': c, 'R': R,
+            'bytes': data['bytes'], 'seconds': seconds}
+
+def file_key(filename, probe, radius, nmax=None, mmax=None,
+             read_options=None):
+    """Content hash of everything the result of process_file depends on:
+    the export, the probe store and the settings."""
+
+    return content_hash(filename, probe, radius=radius, nmax=nmax,
+                        mmax=mmax, read_options=read_options or {})
+
+def process_file(filename, probe, radius, nmax=None, mmax=None,
+                 read_options=None, checkpoint=None, cache=None):
+    """Runs one export through the read, transform, translate and correct
+    stages.
+
+    Args:
+      filename (str): The export of one frequency.
+
+      probe (str): The probe store (see file_handler.write_probe_data).
+
+      radius (float): Radius of the measurement sphere in meters.
+
+      nmax (int, optional): nmax of the result, the largest the grid
+      resolves by default.
+
+      mmax (int, optional): mmax of the result.
+
+      read_options (dict, optional): Keyword arguments of
+      file_handler.read_spherical_measurement.
+
+      checkpoint (Checkpoint or str, optional): If given, the result of an
+      export whose file_key was recorded there is loaded instead of
+      computed, and new results are recorded.
+
+      cache (StageCache or str, optional): Cache (or the directory of the
+      disk tier of a cache) of the transform, translate and correct
+      stages.
+
+    Returns:
+      dict: 'frequency', 'coefficients' (corrected VectorCoefs), 'bytes'
+      (size of the file) and 'seconds' (the time of each stage). With a
+      checkpoint also the 'key' and 'cached', True if the result was
+      loaded.
+
+    """
+
+    if cache is not None and not isinstance(cache, StageCache):
+        cache = StageCache(path=cache)
+
+    if checkpoint is None:
+        return correct_spherical(read_spherical(filename, probe,
+                                                read_options),
+                                 radius, nmax, mmax, cache=cache)
+
+    import spherepy as sp
+
+    if not isinstance(checkpoint, Checkpoint):
+        checkpoint = Checkpoint(checkpoint)
+
+    key = file_key(filename, probe, radius, nmax, mmax, read_options)
+    saved = checkpoint.load('coefs', key)
+    if saved is not None:
+        (n, m) = [int(v) for v in saved['orders']]
+        return {'frequency': float(saved['frequency']),
+                'coefficients': sp.VectorCoefs(saved['vec1'],
+                                               saved['vec2'], n, m),
+                'bytes': int(saved['bytes']),
+                'seconds': dict((s, 0.0) for s in stages),
+                'key': key, 'cached': True}
+
+    r = correct_spherical(read_spherical(filename, probe, read_options),
+                          radius, nmax, mmax, checkpoint, cache)
+    c = r['coefficients']
+    checkpoint.save('coefs', key, vec1=c.scoef1._vec, vec2=c.scoef2._vec,
+                    orders=[c.nmax, c.mmax], frequency=r['frequency'],
+                    bytes=r['bytes'])
+    r['key'] = key
+    r['cached'] = False
+
+    return r
+
+def read_planar(filename, read_options=None):
+    """The read stage of a planar export, see read_spherical."""
+
+    t = time.time()
+    (header, _) = file_handler.read_ascii_header(filename)
+    frequency = measurement_frequency(header, filename)
+    m = file_handler.read_planar_measurement(filename, **(read_options or {}))
+
+    return {'frequency': frequency, 'measurement': m,
+            'bytes': os.path.getsize(filename),
+            'seconds': {'read': time.time() - t}}
+
+def planar_spectrum(data, kmax=None):
+    """The transform stage of the output of read_planar: the plane wave
+    spectrum up to *kmax* (the free space k by default). Returns a dict
+    with the 'frequency', 'kx', 'ky', 'spectrum', 'bytes' and 'seconds'."""
+
+    from nearside.planar import standard_operations
+
+    seconds = dict(data['seconds'])
+
+    t = time.time()
+    if kmax is None:
+        kmax = 2 * np.pi * data['frequency'] / c0
+    (kx, ky, A) = standard_operations.plane_wave_spectrum(
+                                                    data['measurement'], kmax)
+    seconds['transform'] = time.time() - t
+
+    return {'frequency': data['frequency'], 'kx': kx, 'ky': ky,
+            'spectrum': A, 'bytes': data['bytes'], 'seconds': seconds}
+
+def _process(args):
+    return process_file(*args)
+
+#==============================================================================
+# Runs
+#==============================================================================
+
+def run(filenames, probe, radius, output, nmax=None, mmax=None, jobs=1,
+        read_options=None, checkpoint=None, cache=None):
+    """Processes the exports *filenames* (one per frequency) with *jobs*
+    worker processes and appends the corrected coefficients, in the order
+    of the files, to the CoefficientStore *output* (created if it doesn't
+    exist).
+
+    With a *checkpoint* directory every finished frequency is recorded
+    under the content hash of its inputs. A run that is restarted with the
+    same arguments after a crash loads the recorded frequencies instead of
+    computing them, and doesn't append the ones that already reached
+    *output* again. An export, probe or setting that changed gets a new
+    hash and is recomputed.
+
+    A *cache* (a StageCache or the directory of its disk tier) keeps the
+    results of the individual stages, see process_file. The worker
+    processes share its disk tier.
+
+    Example::
+
+        >>> stats = nearside.pipeline.run(glob.glob('scan/*.txt'), 'probe',
+        ...                               3.0, 'results', jobs = 8,
+        ...                               checkpoint = 'results.ckpt')
+        >>> print(nearside.pipeline.throughput(stats))
+
+    Returns:
+      dict: 'files', 'skipped' (loaded from the checkpoint), 'bytes',
+      'wall' (seconds) and 'seconds', the time spent in each stage summed
+      over the workers.
+
+    """
+
+    start = time.time()
+    filenames = list(filenames)
+    if checkpoint is not None and not isinstance(checkpoint, Checkpoint):
+        checkpoint = Checkpoint(checkpoint)
+    if cache is not None and not isinstance(cache, StageCache):
+        cache = StageCache(path=cache)
+    args = [(f, probe, radius, nmax, mmax, read_options, checkpoint, cache)
+            for f in filenames]
+
+    stats = {'files': 0, 'skipped': 0, 'bytes': 0,
+             'seconds': dict((s, 0.0) for s in stages)}
+
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(_process, args)
+    else:
+        pool = None
+        results = map(_process, args)
+
+    store = None
+    try:
+        for r in results:
+            t = time.time()
+            written = None
+            if checkpoint is not None:
+                written = content_hash(key=r['key'],
+                                       output=os.path.abspath(output))
+            if written is None or not checkpoint.has('written', written):
+                if store is None:
+                    store = _open_store(output, r['coefficients'])
+                store.update(r['frequency'], [r['coefficients']])
+                if written is not None:
+                    checkpoint.mark('written', written)
+            r['seconds']['write'] = time.time() - t
+
+            stats['files'] += 1
+            stats['skipped'] += int(r.get('cached', False))
+            stats['bytes'] += r['bytes']
+            for s in stages:
+                stats['seconds'][s] += r['seconds'][s]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    stats['wall'] = time.time() - start
+
+    return stats
+
+def _open_store(path, coefficients):
+
+    if os.path.exists(path):
+        return file_handler.CoefficientStore(path, 'a')
+    else:
+        return file_handler.CoefficientStore.create(path, coefficients.nmax,
+                                                    coefficients.mmax)
+
+def throughput(stats):
+    """Text table of the files per second and MB per second of every stage
+    of *stats* (from run). The stage rates are per worker, the total is the
+    rate of the whole run."""
+
+    n = stats['files']
+    mb = stats['bytes'] / 1e6
+    lines = ['{0:<10} {1:>10} {2:>10} {3:>10}'.format('stage', 'seconds',
+                                                      'files/s', 'MB/s')]
+    for s in stages:
+        t = stats['seconds'][s]
+        lines.append('{0:<10} {1:>10.3f} {2:>10.2f} {3:>10.2f}'.format(
+                     s, t, n / t if t > 0 else float('inf'),
+                     mb / t if t > 0 else float('inf')))
+    t = stats['wall']
+    lines.append('{0:<10} {1:>10.3f} {2:>10.2f} {3:>10.2f}'.format(
+                 'total', t, n / t if t > 0 else float('inf'),
+                 mb / t if t > 0 else float('inf')))
+
+    return '\n'.join(lines)
@@ -0,0 +1,221 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+          planar_low_level: planar case low level routines
+
+Non-uniform FFTs for scans that don't lie on a rectangular grid (plane-polar
+rings and spokes, spirals). The samples are spread onto an oversampled
+uniform grid with a Gaussian or Kaiser-Bessel kernel, the grid is
+transformed with an FFT and the kernel is divided out (Dutt and Rokhlin,
+Greengard and Lee). The spreading indices and weights only depend on the
+scan geometry and are kept in a cached plan.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#----------------------------------------------------------------------------
+
+#---------------------------------------------------------------------Built-ins
+import hashlib
+
+#--------------------------------------------------------------------3rd Party
+import numpy as np
+
+#=============================================================================
+# Global Declarations
+#=============================================================================
+
+gaussian = 'gaussian'
+kaiser_bessel = 'kaiser_bessel'
+
+# oversampling of the spreading grid
+_R = 2
+
+_plan_cache = {}
+_plan_cache_size = 8
+
+#=============================================================================
+# Non-uniform FFT
+#=============================================================================
+
+def spreading_width(eps, kernel=gaussian):
+    """ Half width (in grid points) of the spreading kernel that gives the
+    relative accuracy *eps*. With the oversampling R = 2 the error of the 
+    Gaussian kernel falls off as exp(-pi msp (R - 1) / (R - 1/2)), the one 
+    of the Kaiser-Bessel kernel about as 10^(1 - 2 msp)."""
+
+    if not 0 < eps < 1:
+        raise ValueError("eps must be between 0 and 1")
+
+    if kernel == kaiser_bessel:
+        msp = (1.0 - np.log10(eps)) / 2.0
+    else:
+        msp = -np.log(eps) / (np.pi * (_R - 1.0) / (_R - 0.5))
+
+    return int(min(max(np.ceil(msp), 2), 16))
+
+def _kernel_parameter(M, msp, kernel):
+    """ tau of the Gaussian exp(-x^2 / 4 tau) or beta of the Kaiser-Bessel
+    kernel I0(beta sqrt(1 - (x / a)^2)), a = msp h."""
+
+    if kernel == gaussian:
+        return np.pi * msp / (M ** 2 * _R * (_R - 0.5))
+    elif kernel == kaiser_bessel:
+        return np.pi * np.sqrt((2.0 * msp / _R * (_R - 0.5)) ** 2 - 0.8)
+    else:
+        raise ValueError("kernel must be gaussian or kaiser_bessel")
+
+def spreading_kernel(t, M, msp, kernel=gaussian):
+    """ Returns (idx, w): the indices (modulo R M) of the 2 msp grid points
+    around each t (radians) on the grid 2 pi k / (R M), and the kernel
+    weights there. Both have shape (len(t), 2 msp)."""
+
+    Mr = _R * M
+    h = 2.0 * np.pi / Mr
+    p = _kernel_parameter(M, msp, kernel)
+
+    t = np.asarray(t, dtype=np.float64)
+    xi = np.floor(t / h).astype(np.int64)
+    idx = xi[:, None] + np.arange(-msp + 1, msp + 1)
+    d = t[:, None] - h * idx
+
+    if kernel == gaussian:
+        w = np.exp(-d ** 2 / (4.0 * p))
+    else:
+        a = msp * h
+        w = np.i0(p * np.sqrt(np.maximum(1.0 - (d / a) ** 2, 0)))
+        w[np.abs(d) > a] = 0
+
+    return (idx % Mr, w)
+
+def kernel_transform(M, msp, kernel=gaussian):
+    """ The Fourier coefficients 1/2pi int g(x) exp(-1j k x) dx of the
+    spreading kernel for k = -(M // 2) .. M - M // 2 - 1."""
+
+    k = np.arange(-(M // 2), M - M // 2)
+    p = _kernel_parameter(M, msp, kernel)
+
+    if kernel == gaussian:
+        return np.sqrt(p / np.pi) * np.exp(-k ** 2 * p)
+    else:
+        a = msp * 2.0 * np.pi / (_R * M)
+        z = np.sqrt(p ** 2 - (k * a) ** 2)
+        return a / np.pi * np.sinh(z) / z
+
+class NUFFTPlan(object):
+    """ The spreading kernels of the points (tx, ty) (radians, periodic in
+    2 pi) for a spectrum of M = (Mx, My) uniform frequencies
+    k = -(M // 2) .. M - M // 2 - 1 in each direction.
+
+      type1(c) returns F[kx, ky] = sum_j c_j exp(-1j (kx tx_j + ky ty_j)) and
+    type2(F) returns c_j = sum_k F[kx, ky] exp(1j (kx tx_j + ky ty_j)). Both
+    take O(J msp^2 + M log M) operations, c and F may have leading (stack)
+    dimensions."""
+
+    def __init__(self, tx, ty, M, eps=1e-10, kernel=kaiser_bessel):
+
+        (Mx, My) = (M, M) if np.isscalar(M) else M
+        msp = spreading_width(eps, kernel)
+
+        (self._ix, self._wx) = spreading_kernel(tx, Mx, msp, kernel)
+        (self._iy, self._wy) = spreading_kernel(ty, My, msp, kernel)
+
+        kx = np.arange(-(Mx // 2), Mx - Mx // 2)
+        ky = np.arange(-(My // 2), My - My // 2)
+        self._kx = kx % (_R * Mx)
+        self._ky = ky % (_R * My)
+        self._scale = 1.0 / np.outer(_R * Mx * kernel_transform(Mx, msp,
+                                                                kernel),
+                                     _R * My * kernel_transform(My, msp,
+                                                                kernel))
+        self._shape = (Mx, My)
+        self._grid = (_R * Mx, _R * My)
+        self._J = len(self._ix)
+
+    @property
+    def shape(self):
+        """(Mx, My), the size of the spectrum."""
+        return self._shape
+
+    def type1(self, c):
+        """ Non-uniform samples c[..., J] to the uniform spectrum."""
+
+        c = np.asarray(c, dtype=np.complex128)
+        lead = c.shape[:-1]
+        c = c.reshape(-1, self._J)
+        (Gx, Gy) = self._grid
+
+        # one bincount per row of the stencil, for the whole stack
+        B = len(c)
+        off = (Gx * Gy * np.arange(B))[:, None, None]
+        g = np.zeros(B * Gx * Gy, dtype=np.complex128)
+        for l in range(self._ix.shape[1]):
+            idx = (off + self._ix[:, l, None] * Gy + self._iy).ravel()
+            v = (c[:, :, None] * (self._wx[:, l, None] * self._wy)).ravel()
+            g += (np.bincount(idx, v.real, B * Gx * Gy) +
+                  1j * np.bincount(idx, v.imag, B * Gx * Gy))
+
+        G = np.fft.fft2(g.reshape(-1, Gx, Gy))
+        F = G[:, self._kx[:, None], self._ky] * self._scale
+
+        return F.reshape(lead + self._shape)
+
+    def type2(self, F):
+        """ Uniform spectrum F[..., Mx, My] to the non-uniform points."""
+
+        F = np.asarray(F, dtype=np.complex128)
+        lead = F.shape[:-2]
+        F = F.reshape((-1,) + self._shape)
+        (Gx, Gy) = self._grid
+
+        U = np.zeros((len(F), Gx, Gy), dtype=np.complex128)
+        U[:, self._kx[:, None], self._ky] = F * self._scale
+        u = np.fft.ifft2(U).reshape(len(F), -1) * (Gx * Gy)
+
+        c = np.zeros((len(F), self._J), dtype=np.complex128)
+        for l in range(self._ix.shape[1]):
+            idx = self._ix[:, l, None] * Gy + self._iy
+            w = self._wx[:, l, None] * self._wy
+            c += np.einsum('bjw,jw->bj', np.take(u, idx, axis=1), w)
+
+        return c.reshape(lead + (self._J,))
+
+def nufft_plan(tx, ty, M, eps=1e-10, kernel=kaiser_bessel):
+    """ Returns the NUFFTPlan of the points (tx, ty). The plans of the last
+    few scan geometries are cached, so every frequency, component and
+    measurement taken on the same scan reuses the spreading kernels."""
+
+    tx = np.ascontiguousarray(tx, dtype=np.float64)
+    ty = np.ascontiguousarray(ty, dtype=np.float64)
+    M = (M, M) if np.isscalar(M) else tuple(M)
+
+    h = hashlib.sha1(tx.tobytes())
+    h.update(ty.tobytes())
+    key = (h.hexdigest(), M, float(eps), kernel)
+
+    if key not in _plan_cache:
+        if len(_plan_cache) >= _plan_cache_size:
+            _plan_cache.pop(next(iter(_plan_cache)))
+        _plan_cache[key] = NUFFTPlan(tx, ty, M, eps, kernel)
+
+    return _plan_cache[key]
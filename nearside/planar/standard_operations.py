@@ -0,0 +1,202 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+     planar_standard_operations: plane wave spectrum of planar scans
+
+The plane wave spectrum A(kx, ky) = int int E(x, y) exp(-1j (kx x + ky y))
+dx dy of a scan on arbitrary points is evaluated directly with a type 1
+non-uniform FFT, without interpolating the samples onto a rectangular grid
+first.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#--------------------------------------------------------------------3rd Party
+import numpy as np
+
+#------------------------------------------------------------------------Custom
+from . import low_level
+from .structures import (PlanarMeasurementScalarNonUniform,
+                         PlanarMeasurementTransverseNonUniform)
+
+#=============================================================================
+# Global Declarations
+#=============================================================================
+
+gaussian = low_level.gaussian
+kaiser_bessel = low_level.kaiser_bessel
+
+#=============================================================================
+# Operations
+#=============================================================================
+
+def plane_polar_points( radii, nphi ):
+    """The points and quadrature weights of a plane-polar scan with *nphi*
+    equally spaced spokes and rings at *radii*. Each ring gets the area of
+    the annulus between the midpoints of its neighbours.
+
+    Example::
+
+        >>> (x, y, w) = nearside.planar.plane_polar_points(r, 180)
+        >>> m = nearside.planar.PlanarMeasurementTransverseNonUniform(
+        ...                                      x, y, ex, ey, w)
+
+    Args:
+      radii (array_like): Increasing ring radii.
+
+      nphi (int): Number of spokes.
+
+    Returns:
+      tuple: (x, y, weights), flat arrays ordered ring by ring.
+
+    """
+
+    r = np.asarray( radii, dtype=np.float64 )
+    edges = np.concatenate( [[max( r[0] - (r[1] - r[0]) / 2.0, 0 )],
+                             (r[1:] + r[:-1]) / 2.0,
+                             [r[-1] + (r[-1] - r[-2]) / 2.0]] )
+    area = np.pi * (edges[1:] ** 2 - edges[:-1] ** 2) / nphi
+
+    phi = 2.0 * np.pi * np.arange( nphi ) / nphi
+    x = np.outer( r, np.cos( phi ) ).ravel()
+    y = np.outer( r, np.sin( phi ) ).ravel()
+    w = np.repeat( area, nphi )
+
+    return (x, y, w)
+
+def plane_wave_spectrum( measurement, kmax, dk = None, eps = 1e-10,
+                         kernel = kaiser_bessel ):
+    """Computes the plane wave spectrum of a non-uniform planar scan on the
+    uniform grid kx, ky = dk * (-M / 2 .. M / 2 - 1) that covers
+    [-kmax, kmax).
+
+    The weighted samples are spread onto an oversampled grid, transformed
+    with one FFT and deconvolved (a type 1 NUFFT), O(J + M^2 log M). The
+    spreading kernels depend only on the scan geometry and are cached, so
+    the other components, frequencies (with the same dk) and measurements
+    taken on the same scan reuse them.
+
+    Example::
+
+        >>> (kx, ky, A) = nearside.planar.plane_wave_spectrum(m, k)
+        >>> (Ax, Ay) = A
+
+    Args:
+      measurement (PlanarMeasurementScalarNonUniform or
+      PlanarMeasurementTransverseNonUniform): The scan.
+
+      kmax (float): Largest spectral component, usually k.
+
+      dk (float, optional): Spacing of the spectrum. The default (and
+      largest allowed) is pi / D, where D is the largest abs(x) or abs(y)
+      of the scan.
+
+      eps (float, optional): Relative accuracy of the transform.
+
+      kernel (str, optional): kaiser_bessel or gaussian, which needs a
+      wider kernel for the same accuracy.
+
+    Returns:
+      tuple: (kx, ky, A). A has the shape (..., M, M) of the samples, with
+      an extra leading axis of length 2 for (Ax, Ay) of a transverse scan.
+
+    Raises:
+      TypeError: Is raised if measurement isn't a non-uniform planar
+      measurement.
+
+      ValueError: Is raised if dk is too large for the size of the scan.
+
+    """
+
+    if isinstance( measurement, PlanarMeasurementScalarNonUniform ):
+        data = measurement.values
+    elif isinstance( measurement, PlanarMeasurementTransverseNonUniform ):
+        data = np.stack( [measurement.ex, measurement.ey] )
+    else:
+        raise TypeError("measurement must be a non-uniform planar " +
+                        "measurement")
+
+    (x, y) = ( measurement.x, measurement.y )
+    D = max( np.max( np.abs( x ) ), np.max( np.abs( y ) ) )
+    if dk is None:
+        dk = np.pi / D
+    elif dk * D > np.pi * (1 + 1e-12):
+        raise ValueError("dk must not be larger than pi / D")
+
+    M = 2 * int( np.ceil( kmax / dk ) )
+    plan = low_level.nufft_plan( dk * x, dk * y, M, eps, kernel )
+
+    A = plan.type1( measurement.weights * data )
+    k = dk * np.arange( -(M // 2), M - M // 2 )
+
+    return (k, k.copy(), A)
+
+def near_field_from_spectrum( kx, ky, spectrum, x, y, eps = 1e-10,
+                              kernel = kaiser_bessel ):
+    """Evaluates the field E(x, y) = 1 / 4pi^2 int int A(kx, ky)
+    exp(1j (kx x + ky y)) dkx dky at arbitrary points from a spectrum on the
+    grid of plane_wave_spectrum (a type 2 NUFFT). This is the inverse of
+    plane_wave_spectrum for a field that is band limited to the grid.
+
+    Args:
+      kx (array_like): The kx grid of the spectrum.
+
+      ky (array_like): The ky grid of the spectrum.
+
+      spectrum (array_like): A[..., len(kx), len(ky)].
+
+      x (array_like): x of the points.
+
+      y (array_like): y of the points.
+
+      eps (float, optional): Relative accuracy of the transform.
+
+      kernel (str, optional): kaiser_bessel or gaussian, which needs a
+      wider kernel for the same accuracy.
+
+    Returns:
+      numpy.ndarray: The field, shape spectrum.shape[:-2] + (len(x),).
+
+    Raises:
+      ValueError: Is raised if kx and ky aren't grids of
+      plane_wave_spectrum.
+
+    """
+
+    kx = np.asarray( kx, dtype=np.float64 )
+    ky = np.asarray( ky, dtype=np.float64 )
+    dk = kx[1] - kx[0]
+
+    for k in (kx, ky):
+        g = dk * np.arange( -(len( k ) // 2), len( k ) - len( k ) // 2 )
+        if not np.allclose( k, g, rtol=0, atol=1e-9 * abs( dk ) ):
+            raise ValueError("kx and ky must be grids of plane_wave_spectrum")
+
+    x = np.ravel( x )
+    y = np.ravel( y )
+    plan = low_level.nufft_plan( dk * x, dk * y, (len( kx ), len( ky )),
+                                 eps, kernel )
+
+    return dk ** 2 / (4.0 * np.pi ** 2) * plan.type2( spectrum )
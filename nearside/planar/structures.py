@@ -33,23 +33,22 @@ from __future__ import absolute_import
 from six.moves import range  #use range instead of xrange
 #-----------------------------------------------------------------------------
 
-#---------------------------------------------------------------------Built-ins
-
-import json
-from os.path import dirname
-
 #--------------------------------------------------------------------3rd Party
 import numpy as np
-import spherepy as sp
 
 #------------------------------------------------------------------------Custom
+from nearside._lazy import lazy_module
 import nearside.probe as pb
 
+sp = lazy_module('spherepy')
+
 #==============================================================================
 # Global Declarations
 #==============================================================================
 
 err_msg = {}
+err_msg['nu_size'] = "x, y, the weights and the samples (along the last " + \
+                     "axis) must have the same length"
 
 
 #=============================================================================
@@ -81,7 +80,91 @@ class PlanarMeasurementTransverseUniform(object):
 # spaced in the theta direction and the phi direction.
 
 class PlanarMeasurementScalarNonUniform(object):
-    pass
+    """Holds a scalar planar measurement taken at arbitrary points (x, y) 
+    of the scan plane, e.g. the rings and spokes of a plane-polar scanner or
+    a spiral. *weights* are the areas that the samples represent (the 
+    quadrature weights of the scan), see plane_polar_points. The samples 
+    may be stacked along leading axes (e.g. frequency); the points are 
+    along the last axis.
+    """
+    def __init__(self, x, y, values, weights):
+
+        self._x = np.asarray(x, dtype=np.float64).ravel()
+        self._y = np.asarray(y, dtype=np.float64).ravel()
+        self._weights = np.asarray(weights, dtype=np.float64).ravel()
+        self._values = np.asarray(values)
+
+        J = len(self._x)
+        if (len(self._y) != J or len(self._weights) != J or 
+            self._values.ndim == 0 or self._values.shape[-1] != J):
+            raise ValueError(err_msg['nu_size'])
+
+    @property
+    def x(self):
+        """x of the sample points."""
+        return self._x
+
+    @property
+    def y(self):
+        """y of the sample points."""
+        return self._y
+
+    @property
+    def weights(self):
+        """Area represented by each sample."""
+        return self._weights
+
+    @property
+    def values(self):
+        """The measured samples."""
+        return self._values
+
+    def __len__(self):
+        return len(self._x)
 
 class PlanarMeasurementTransverseNonUniform(object):
-    pass
+    """Holds the two transverse components (ex, ey) of a planar measurement
+    taken at arbitrary points (x, y), see 
+    PlanarMeasurementScalarNonUniform.
+    """
+    def __init__(self, x, y, ex, ey, weights):
+
+        self._x = np.asarray(x, dtype=np.float64).ravel()
+        self._y = np.asarray(y, dtype=np.float64).ravel()
+        self._weights = np.asarray(weights, dtype=np.float64).ravel()
+        self._ex = np.asarray(ex)
+        self._ey = np.asarray(ey)
+
+        J = len(self._x)
+        if (len(self._y) != J or len(self._weights) != J or 
+            self._ex.shape != self._ey.shape or
+            self._ex.ndim == 0 or self._ex.shape[-1] != J):
+            raise ValueError(err_msg['nu_size'])
+
+    @property
+    def x(self):
+        """x of the sample points."""
+        return self._x
+
+    @property
+    def y(self):
+        """y of the sample points."""
+        return self._y
+
+    @property
+    def weights(self):
+        """Area represented by each sample."""
+        return self._weights
+
+    @property
+    def ex(self):
+        """The measured x component."""
+        return self._ex
+
+    @property
+    def ey(self):
+        """The measured y component."""
+        return self._ey
+
+    def __len__(self):
+        return len(self._x)
@@ -35,7 +35,11 @@ from six.moves import range  #use range instead of xrange
 
 #---------------------------------------------------------------------3rd Party
 import numpy as np
-import spherepy as sp
+
+#------------------------------------------------------------------------Custom
+from nearside._lazy import lazy_module
+
+sp = lazy_module('spherepy')
 
 #==============================================================================
 # Objects
@@ -55,7 +59,12 @@ def probe_reciprocity( probe ):
     pass
 
 def probe_directivity( probe ):
-    pass
+    """Boresight directivity of the probe. *probe* is the VectorCoefs object
+    holding the probe's far-field pattern coefficients."""
+
+    from nearside.spherical import standard_operations
+
+    return standard_operations.directivity( probe )
 
 def rotate_around_y_by_pi( probe ):
     pass
@@ -0,0 +1,303 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+          service: process the exports of several chambers as they arrive
+
+A Service watches the input directory of every Chamber and schedules each
+new export on one pool of worker processes that lives as long as the
+service, so no interpreter is started per file. Every chamber has its own
+queue and *concurrency* tasks; while one task waits for the pool to compute
+a file, another one reads the next file in a thread, so reading and
+computing overlap. Requires Python 3 (asyncio).
+
+    >>> c = Chamber('north', '/data/north', '/results/north',
+    ...             probe = '/probes/wr90', radius = 3.0)
+    >>> asyncio.run(Service([c], jobs = 8).run())
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#---------------------------------------------------------------------Built-ins
+import asyncio
+import fnmatch
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+#---------------------------------------------------------------------3rd Party
+import numpy as np
+
+#------------------------------------------------------------------------Custom
+from nearside import file_handler
+from nearside import pipeline
+
+log = logging.getLogger(__name__)
+
+#==============================================================================
+# Global Declarations
+#==============================================================================
+
+spherical = 'spherical'
+planar = 'planar'
+
+#==============================================================================
+# Objects
+#==============================================================================
+
+class Chamber(object):
+    """The input directory of one chamber and how its exports are
+    processed.
+
+    Args:
+      name (str): Name used in the log and the statistics.
+
+      directory (str): Directory that receives the exports.
+
+      output (str): A CoefficientStore for spherical chambers, a directory
+      that receives one .npz spectrum per export for planar chambers.
+
+      kind (str, optional): spherical or planar.
+
+      probe (str, optional): Probe store, needed for spherical chambers.
+
+      radius (float, optional): Measurement radius (m), needed for
+      spherical chambers.
+
+      pattern (str, optional): Glob pattern of the export file names.
+
+      concurrency (int, optional): Files of this chamber in flight at once.
+      Two let reading overlap computing.
+
+      nmax (int, optional): nmax of spherical results.
+
+      mmax (int, optional): mmax of spherical results.
+
+      read_options (dict, optional): Keyword arguments of the file_handler
+      reader.
+
+    """
+    def __init__(self, name, directory, output, kind=spherical, probe=None,
+                 radius=None, pattern='*.txt', concurrency=2, nmax=None,
+                 mmax=None, read_options=None):
+
+        if kind not in (spherical, planar):
+            raise ValueError("kind must be spherical or planar")
+        if kind == spherical and (probe is None or radius is None):
+            raise ValueError("a spherical chamber needs a probe and a radius")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.name = name
+        self.directory = directory
+        self.output = output
+        self.kind = kind
+        self.probe = probe
+        self.radius = radius
+        self.pattern = pattern
+        self.concurrency = concurrency
+        self.nmax = nmax
+        self.mmax = mmax
+        self.read_options = read_options
+
+    def __repr__(self):
+        return "Chamber('{0}', '{1}', kind = {2})".format(self.name,
+                                                          self.directory,
+                                                          self.kind)
+
+    def read(self, filename):
+        """The read stage of one export (runs in a thread)."""
+
+        if self.kind == spherical:
+            return pipeline.read_spherical(filename, self.probe,
+                                           self.read_options)
+        else:
+            return pipeline.read_planar(filename, self.read_options)
+
+    def compute(self):
+        """The function and arguments of the compute stages (run in the
+        process pool)."""
+
+        if self.kind == spherical:
+            return (pipeline.correct_spherical,
+                    (self.radius, self.nmax, self.mmax))
+        else:
+            return (pipeline.planar_spectrum, ())
+
+    def write(self, filename, result):
+        """Stores the result of one export (runs in a thread)."""
+
+        if self.kind == spherical:
+            c = result['coefficients']
+            if os.path.exists(self.output):
+                store = file_handler.CoefficientStore(self.output, 'a')
+            else:
+                store = file_handler.CoefficientStore.create(self.output,
+                                                             c.nmax, c.mmax)
+            store.update(result['frequency'], [c])
+        else:
+            if not os.path.isdir(self.output):
+                os.makedirs(self.output)
+            name = os.path.splitext(os.path.basename(filename))[0] + '.npz'
+            np.savez(os.path.join(self.output, name),
+                     frequency=result['frequency'], kx=result['kx'],
+                     ky=result['ky'], spectrum=result['spectrum'])
+
+def chambers_from_config(filename):
+    """Reads a JSON file holding a list of objects with the arguments of
+    Chamber, returns the list of Chamber objects."""
+
+    with open(filename, 'r') as f:
+        config = json.load(f)
+
+    return [Chamber(**c) for c in config]
+
+class Service(object):
+    """Processes the exports of *chambers* on a pool of *jobs* worker
+    processes (the number of CPUs by default).
+
+    run() watches the directories until *stop* is set, checking every
+    *poll* seconds; a file is taken once its size didn't change between two
+    checks. drain() processes the files that are there and returns. Files
+    are processed once per Service; files that fail are logged and
+    counted, not retried.
+    """
+    def __init__(self, chambers, jobs=None, poll=1.0):
+
+        self._chambers = list(chambers)
+        self._jobs = jobs
+        self._poll = poll
+        self._seen = dict((c.name, set()) for c in self._chambers)
+        self._sizes = dict((c.name, {}) for c in self._chambers)
+        self.stats = dict((c.name, {'files': 0, 'failed': 0, 'bytes': 0,
+                                    'seconds': {}})
+                          for c in self._chambers)
+
+    def _new_files(self, chamber, stable):
+        """New exports of *chamber*; with *stable* only the ones whose size
+        didn't change since the last call."""
+
+        sizes = self._sizes[chamber.name]
+        seen = self._seen[chamber.name]
+        new = []
+        for name in sorted(os.listdir(chamber.directory)):
+            path = os.path.join(chamber.directory, name)
+            if (path in seen or not fnmatch.fnmatch(name, chamber.pattern) or
+                not os.path.isfile(path)):
+                continue
+            size = os.path.getsize(path)
+            if not stable or sizes.get(path) == size:
+                seen.add(path)
+                sizes.pop(path, None)
+                new.append(path)
+            else:
+                sizes[path] = size
+
+        return new
+
+    async def _process(self, chamber, filename, loop, pool, threads, lock):
+
+        try:
+            data = await loop.run_in_executor(threads, chamber.read,
+                                              filename)
+            (f, args) = chamber.compute()
+            result = await loop.run_in_executor(pool, f, data, *args)
+            # results of one chamber are written one at a time
+            async with lock:
+                await loop.run_in_executor(threads, chamber.write,
+                                           filename, result)
+        except Exception:
+            log.exception("%s: processing %s failed", chamber.name,
+                          filename)
+            self.stats[chamber.name]['failed'] += 1
+            return
+
+        s = self.stats[chamber.name]
+        s['files'] += 1
+        s['bytes'] += result['bytes']
+        for (k, t) in result['seconds'].items():
+            s['seconds'][k] = s['seconds'].get(k, 0.0) + t
+        log.info("%s: processed %s", chamber.name, filename)
+
+    async def _worker(self, chamber, queue, loop, pool, threads, lock):
+
+        while True:
+            filename = await queue.get()
+            try:
+                await self._process(chamber, filename, loop, pool, threads,
+                                    lock)
+            finally:
+                queue.task_done()
+
+    async def _serve(self, stop):
+
+        loop = asyncio.get_running_loop()
+        nthreads = sum(c.concurrency for c in self._chambers) + 1
+        pool = ProcessPoolExecutor(max_workers=self._jobs)
+        threads = ThreadPoolExecutor(max_workers=nthreads)
+        queues = dict((c.name, asyncio.Queue()) for c in self._chambers)
+
+        workers = []
+        for c in self._chambers:
+            lock = asyncio.Lock()
+            for k in range(c.concurrency):
+                workers.append(asyncio.ensure_future(self._worker(
+                               c, queues[c.name], loop, pool, threads,
+                               lock)))
+
+        try:
+            while True:
+                for c in self._chambers:
+                    for f in self._new_files(c, stop is not None):
+                        queues[c.name].put_nowait(f)
+                if stop is None:
+                    break
+                try:
+                    await asyncio.wait_for(stop.wait(), self._poll)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+
+            for q in queues.values():
+                await q.join()
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            threads.shutdown()
+            pool.shutdown()
+
+    async def run(self, stop=None):
+        """Watches the directories until the asyncio.Event *stop* is set
+        (forever by default), then finishes the queued files."""
+
+        if stop is None:
+            stop = asyncio.Event()
+        await self._serve(stop)
+
+    async def drain(self):
+        """Processes the exports that are in the directories now."""
+
+        await self._serve(None)
@@ -23,9 +23,55 @@ from __future__ import absolute_import
 from six.moves import range  #use range instead of xrange
 #-----------------------------------------------------------------------------
 
-import json
-import os
-from os.path import dirname
 import sys
 
-from nearside.spherical.standard_operations import *
\ No newline at end of file
+from nearside._lazy import lazy_exports
+
+# The operations are imported the first time they are accessed (PEP 562), 
+# so importing e.g. nearside.spherical.structures doesn't pull in the rest
+# of the subpackage.
+
+_submodules = ['low_level', 'structures', 'standard_operations', 
+               'array_synthesis', 'uncertainty', 'frequency', 'spiral',
+               'symmetry']
+
+_exports = {'stack_coefs': 'structures',
+            'ElementArray': 'array_synthesis',
+            'monte_carlo_uncertainty': 'uncertainty',
+            'frequency_to_time': 'frequency',
+            'time_to_frequency': 'frequency',
+            'time_gate': 'frequency',
+            'interpolate_frequency': 'frequency',
+            'SpiralGridding': 'spiral',
+            'spiral_points': 'spiral',
+            'spiral_coefs': 'spiral',
+            'Symmetry': 'symmetry',
+            'SymmetricCoefs': 'symmetry',
+            'reduce_coefs': 'symmetry',
+            'symmetry_error': 'symmetry',
+            'symmetric_coefs_from_pattern': 'symmetry',
+            'e_plane': 'symmetry',
+            'h_plane': 'symmetry',
+            'e_and_h_planes': 'symmetry',
+            'body_of_revolution': 'symmetry'}
+
+(__getattr__, __dir__) = lazy_exports(__name__, _submodules, _exports,
+                                      'standard_operations')
+
+if sys.version_info < (3, 7):
+    # Module level __getattr__ isn't supported, import everything up front.
+    from nearside.spherical.standard_operations import *
+    from nearside.spherical.structures import stack_coefs
+    from nearside.spherical.array_synthesis import ElementArray
+    from nearside.spherical.uncertainty import monte_carlo_uncertainty
+    from nearside.spherical.frequency import (frequency_to_time, 
+                                              time_to_frequency, time_gate,
+                                              interpolate_frequency)
+    from nearside.spherical.spiral import (SpiralGridding, spiral_points, 
+                                           spiral_coefs)
+    from nearside.spherical.symmetry import (Symmetry, SymmetricCoefs, 
+                                             reduce_coefs, symmetry_error,
+                                             symmetric_coefs_from_pattern,
+                                             e_plane, h_plane, 
+                                             e_and_h_planes,
+                                             body_of_revolution)
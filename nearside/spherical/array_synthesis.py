@@ -0,0 +1,193 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+        array_synthesis: array patterns from embedded element patterns
+
+Superposition of measured embedded element patterns. The element
+coefficients are moved into the array frame once, after which the pattern
+of any excitation is a weighted sum of coefficient vectors, so a whole table
+of beams is a single matrix product.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#--------------------------------------------------------------------3rd Party
+import numpy as np
+
+#------------------------------------------------------------------------Custom
+from nearside._lazy import lazy_module
+from . import low_level
+from . import standard_operations as so
+from .structures import VectorCoefsStack
+
+sp = lazy_module('spherepy')
+
+#=============================================================================
+# Objects
+#=============================================================================
+
+class ElementArray(object):
+    """Holds the embedded element patterns of an array as one
+    VectorCoefsStack in the array frame.
+
+    Each element pattern is measured (or computed) about its own reference
+    point. It is first rotated by its Euler angles (see rotate), then moved
+    to its position in the array, both only once when the array is built.
+    The pattern of the array for the excitation weights w is
+    sum_e w_e c_e, which synthesize evaluates for any number of weight
+    vectors with one matrix product.
+
+    Example::
+
+        >>> a = nearside.spherical.ElementArray(elements, k * positions)
+        >>> w = a.steering_weights(theta, phi)
+        >>> beams = a.synthesize(w)
+
+    Args:
+      elements (list or VectorCoefsStack): The element patterns,
+      spherepy.VectorCoefs objects or a stack of shape (N,).
+
+      positions (array_like): Electrical positions (k times x, y, z) of the
+      element reference points, shape (N, 3).
+
+      rotations (array_like, optional): Euler angles (alpha, beta, gamma) of
+      each element, shape (N, 3).
+
+      nmax (int, optional): nmax of the array coefficients, the default is
+      the mode_budget of the array to auto_truncation_error.
+
+      precision (str, optional): double or single. The element stack is
+      kept, and the beams are synthesized, in this precision.
+
+    Raises:
+      ValueError: Is raised if the number of positions or rotations doesn't
+      match the number of elements.
+
+    """
+    def __init__(self, elements, positions, rotations = None, nmax = None,
+                 precision = None):
+
+        if isinstance( elements, VectorCoefsStack ):
+            elements = elements.to_list()
+        elements = list( elements )
+        N = len( elements )
+
+        positions = np.asarray( positions, dtype=np.float64 )
+        if positions.shape != (N, 3):
+            raise ValueError("positions must have shape (N, 3)")
+
+        if rotations is not None:
+            rotations = np.asarray( rotations, dtype=np.float64 )
+            if rotations.shape != (N, 3):
+                raise ValueError("rotations must have shape (N, 3)")
+            elements = [so.rotate( c, *r ) for (c, r) in
+                        zip( elements, rotations )]
+
+        # common nmax, mmax before the move into the array frame
+        ne = max( c.nmax for c in elements )
+        vec1 = np.zeros( (N, len( low_level.mode_numbers( ne, ne )[0] )),
+                         dtype=np.complex128 )
+        vec2 = np.zeros( vec1.shape, dtype=np.complex128 )
+        for (k, c) in enumerate( elements ):
+            idx = low_level.truncation_indices( ne, ne, c.nmax, c.mmax )
+            vec1[k, idx] = c.scoef1._vec
+            vec2[k, idx] = c.scoef2._vec
+
+        if nmax is None:
+            r = np.max( np.linalg.norm( positions, axis=-1 ) )
+            nmax = ne + low_level.excess_bandwidth_nmax(
+                                            r, so.auto_truncation_error )
+
+        # the array origin is at -position as seen from each element
+        coefs = so.translate( VectorCoefsStack( vec1, vec2, ne, ne ),
+                              -positions, nmax = nmax )
+
+        self._coefs = coefs.astype( low_level.complex_dtype( precision ) )
+        self._positions = positions
+        self._precision = precision
+
+    @property
+    def coefs(self):
+        """The element patterns in the array frame, a VectorCoefsStack of
+        shape (N,)."""
+        return self._coefs
+
+    @property
+    def positions(self):
+        """Electrical positions of the elements."""
+        return self._positions
+
+    @property
+    def nmax(self):
+        """Largest n value of the array coefficients."""
+        return self._coefs.nmax
+
+    @property
+    def mmax(self):
+        """Largest abs(m) value of the array coefficients."""
+        return self._coefs.mmax
+
+    def __len__(self):
+        return len( self._coefs )
+
+    def __repr__(self):
+        return "ElementArray(elements = {0}, nmax = {1})".format(
+                                                        len( self ), self.nmax)
+
+    def steering_weights(self, theta, phi):
+        """Returns the weights exp(1j p_e . r) that put all of the elements
+        in phase in the direction(s) theta, phi. The result has shape
+        (..., N), with the leading axes those of theta and phi broadcast."""
+
+        r = low_level.directions( np.asarray( theta, dtype=np.float64 ),
+                                  np.asarray( phi, dtype=np.float64 ) )
+
+        return np.exp( 1j * np.dot( r, self._positions.T ) )
+
+    def synthesize(self, weights):
+        """Returns the coefficients of the array pattern for the excitation
+        *weights*, shape (N,) or (..., N). A table of beams is computed with
+        one matrix product.
+
+        Returns:
+          VectorCoefs or VectorCoefsStack: One set of coefficients for each
+          weight vector.
+        """
+
+        ctype = low_level.complex_dtype( self._precision )
+        weights = np.asarray( weights, dtype=ctype )
+        if weights.shape[-1] != len( self ):
+            raise ValueError("the last axis of weights must have length " +
+                             str( len( self ) ))
+
+        vec1 = np.matmul( weights, self._coefs.vec1 )
+        vec2 = np.matmul( weights, self._coefs.vec2 )
+
+        if weights.ndim == 1:
+            return sp.VectorCoefs( np.asarray( vec1, dtype=np.complex128 ),
+                                   np.asarray( vec2, dtype=np.complex128 ),
+                                   self.nmax, self.mmax )
+        else:
+            return VectorCoefsStack( vec1, vec2, self.nmax, self.mmax )
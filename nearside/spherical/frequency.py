@@ -0,0 +1,243 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+       frequency: frequency interpolation and time domain of coefficients
+
+Operations along the frequency axis (axis 0) of a VectorCoefsStack measured
+at uniformly spaced frequencies. Every mode of both coefficient vectors is
+transformed with a single FFT call. The time dependence is exp(-1j w t), so
+a delay tau (a factor exp(1j 2 pi f tau)) shows up at the time +tau.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#--------------------------------------------------------------------3rd Party
+import numpy as np
+
+#------------------------------------------------------------------------Custom
+from .structures import VectorCoefsStack, stack_coefs
+
+#=============================================================================
+# Helpers
+#=============================================================================
+
+def _frequency_stack( coefficients, frequencies ):
+    """Returns the stack, the modes of vec1 and vec2 side by side in one
+    array (frequency first) and the frequency step."""
+
+    if not isinstance( coefficients, VectorCoefsStack ):
+        coefficients = stack_coefs( coefficients )
+
+    f = np.asarray( frequencies, dtype=np.float64 )
+    if f.ndim != 1 or len( f ) < 2 or len( f ) != len( coefficients ):
+        raise ValueError("frequencies must hold one value per set of " +
+                         "coefficients along axis 0")
+
+    df = f[1] - f[0]
+    if df <= 0 or not np.allclose( np.diff( f ), df, rtol=1e-6, atol=0 ):
+        raise ValueError("frequencies must be increasing and uniformly " +
+                         "spaced")
+
+    X = np.concatenate( [coefficients.vec1, coefficients.vec2], axis=-1 )
+
+    return (coefficients, X, df)
+
+def _unstack( X, c ):
+    """Splits the side by side modes back into a VectorCoefsStack."""
+    return VectorCoefsStack( X[..., :c.size], X[..., c.size:],
+                             c.nmax, c.mmax )
+
+#=============================================================================
+# Operations
+#=============================================================================
+
+def frequency_to_time( coefficients, frequencies, nfft = None ):
+    """Transforms every mode of the coefficients to the time domain.
+
+    The spectrum is zero padded to *nfft* samples, so the time step is
+    1 / (nfft df) and the responses are periodic in 1 / df. Times beyond
+    half of the period are returned as negative times.
+
+    Example::
+
+        >>> (h, t) = nearside.spherical.frequency_to_time(s, f, nfft = 1024)
+        >>> h.shape
+        (1024,)
+
+    Args:
+      coefficients (VectorCoefsStack or list): The coefficients, with one
+      set per frequency along axis 0.
+
+      frequencies (array_like): The uniformly spaced frequencies.
+
+      nfft (int, optional): Length of the transform, at least the number of
+      frequencies, which is the default.
+
+    Returns:
+      (VectorCoefsStack, numpy.ndarray): The time responses and the times
+      (in the reciprocal unit of the frequencies).
+
+    Raises:
+      ValueError: Is raised if the frequencies aren't uniformly spaced or
+      nfft is too small.
+
+    """
+
+    (c, X, df) = _frequency_stack( coefficients, frequencies )
+
+    F = X.shape[0]
+    if nfft is None:
+        nfft = F
+    if nfft < F:
+        raise ValueError("nfft must be at least the number of frequencies")
+
+    h = np.fft.fft( X, n=nfft, axis=0 )
+
+    return (_unstack( h, c ), np.fft.fftfreq( nfft, df ))
+
+def time_to_frequency( responses, nfrequencies ):
+    """Inverse of frequency_to_time: returns the coefficients at the first
+    *nfrequencies* frequencies from the time responses (a VectorCoefsStack
+    with time along axis 0)."""
+
+    X = np.concatenate( [responses.vec1, responses.vec2], axis=-1 )
+    X = np.fft.ifft( X, axis=0 )[:nfrequencies]
+
+    return _unstack( X, responses )
+
+def time_gate( coefficients, frequencies, start, stop, taper = 0.0,
+               nfft = None ):
+    """Removes the part of every mode response that lies outside the time
+    window [start, stop], e.g. reflections from the chamber that arrive
+    after the direct signal.
+
+    The coefficients are transformed to the time domain, multiplied by the
+    gate and transformed back to the original frequencies, all modes in one
+    FFT pass. The gate has raised cosine edges of width *taper*.
+
+    Example::
+
+        >>> g = nearside.spherical.time_gate(s, f, -2e-9, 2e-9,
+        ...                                  taper = 0.5e-9)
+
+    Args:
+      coefficients (VectorCoefsStack or list): The coefficients, with one
+      set per frequency along axis 0.
+
+      frequencies (array_like): The uniformly spaced frequencies.
+
+      start (float): Start of the gate.
+
+      stop (float): End of the gate.
+
+      taper (float, optional): Width of the edges of the gate.
+
+      nfft (int, optional): Length of the transform, see frequency_to_time.
+
+    Returns:
+      VectorCoefsStack: The gated coefficients.
+
+    Raises:
+      ValueError: Is raised if the frequencies aren't uniformly spaced or if
+      stop isn't after start.
+
+    """
+
+    if stop <= start:
+        raise ValueError("stop must be after start")
+
+    (h, t) = frequency_to_time( coefficients, frequencies, nfft )
+
+    # distance outside of the gate, measured from its edges
+    d = np.maximum( start - t, t - stop )
+    if taper > 0:
+        gate = np.where( d <= -taper, 1.0,
+                   np.where( d >= 0, 0.0,
+                             0.5 - 0.5 * np.cos( np.pi * d / taper ) ) )
+    else:
+        gate = np.where( d <= 0, 1.0, 0.0 )
+
+    gate = gate.reshape( (-1,) + (1,) * (h.vec1.ndim - 1) )
+    gated = VectorCoefsStack( gate * h.vec1, gate * h.vec2, h.nmax, h.mmax )
+
+    return time_to_frequency( gated, len( frequencies ) )
+
+def interpolate_frequency( coefficients, frequencies, factor ):
+    """Band limited interpolation of the coefficients to a frequency step
+    *factor* times smaller.
+
+    The time responses (period 1 / df) are zero padded in the middle, which
+    is exact for responses that are limited to the times between -1 / 2df
+    and 1 / 2df, i.e. for an antenna and range that are small compared with
+    c / 2df.
+
+    Example::
+
+        >>> (fine, ff) = nearside.spherical.interpolate_frequency(s, f, 8)
+        >>> len(ff) == 8 * (len(f) - 1) + 1
+        True
+
+    Args:
+      coefficients (VectorCoefsStack or list): The coefficients, with one
+      set per frequency along axis 0.
+
+      frequencies (array_like): The uniformly spaced frequencies.
+
+      factor (int): The refinement of the frequency step.
+
+    Returns:
+      (VectorCoefsStack, numpy.ndarray): The coefficients at the new
+      frequencies and the new frequencies, which include the original ones.
+
+    Raises:
+      ValueError: Is raised if the frequencies aren't uniformly spaced or
+      factor is smaller than 1.
+
+    """
+
+    factor = int( factor )
+    if factor < 1:
+        raise ValueError("factor must be a positive integer")
+
+    (c, X, df) = _frequency_stack( coefficients, frequencies )
+
+    F = X.shape[0]
+    h = np.fft.fft( X, axis=0 )
+
+    # zero padding between the positive and the negative times
+    hp = np.zeros( (factor * F,) + h.shape[1:], dtype=h.dtype )
+    P = (F + 1) // 2
+    hp[:P] = h[:P]
+    hp[factor * F - (F - P):] = h[P:]
+    if F % 2 == 0 and factor > 1:
+        # split the sample at half the period between both ends (for 
+        # factor 1 both ends are the same sample)
+        hp[P] = 0.5 * h[P]
+        hp[factor * F - (F - P)] = 0.5 * h[P]
+
+    Xi = factor * np.fft.ifft( hp, axis=0 )[:factor * (F - 1) + 1]
+    f = frequencies[0] + df / factor * np.arange( factor * (F - 1) + 1 )
+
+    return (_unstack( Xi, c ), f)
@@ -0,0 +1,284 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+            spiral: spherical scans along spiral trajectories
+
+A range that moves theta and phi at once samples the sphere along a spiral.
+The samples are moved onto the uniform grid of vcoefs_from_pattern by a
+sparse gridding operator that only depends on the trajectory, so it is
+built once, saved with the measurement setup, and each frequency only
+costs a sparse product and the uniform transform.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#--------------------------------------------------------------------3rd Party
+import numpy as np
+
+#------------------------------------------------------------------------Custom
+from nearside._lazy import lazy_module
+from . import low_level
+from .structures import (VectorCoefsStack,
+                         SphericalMeasurementTransverseNonUniform)
+
+sp = lazy_module('spherepy')
+
+#=============================================================================
+# Helpers
+#=============================================================================
+
+def _lagrange_weights( nodes, x ):
+    """Weights w[p, k] of the Lagrange polynomial through nodes[p, :]
+    evaluated at x[p]."""
+
+    K = nodes.shape[-1]
+    w = np.ones( nodes.shape )
+    for k in range( K ):
+        for j in range( K ):
+            if j != k:
+                w[:, k] *= (x - nodes[:, j]) / (nodes[:, k] - nodes[:, j])
+    return w
+
+def _stencils( nodes, x, order ):
+    """Start index of the *order* nodes (of the increasing array nodes)
+    that are centred on each x."""
+
+    i = np.searchsorted( nodes, x )
+    return np.clip( i - order // 2, 0, len( nodes ) - order )
+
+#=============================================================================
+# Objects
+#=============================================================================
+
+class SpiralGridding(object):
+    """Sparse operator that interpolates samples taken along a spiral
+    trajectory (theta(t), phi(t)) onto the uniform grid
+    theta = linspace(0, pi, nrows), phi = 2 pi k / ncols.
+
+    The trajectory must advance in phi (it may wrap at 2 pi) and must not
+    go back in theta. Along each turn the samples are interpolated to the
+    phi of every column, and the crossings of a column by the successive
+    turns are then interpolated in theta, both with Lagrange polynomials
+    through *order* points. Every grid point therefore depends on order^2
+    samples; the operator is held as a compressed sparse row matrix.
+
+    Example::
+
+        >>> g = nearside.spherical.SpiralGridding(theta, phi, 62, 120)
+        >>> g.save('spiral_setup.npz')
+        >>> g = nearside.spherical.SpiralGridding.load('spiral_setup.npz')
+        >>> c = nearside.spherical.spiral_coefs(measurement, 60, gridding = g)
+
+    Args:
+      theta (array_like): theta of the samples, in the order they were
+      taken.
+
+      phi (array_like): phi of the samples.
+
+      nrows (int): Number of theta rows of the grid (0 and pi included).
+
+      ncols (int): Number of phi columns of the grid.
+
+      order (int, optional): Number of points of the interpolation
+      stencils.
+
+    Raises:
+      ValueError: Is raised if the trajectory doesn't advance in phi, goes
+      back in theta, or is too short for the stencils.
+
+    """
+    def __init__(self, theta, phi, nrows, ncols, order = 6):
+
+        theta = np.asarray( theta, dtype=np.float64 ).ravel()
+        phi = np.unwrap( np.asarray( phi, dtype=np.float64 ).ravel() )
+
+        if np.any( np.diff( phi ) <= 0 ) or np.any( np.diff( theta ) < 0 ):
+            raise ValueError("the trajectory must advance in phi and must " +
+                             "not go back in theta")
+
+        # crossings of every column by every turn, interpolated along phi
+        pc = 2.0 * np.pi * np.arange( ncols ) / ncols
+        q = np.arange( np.floor( phi[0] / (2 * np.pi) ),
+                       np.ceil( phi[-1] / (2 * np.pi) ) + 1 )
+        target = (pc[None, :] + 2.0 * np.pi * q[:, None])
+        inside = (target >= phi[0]) & (target <= phi[-1])
+        if np.min( np.sum( inside, axis=0 ) ) < order or len( phi ) < order:
+            raise ValueError("the trajectory is too short for the stencils")
+
+        rows = []
+        cols = []
+        vals = []
+        theta_grid = np.linspace( 0, np.pi, nrows )
+        off = np.arange( order )
+
+        for c in range( ncols ):
+            t = target[inside[:, c], c]
+            s = _stencils( phi, t, order )
+            l = _lagrange_weights( phi[s[:, None] + off], t )
+            tc = np.sum( l * theta[s[:, None] + off], axis=-1 )
+
+            # crossings to the theta rows of the column
+            r = _stencils( tc, theta_grid, order )
+            L = _lagrange_weights( tc[r[:, None] + off], theta_grid )
+
+            # grid point (row, c) from sample s[r + i] + k
+            idx = s[r[:, None] + off][:, :, None] + off
+            w = L[:, :, None] * l[r[:, None] + off]
+            rows.append( np.repeat( np.arange( nrows ) * ncols + c,
+                                    order * order ) )
+            cols.append( idx.reshape( -1 ) )
+            vals.append( w.reshape( -1 ) )
+
+        rows = np.concatenate( rows )
+        perm = np.argsort( rows, kind='stable' )
+
+        self._indptr = np.searchsorted( rows[perm],
+                                        np.arange( nrows * ncols ) )
+        self._indices = np.concatenate( cols )[perm]
+        self._data = np.concatenate( vals )[perm]
+        self._nrows = nrows
+        self._ncols = ncols
+        self._nsamples = len( theta )
+
+    @classmethod
+    def load(cls, filename):
+        """Reads an operator that was written by save."""
+
+        g = cls.__new__( cls )
+        with np.load( filename ) as f:
+            g._indptr = f['indptr']
+            g._indices = f['indices']
+            g._data = f['data']
+            (g._nrows, g._ncols, g._nsamples) = [int( v ) for v in
+                                                 f['shape']]
+
+        return g
+
+    def save(self, filename):
+        """Writes the operator to *filename* (numpy .npz)."""
+
+        np.savez( filename, indptr=self._indptr, indices=self._indices,
+                  data=self._data,
+                  shape=np.array( [self._nrows, self._ncols,
+                                   self._nsamples] ) )
+
+    @property
+    def nrows(self):
+        """Number of theta rows of the grid."""
+        return self._nrows
+
+    @property
+    def ncols(self):
+        """Number of phi columns of the grid."""
+        return self._ncols
+
+    @property
+    def nsamples(self):
+        """Number of samples of the trajectory."""
+        return self._nsamples
+
+    def __repr__(self):
+        return "SpiralGridding(nsamples = {0}, nrows = {1}, ncols = {2})".\
+                          format(self._nsamples, self._nrows, self._ncols)
+
+    def apply(self, samples):
+        """Interpolates samples[..., nsamples] onto the grid, returns an
+        array of shape samples.shape[:-1] + (nrows, ncols)."""
+
+        samples = np.asarray( samples )
+        if samples.shape[-1] != self._nsamples:
+            raise ValueError("the last axis of samples must have length " +
+                             str( self._nsamples ))
+
+        p = samples[..., self._indices] * self._data
+        g = np.add.reduceat( p, self._indptr, axis=-1 )
+
+        return g.reshape( samples.shape[:-1] + (self._nrows, self._ncols) )
+
+#=============================================================================
+# Operations
+#=============================================================================
+
+def spiral_points( nturns, samples_per_turn ):
+    """A spiral from the north to the south pole with *nturns* turns in phi
+    and *samples_per_turn* samples per turn. Returns (theta, phi)."""
+
+    t = np.arange( int( nturns * samples_per_turn ) + 1 ) / \
+        float( nturns * samples_per_turn )
+
+    return (np.pi * t, (2.0 * np.pi * nturns * t) % (2.0 * np.pi))
+
+def spiral_coefs( measurement, nmax, mmax = None, gridding = None,
+                  order = 6 ):
+    """Computes the coefficients of a spiral scan: the samples are moved
+    onto the uniform grid by the sparse SpiralGridding of the trajectory
+    and transformed with vcoefs_from_pattern. The gridding depends only on
+    the trajectory; build (or load) it once and pass it for every
+    frequency.
+
+    Args:
+      measurement (SphericalMeasurementTransverseNonUniform): The samples,
+      possibly stacked along leading axes.
+
+      nmax (int): nmax of the result.
+
+      mmax (int, optional): mmax of the result, nmax by default.
+
+      gridding (SpiralGridding, optional): The operator of the trajectory.
+      By default one with nmax + 2 rows and 2 nmax + 2 columns is built.
+
+      order (int, optional): Stencil size if the gridding is built here.
+
+    Returns:
+      VectorCoefs or VectorCoefsStack: The coefficients.
+
+    Raises:
+      TypeError: Is raised if measurement isn't a
+      SphericalMeasurementTransverseNonUniform object.
+
+      ValueError: Is raised if the grid is too small for nmax and mmax.
+
+    """
+
+    if not isinstance( measurement, SphericalMeasurementTransverseNonUniform ):
+        raise TypeError("measurement must be a " +
+                        "SphericalMeasurementTransverseNonUniform object")
+
+    if mmax is None:
+        mmax = nmax
+    if gridding is None:
+        gridding = SpiralGridding( measurement.theta, measurement.phi,
+                                   nmax + 2, 2 * nmax + 2, order )
+    if gridding.nrows < nmax + 2 or gridding.ncols < 2 * mmax + 1:
+        raise ValueError("the grid needs nmax + 2 rows and 2 mmax + 1 " +
+                         "columns")
+
+    g = gridding.apply( np.stack( [measurement.etheta, measurement.ephi] ) )
+    (vec1, vec2) = low_level.vcoefs_from_pattern( g[0], g[1], nmax, mmax )
+
+    if vec1.ndim == 1:
+        return sp.VectorCoefs( vec1, vec2, nmax, mmax )
+    else:
+        return VectorCoefsStack( vec1, vec2, nmax, mmax )
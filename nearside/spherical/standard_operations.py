@@ -39,18 +39,16 @@ from __future__ import absolute_import
 from six.moves import range  #use range instead of xrange
 #-----------------------------------------------------------------------------
 
-#---------------------------------------------------------------------Built-ins
-
-import json
-from os.path import dirname
-import copy
-
 #--------------------------------------------------------------------3rd Party
 import numpy as np
-import spherepy as sp
-from . import low_level 
 
 #------------------------------------------------------------------------Custom
+from nearside._lazy import lazy_module
+from . import low_level 
+from .structures import VectorCoefsStack, ChannelCoefs
+from .symmetry import SymmetricCoefs
+
+sp = lazy_module('spherepy')
 
 #=============================================================================
 # Global Declarations
@@ -59,6 +57,14 @@ from . import low_level
 external = 0
 internal = 1
 
+double = low_level.double
+single = low_level.single
+set_precision = low_level.set_precision
+get_precision = low_level.get_precision
+
+# relative field error used by truncate = 'auto'
+auto_truncation_error = 1e-6
+
 #==============================================================================
 # Operations
 #==============================================================================
@@ -74,11 +80,13 @@ def reciprocity( coefficients ):
         >>> print(p)
 
     Args:
-      coefficients (VectorCoefs): The coefficients to be transformed to 
-      pattern space.
+      coefficients (VectorCoefs or SymmetricCoefs): The coefficients to be 
+      transformed to pattern space. Of SymmetricCoefs only the stored modes
+      are processed.
 
     Returns:
-      VectorCoefs: This is the reciprocal version of the input coefficients. 
+      VectorCoefs or SymmetricCoefs: This is the reciprocal version of the 
+      input coefficients. 
 
     Raises:
       TypeError: Is raised if coefficients isn't a VectorCoefs object.
@@ -89,8 +97,12 @@ def reciprocity( coefficients ):
           
         return _reciprocity_implemented( coefficients )
 
+    elif isinstance( coefficients, SymmetricCoefs ):
+
+        return _reciprocity_symmetric( coefficients )
+
     else:
-        TypeError("cannot perform reciprocity on this object.")
+        raise TypeError("cannot perform reciprocity on this object.")
 
 
 
@@ -132,7 +144,17 @@ def _reciprocity_implemented( coefficients ):
 
     return sc
 
+def _reciprocity_symmetric( coefficients ):
+    """Same signs as _reciprocity_implemented: vec1 is multiplied by 
+    (-1)^n and vec2 by (-1)^(n + 1), for m and -m alike, so the symmetry
+    is kept."""
 
+    (n, _) = low_level.mode_numbers( coefficients.nmax, coefficients.mmax )
+    s = (-1.0) ** n[coefficients.modes]
+
+    return SymmetricCoefs( coefficients.vec1 * s, -coefficients.vec2 * s, 
+                           coefficients.nmax, coefficients.mmax, 
+                           coefficients.symmetry )
 
 def rotate_around_y_by_pi( coefficients ):
     """Rotates the probe by pi radians in coefficient space.
@@ -144,10 +166,12 @@ def rotate_around_y_by_pi( coefficients ):
         >>> print(p)
 
     Args:
-      coefficients (VectorCoefs): The coefficients to be rotated. 
+      coefficients (VectorCoefs or SymmetricCoefs): The coefficients to be 
+      rotated. Of SymmetricCoefs only the stored modes are processed.
 
     Returns:
-      VectorCoefs: This is the rotated version of the input coefficients. 
+      VectorCoefs or SymmetricCoefs: This is the rotated version of the 
+      input coefficients. 
 
     Raises:
       TypeError: Is raised if coefficients isn't a VectorCoefs object.
@@ -157,8 +181,12 @@ def rotate_around_y_by_pi( coefficients ):
         
         return _rotate_around_y_by_pi_implementation( coefficients )
 
+    elif isinstance( coefficients, SymmetricCoefs ):
+
+        return _rotate_around_y_by_pi_symmetric( coefficients )
+
     else:
-        TypeError("cannot rotate this object.")
+        raise TypeError("cannot rotate this object.")
 
 def _rotate_around_y_by_pi_implementation( coefficients ):
 
@@ -191,9 +219,301 @@ def _rotate_around_y_by_pi_implementation( coefficients ):
 
     return sc
 
-def translate_symmetric_probe( NN, coefficients, kr, region = external):
+def _rotate_around_y_by_pi_symmetric( coefficients ):
+    """Mode (n, m) of the result is (-1)^(n + m) times mode (n, -m), which
+    the symmetry gives in terms of the stored modes."""
+
+    (nmax, mmax) = (coefficients.nmax, coefficients.mmax)
+    (n, m) = low_level.mode_numbers( nmax, mmax )
+    (n, m) = (n[coefficients.modes], m[coefficients.modes])
+    (src, f1, f2) = coefficients.symmetry.mirror_modes( nmax, mmax )
+    s = (-1.0) ** (n + np.abs( m ))
+    (f1, f2) = (np.where( m == 0, 1, f1 ), np.where( m == 0, 1, f2 ))
+
+    return SymmetricCoefs( s * f1 * coefficients.vec1[..., src], 
+                           s * f2 * coefficients.vec2[..., src],
+                           nmax, mmax, coefficients.symmetry )
+
+def rotate( coefficients, alpha, beta, gamma, precision = None ):
+    """Rotates the pattern by the Euler angles (alpha, beta, gamma) in 
+    coefficient space. The field is rotated by Rz(alpha) Ry(beta) Rz(gamma)
+    (z-y-z, active), so a pattern expressed in a mounting frame is brought 
+    into the frame that the mounting frame is rotated with respect to. 
+    rotate(c, 0, pi, 0) is the same as rotate_around_y_by_pi(c).
+
+    The Wigner-D matrices come from the cached d(pi/2) recursion tables 
+    and the d(beta) tables of recent values of beta are cached as well, so
+    rotating many frequencies or states is cheap. A VectorCoefsStack is 
+    rotated with one matrix product per n.
+
+    Example::
+
+        >>> c = spherepy.random_coefs(10, 10, coef_type=spherepy.vector)
+        >>> r = nearside.spherical.rotate(c, 0.1, 0.5, -0.3)
+        >>> c2 = nearside.spherical.rotate(r, 0.3, -0.5, -0.1)
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients to be
+      rotated.
+
+      alpha (float): First rotation about z, in radians.
+
+      beta (float): Rotation about y, in radians.
+
+      gamma (float): Second rotation about z, in radians.
+
+      precision (str, optional): double or single, see probe_correct.
+
+    Returns:
+      VectorCoefs or VectorCoefsStack: The rotated coefficients. The mmax of
+      the result is nmax unless beta is a multiple of pi, in which case mmax
+      is kept.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+    """
+
+    (vec1, vec2, nmax, mmax) = _coefficient_vectors( coefficients )
+
+    if abs( np.sin( beta ) ) < 1e-14:
+        new_mmax = mmax
+    else:
+        new_mmax = nmax
+
+    (out1, out2) = low_level.rotate_coefs( vec1, vec2, nmax, mmax, new_mmax,
+                                           alpha, beta, gamma, precision )
+
+    if isinstance( coefficients, sp.VectorCoefs):
+        return sp.VectorCoefs(np.asarray(out1, dtype=np.complex128), 
+                              np.asarray(out2, dtype=np.complex128), 
+                              nmax, new_mmax)
+    else:
+        return VectorCoefsStack(out1, out2, nmax, new_mmax)
+
+def translate_z( coefficients, kd, nmax = None, precision = None,
+                 truncate = None ):
+    """Moves the origin of the pattern to the point z = d on the z-axis. An 
+    antenna that is mounted off the centre of the measurement sphere needs
+    far fewer modes once the origin is moved to it, which speeds up every 
+    later operation; use truncate to drop the modes that are no longer 
+    needed.
+
+    The translation is exact: the far-field pattern is multiplied by 
+    exp(1j kd cos(theta)) and projected back onto the vector spherical 
+    harmonics with the coupling integrals of bc_comp. The matrices for a 
+    given (kd, nmax, mmax) are computed once and cached, so every set of a
+    stack, and the next call with the same kd, reuses them.
+
+    Example::
+
+        >>> c2 = nearside.spherical.translate_z(c, k * d, truncate = 'auto')
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients.
+
+      kd (float): Electrical distance to the new origin, positive along +z.
+
+      nmax (int, optional): nmax of the result. The default adds the 
+      bandwidth of the plane wave factor (see mode_budget) to the nmax of
+      coefficients, which keeps the result exact to round off.
+
+      precision (str, optional): double or single, see probe_correct.
+
+      truncate (None, 'auto' or float, optional): If set, the result is 
+      trimmed with truncate_coefs.
+
+    Returns:
+      VectorCoefs or VectorCoefsStack: The translated coefficients.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+    """
+
+    (vec1, vec2, old_nmax, mmax) = _coefficient_vectors( coefficients )
+
+    if nmax is None:
+        nmax = old_nmax + low_level.excess_bandwidth_nmax( abs( kd ), 1e-16 )
+
+    (out1, out2) = low_level.translate_z_coefs( vec1, vec2, old_nmax, mmax, 
+                                                nmax, kd, precision )
+    mmax = min( mmax, nmax )
+
+    if isinstance( coefficients, sp.VectorCoefs):
+        result = sp.VectorCoefs(np.asarray(out1, dtype=np.complex128), 
+                                np.asarray(out2, dtype=np.complex128), 
+                                nmax, mmax)
+    else:
+        result = VectorCoefsStack(out1, out2, nmax, mmax)
+
+    return _truncated( result, truncate )
+
+def translate( coefficients, kr0, nmax = None, precision = None, 
+               truncate = None ):
+    """Moves the origin of the pattern to the point kr0 (electrical, k times
+    x, y, z). The far-field pattern is multiplied by exp(1j kr0 . r) on a 
+    grid that resolves the product and projected back onto the vector 
+    spherical harmonics, which is exact to round off. Every set of a stack 
+    may be moved to its own point, and all of them are transformed 
+    together. For moves along z, translate_z is cheaper when it is called 
+    repeatedly with the same kd.
+
+    Example::
+
+        >>> c2 = nearside.spherical.translate(c, k * np.array([x, y, z]))
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients.
+
+      kr0 (array_like): The new origin, shape (3,) or, for a stack, 
+      (..., 3) broadcast against the stack shape.
+
+      nmax (int, optional): nmax (and mmax) of the result. The default adds
+      the bandwidth of the plane wave factor to the nmax of coefficients.
+
+      precision (str, optional): double or single, used to evaluate the 
+      pattern.
+
+      truncate (None, 'auto' or float, optional): If set, the result is 
+      trimmed with truncate_coefs.
+
+    Returns:
+      VectorCoefs or VectorCoefsStack: The translated coefficients.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+    """
+
+    (vec1, vec2, old_nmax, mmax) = _coefficient_vectors( coefficients )
+    kr0 = np.asarray( kr0, dtype=np.float64 )
+
+    L = old_nmax + low_level.excess_bandwidth_nmax( 
+                                np.max( np.linalg.norm( kr0, axis=-1 ) ), 
+                                1e-16 )
+    if nmax is None:
+        nmax = L
+    L = max( L, nmax )
+
+    nrows = L + 2
+    ncols = 2 * L + 2
+    (et, ep) = low_level.pattern_on_grid( vec1, vec2, old_nmax, mmax, 
+                                          nrows, ncols, precision )
+
+    theta = np.linspace( 0, np.pi, nrows )[:, None]
+    phi = 2.0 * np.pi * np.arange( ncols ) / ncols
+    r = low_level.directions( theta, phi )
+    e = np.exp( 1j * np.einsum( '...c,jlc->...jl', kr0, r ) )
+
+    (out1, out2) = low_level.vcoefs_from_pattern( et * e, ep * e, 
+                                                  nmax, nmax )
+
+    if isinstance( coefficients, sp.VectorCoefs) and out1.ndim == 1:
+        result = sp.VectorCoefs( out1, out2, nmax, nmax )
+    else:
+        result = VectorCoefsStack( out1, out2, nmax, nmax )
+
+    return _truncated( result, truncate )
+
+def modal_filter( coefficients, kr0, ka, error = auto_truncation_error,
+                  precision = None ):
+    """Suppresses the contributions of range reflections (MARS style
+    modal filtering). The origin is moved to the physical centre kr0 of
+    the AUT, where the AUT needs no modes beyond the minimum sphere limit
+    of its electrical radius ka (see mode_budget). Those modes are removed,
+    which removes most of the scattered field of the chamber that comes
+    from far away, and the origin is moved back.
+
+    For a frequency sweep, pass a VectorCoefsStack with one set per
+    frequency together with kr0 of shape (F, 3) and ka of shape (F,). Every
+    frequency is filtered in the same pass, with its own mode limit.
+
+    Example::
+
+        >>> f = nearside.spherical.modal_filter(stack,
+        ...                 k[:, None] * centre, k * a, error = 1e-4)
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The measured
+      coefficients, e.g. after probe_correct. The measurement should be
+      taken with the AUT offset from the centre of rotation, which moves
+      the reflections away from its minimum sphere.
+
+      kr0 (array_like): The electrical position of the AUT centre, shape
+      (3,) or (..., 3) broadcast against the stack shape.
+
+      ka (float or array_like): Electrical radius of the minimum sphere
+      about kr0 that encloses the AUT, broadcast against the stack shape.
+
+      error (float, optional): Relative error of the mode limit.
+
+      precision (str, optional): double or single, used to evaluate the
+      pattern.
+
+    Returns:
+      VectorCoefs or VectorCoefsStack: The filtered coefficients, with the
+      nmax and mmax of coefficients.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or
+      VectorCoefsStack object.
+
+    """
+
+    (vec1, vec2, nmax, mmax) = _coefficient_vectors( coefficients )
+
+    ka = np.asarray( ka, dtype=np.float64 )
+    nfilter = np.reshape( [low_level.excess_bandwidth_nmax( x, error )
+                           for x in ka.ravel()], ka.shape )
+
+    (out1, out2) = low_level.modal_filter_coefs( vec1, vec2, nmax, mmax,
+                                                 kr0, nfilter, precision )
+
+    if isinstance( coefficients, sp.VectorCoefs) and out1.ndim == 1:
+        return sp.VectorCoefs( out1, out2, nmax, mmax )
+    else:
+        return VectorCoefsStack( out1, out2, nmax, mmax )
+
+def translate_symmetric_probe( NN, coefficients, kr, region = external,
+                               truncate = None ):
+    """Translates the probe coefficients to the measurement radius. Only the
+    mu = +-1 coefficients of the probe are used.
+
+    Args:
+      NN (int): Multipole limit of the translated probe data. This must be at
+      least the nmax of the coefficients that will be corrected, see 
+      mode_budget.
+
+      coefficients (VectorCoefs): Probe coefficients.
+
+      kr (float): Electrical radius of the measurement sphere.
+
+      region (int, optional): external or internal.
+
+      truncate (None, 'auto' or float, optional): If set, the probe 
+      coefficients are first trimmed in n to the relative error *truncate* 
+      ('auto' uses auto_truncation_error), which skips the translation of 
+      probe modes that carry no power.
+
+    Returns:
+      numpy.ndarray: R, an NN+1 by 4 array.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs object.
+
+    """
 
     if isinstance( coefficients, sp.VectorCoefs): 
+        if truncate is not None:
+            (nmax, _) = truncation_orders( coefficients, 
+                                           _truncation_error( truncate ) )
+            coefficients = truncate_coefs( coefficients, nmax = nmax,
+                                   mmax = min( coefficients.mmax, nmax ) )
+
         neg = coefficients[:,-1]
         pos = coefficients[:, 1]
 
@@ -206,59 +526,1146 @@ def translate_symmetric_probe( NN, coefficients, kr, region = external):
         return R
 
     else:
-        TypeError("cannot translate this object.")
+        raise TypeError("cannot translate this object.")
      
 
-def probe_correct( coefficients_to_correct, translated_probe_data):
+def probe_correct( coefficients_to_correct, translated_probe_data, 
+                   precision = None, truncate = None ):
     """Correctes the measured data using the probe data.
-    Probe correction is performed in coefficient space.
+    Probe correction is performed in coefficient space. A VectorCoefsStack
+    holding many measurements taken with the same probe, frequency and 
+    radius is corrected in a single broadcasted operation.
 
-    
+    Example::
+
+        >>> R = nearside.spherical.translate_symmetric_probe(NN, p, kr)
+        >>> stack = nearside.spherical.stack_coefs(measurements)
+        >>> corrected = nearside.spherical.probe_correct(stack, R)
+
+    Args:
+      coefficients_to_correct (VectorCoefs, VectorCoefsStack or 
+      SymmetricCoefs): The measured coefficients. Of SymmetricCoefs only the 
+      stored modes are corrected and the result keeps the symmetry. This is
+      exact if the translated probe has no cross-polar part, 
+      R[:, 0] = -R[:, 2] and R[:, 1] = R[:, 3] (e.g. probe coefficients with 
+      Symmetry(xz = -1, yz = 1)), and a ValueError is raised otherwise.
+
+      translated_probe_data (numpy.ndarray): R from translate_symmetric_probe.
+
+      precision (str, optional): double or single, None uses get_precision().
+      The correction matrices are always computed in double; in single they 
+      are applied in complex64, which leaves a relative error of a few times
+      1e-7 times the condition number of the 2x2 matrix of each n.
+
+      truncate (None, 'auto' or float, optional): If set, the measured 
+      coefficients are trimmed with truncate_coefs before the correction, 
+      and the result has the smaller nmax, mmax.
+
+    Returns:
+      VectorCoefs or VectorCoefsStack: The corrected coefficients, of the same
+      type as coefficients_to_correct. A stack is returned in the complex 
+      type of *precision*, a VectorCoefs is always complex128.
+
+    Raises:
+      TypeError: Is raised if coefficients_to_correct isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+      ValueError: Is raised for SymmetricCoefs if R doesn't satisfy the 
+      relations above.
 
     """
-       
-    if isinstance( coefficients_to_correct, sp.VectorCoefs):
-                                                                                 
-        R = translated_probe_data
-        tsh = coefficients_to_correct
-        psh = tsh.copy()
 
-        # correct each mode individually
-        for n in range(1, tsh.nmax + 1):
-            for m in range( -n, n + 1 ):
-                if ( abs(m) <= tsh.mmax ):
-                    M = low_level.make_inverse_R_matrix(R, n)
-                    psh[n,m] = list(np.dot( M, tsh[n, m] ))
+    return _apply_probe( _truncated( coefficients_to_correct, truncate ), 
+                         translated_probe_data, low_level.probe_correct, 
+                         precision )
 
-        corrected_coefficients = psh
+def probe_response( coefficients, translated_probe_data, precision = None,
+                    truncate = None ):
+    """Calculates the response of the probe to the field represented by 
+    *coefficients*. This is the inverse of probe_correct and accepts the 
+    same types.
 
-        return corrected_coefficients
+    Args:
+      coefficients (VectorCoefs, VectorCoefsStack or SymmetricCoefs): The 
+      coefficients of the field.
+
+      translated_probe_data (numpy.ndarray): R from translate_symmetric_probe.
+
+      precision (str, optional): double or single, see probe_correct.
+
+      truncate (None, 'auto' or float, optional): See probe_correct.
 
+    Returns:
+      VectorCoefs or VectorCoefsStack: The probe response.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+      ValueError: See probe_correct.
+
+    """
+
+    return _apply_probe( _truncated( coefficients, truncate ), 
+                         translated_probe_data, low_level.probe_response, 
+                         precision )
+
+# relative tolerance of the probe relations that SymmetricCoefs rely on
+_symmetric_probe_tol = 1e-10
+
+def _apply_probe( coefficients, R, operation, precision ):
+
+    if isinstance( coefficients, SymmetricCoefs ):
+        R = np.asarray( R )
+        scale = _symmetric_probe_tol * np.max( np.abs( R ), initial = 0.0 )
+        if ( np.max( np.abs( R[..., 0] + R[..., 2] ), initial = 0.0 ) > scale
+             or np.max( np.abs( R[..., 1] - R[..., 3] ), 
+                        initial = 0.0 ) > scale ):
+            raise ValueError( "the translated probe has a cross-polar part, "
+                              "R[:, 0] = -R[:, 2] and R[:, 1] = R[:, 3] "
+                              "don't hold; use the full coefficients" )
+        (out1, out2) = operation( R, coefficients.vec1, coefficients.vec2, 
+                                  coefficients.nmax, coefficients.mmax, 
+                                  precision, coefficients.modes )
+        return SymmetricCoefs( out1, out2, coefficients.nmax, 
+                               coefficients.mmax, coefficients.symmetry )
+
+    (vec1, vec2, nmax, mmax) = _coefficient_vectors( coefficients )
+
+    (out1, out2) = operation( R, vec1, vec2, nmax, mmax, precision )
+
+    return _same_type( coefficients, out1, out2 )
+
+def _same_type( coefficients, vec1, vec2 ):
+    """Wraps the coefficient vectors vec1 and vec2 into an object of the same
+    type as *coefficients*."""
+
+    if isinstance( coefficients, sp.VectorCoefs):
+        return sp.VectorCoefs(np.asarray(vec1, dtype=np.complex128), 
+                              np.asarray(vec2, dtype=np.complex128), 
+                              coefficients.nmax, coefficients.mmax)
     else:
-        TypeError("cannot probe correct this object.")
+        return VectorCoefsStack(vec1, vec2, coefficients.nmax, 
+                                coefficients.mmax)
+
+def _coefficient_vectors( coefficients ):
+    """Returns (vec1, vec2, nmax, mmax) for a VectorCoefs or a 
+    VectorCoefsStack object."""
+
+    if isinstance( coefficients, sp.VectorCoefs):
+        return (coefficients.scoef1._vec, coefficients.scoef2._vec,
+                coefficients.nmax, coefficients.mmax)
+
+    elif isinstance( coefficients, VectorCoefsStack):
+        return (coefficients.vec1, coefficients.vec2,
+                coefficients.nmax, coefficients.mmax)
+
+    else:
+        raise TypeError("coefficients must be a VectorCoefs or a " + 
+                        "VectorCoefsStack object.")
+
+def translate_probe( NN, coefficients, kr, region = external, 
+                     truncate = None ):
+    """Translates the probe coefficients to the measurement radius. Unlike
+    translate_symmetric_probe every azimuthal mode mu of the probe is used, 
+    which is needed for probes with significant higher order content (wide
+    band horns, open ended waveguides at the top of their band). The 
+    coefficients are given in the same frame as for translate_symmetric_probe
+    and for a probe that only has mu = +-1 modes the result describes the 
+    same measurement.
+
+    The rotation coefficients come from the Wigner d(pi/2) tables, which are
+    computed once per n and cached (see low_level.wigner_d_pi2), and the 
+    theta integrals of the translation are cached per mu, so translating 
+    the same probe to another radius or frequency is cheap.
+
+    Example::
+
+        >>> P = nearside.spherical.translate_probe(NN, p, kr)
+        >>> u = nearside.spherical.channel_coefs_from_grid(data, NN, NN, 
+        ...                                                 p.mmax)
+        >>> T = nearside.spherical.probe_correct_general(u, P)
+
+    Args:
+      NN (int): Multipole limit of the translated probe data, see 
+      translate_symmetric_probe.
+
+      coefficients (VectorCoefs): Probe coefficients; the channels mu run 
+      from -coefficients.mmax to coefficients.mmax.
+
+      kr (float): Electrical radius of the measurement sphere.
+
+      region (int, optional): external or internal.
 
+      truncate (None, 'auto' or float, optional): See 
+      translate_symmetric_probe.
+
+    Returns:
+      numpy.ndarray: P, a 2 mmax + 1 by NN + 1 by 2 array.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs object.
+
+    """
+
+    if not isinstance( coefficients, sp.VectorCoefs):
+        raise TypeError("cannot translate this object.")
+
+    if truncate is not None:
+        (nmax, mmax) = truncation_orders( coefficients, 
+                                          _truncation_error( truncate ) )
+        coefficients = truncate_coefs( coefficients, nmax = nmax, 
+                                       mmax = min( mmax, nmax ) )
+
+    return low_level.translate_probe(NN, coefficients.scoef1._vec, 
+                                     coefficients.scoef2._vec, 
+                                     coefficients.nmax, coefficients.mmax, 
+                                     kr, region = region)
+
+def probe_correct_general( channel_coefs, translated_probe_data, 
+                           precision = None ):
+    """Corrects a measurement made with a probe of any azimuthal order. The 
+    coefficients of each mode are the least squares solution over all the 
+    channels, so the cost over the mu = +-1 correction is a factor of about
+    (2 mumax + 1) / 2.
+
+    Args:
+      channel_coefs (ChannelCoefs): The measured channel coefficients, see 
+      channel_coefs_from_grid.
+
+      translated_probe_data (numpy.ndarray): P from translate_probe.
+
+      precision (str, optional): double or single, see probe_correct.
+
+    Returns:
+      VectorCoefs or VectorCoefsStack: The corrected coefficients, a 
+      VectorCoefsStack if channel_coefs is a stack.
+
+    Raises:
+      TypeError: Is raised if channel_coefs isn't a ChannelCoefs object.
+
+      ValueError: Is raised if the number of channels of channel_coefs and 
+      the probe differ.
+
+    """
+
+    if not isinstance( channel_coefs, ChannelCoefs):
+        raise TypeError("channel_coefs must be a ChannelCoefs object.")
+
+    if translated_probe_data.shape[0] != 2 * channel_coefs.mumax + 1:
+        raise ValueError("the probe and the measurement must have the " +
+                         "same number of channels.")
+
+    nmax = channel_coefs.nmax
+    mmax = channel_coefs.mmax
+    (vec1, vec2) = low_level.probe_correct_general(translated_probe_data, 
+                                                   channel_coefs.u, 
+                                                   nmax, mmax, precision)
+
+    if channel_coefs.shape == ():
+        return sp.VectorCoefs(np.asarray(vec1, dtype=np.complex128), 
+                              np.asarray(vec2, dtype=np.complex128), 
+                              nmax, mmax)
+    else:
+        return VectorCoefsStack(vec1, vec2, nmax, mmax)
+
+def probe_response_general( coefficients, translated_probe_data, 
+                            precision = None, truncate = None ):
+    """Calculates the channel coefficients of the response of a probe of any
+    azimuthal order to the field represented by *coefficients*. This is the
+    inverse of probe_correct_general.
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients of the
+      field.
+
+      translated_probe_data (numpy.ndarray): P from translate_probe.
+
+      precision (str, optional): double or single, see probe_correct.
+
+      truncate (None, 'auto' or float, optional): See probe_correct.
+
+    Returns:
+      ChannelCoefs: The channel coefficients of the probe response.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+    """
+
+    coefficients = _truncated( coefficients, truncate )
+    (vec1, vec2, nmax, mmax) = _coefficient_vectors( coefficients )
+
+    u = low_level.probe_response_general(translated_probe_data, vec1, vec2, 
+                                         nmax, mmax, precision)
+
+    return ChannelCoefs(u, nmax, mmax)
+
+def channel_coefs_from_grid( data, nmax, mmax, mumax ):
+    """Expands probe responses measured on an equally spaced grid into 
+    channel coefficients. The probe is rotated about its own axis to 
+    chi = 2 pi c / nchi, c = 0..nchi-1, at every 
+    theta = pi j / (nrows - 1), phi = 2 pi l / ncols.
+
+    Args:
+      data (numpy.ndarray): The responses, with shape 
+      (..., nchi, nrows, ncols); leading axes index a stack.
+
+      nmax (int): Largest n of the result, nrows must be at least nmax + 2.
+
+      mmax (int): Largest abs(m) of the result, ncols must be at least 
+      2 mmax + 1.
+
+      mumax (int): Largest abs(mu) of the probe, nchi must be at least 
+      2 mumax + 1.
+
+    Returns:
+      ChannelCoefs: The channel coefficients.
+
+    Raises:
+      ValueError: Is raised if the grid is too small.
+
+    """
 
-def probe_response( coefficients, translated_probe_data):
+    w = low_level.chi_to_channels(np.asarray(data), mumax)
+
+    return ChannelCoefs(low_level.spin_analysis(w, nmax, mmax), nmax, mmax)
+
+def grid_from_channel_coefs( channel_coefs, nchi, nrows, ncols ):
+    """Inverse of channel_coefs_from_grid, returns the probe responses as an
+    array of shape (..., nchi, nrows, ncols)."""
+
+    w = low_level.spin_synthesis(channel_coefs.u, channel_coefs.nmax, 
+                                 channel_coefs.mmax, nrows, ncols)
+
+    return low_level.channels_to_chi(w, nchi)
+
+def radiated_power( coefficients ):
+    """Returns the total power radiated by the far-field pattern represented
+    by *coefficients*. The vector spherical harmonics are orthonormal, so 
+    the integral of the magnitude squared of the pattern over the sphere is 
+    the sum of the magnitude squared of the coefficients (Parseval). No 
+    pattern is ever computed.
+
+    Example::
+
+        >>> c = spherepy.random_coefs(10, 10, coef_type=spherepy.vector)
+        >>> p = nearside.spherical.radiated_power(c)
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients of the
+      far-field pattern (e.g. the output of probe_correct).
+
+    Returns:
+      float or numpy.array: The power in the same units as the magnitude
+      squared of the pattern integrated over the sphere. A stack returns an 
+      array with the shape of the stack. The sum is always accumulated in 
+      float64, even for a complex64 stack.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+    """
+
+    (vec1, vec2, _, _) = _coefficient_vectors( coefficients )
+
+    return (np.sum(np.abs(vec1) ** 2, axis=-1, dtype=np.float64) + 
+            np.sum(np.abs(vec2) ** 2, axis=-1, dtype=np.float64))
+
+def directivity( coefficients, theta = 0.0, phi = 0.0, precision = None,
+                 truncate = None ):
+    """Returns the directivity of the far-field pattern represented by 
+    *coefficients* in the direction(s) *theta*, *phi* (radians). The default
+    direction is boresight. 
+
+    The pattern is evaluated directly in coefficient space and the radiated
+    power comes from radiated_power, so the cost is one matrix multiply for
+    an entire stack of coefficient sets.
+
+    Example::
+
+        >>> c = spherepy.random_coefs(10, 10, coef_type=spherepy.vector)
+        >>> d_boresight = nearside.spherical.directivity(c)
+        >>> d_cut = nearside.spherical.directivity(c, 
+        ...                                   numpy.linspace(0, numpy.pi, 91))
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients of the
+      far-field pattern.
+
+      theta (float or numpy.array): Polar angle(s) of the directions.
+
+      phi (float or numpy.array): Azimuthal angle(s) of the directions. Is
+      broadcast against *theta*.
+
+      precision (str, optional): double or single, None uses get_precision().
+      In single the relative error is below 1e-5 for nmax up to 200.
+
+      truncate (None, 'auto' or float, optional): If set, modes that carry 
+      (relatively) no power are dropped before the pattern is evaluated, see
+      truncate_coefs.
+
+    Returns:
+      float or numpy.array: The directivity (linear, not dB). A stack returns 
+      an array with shape stack.shape + broadcast(theta, phi).shape.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+    """
+
+    coefficients = _truncated( coefficients, truncate )
+    (vec1, vec2, nmax, mmax) = _coefficient_vectors( coefficients )
+
+    dshape = np.broadcast(np.asarray(theta), np.asarray(phi)).shape
+
+    (et, ep) = low_level.evaluate_pattern(vec1, vec2, nmax, mmax, theta, phi,
+                                          precision)
+
+    power = radiated_power( coefficients )
+    intensity = np.abs(et) ** 2 + np.abs(ep) ** 2
+
+    d = 4.0 * np.pi * intensity / np.asarray(power)[..., None]
+
+    return d.reshape(vec1.shape[:-1] + dshape)[()]
+
+# the stencil of the Newton steps of peak_directivity: the centre, a step 
+# along theta-hat and phi-hat in both directions and along the diagonal
+_stencil_a = np.array([0, 1, -1, 0, 0, 1, -1], dtype=np.float64)
+_stencil_b = np.array([0, 0, 0, 1, -1, 1, -1], dtype=np.float64)
+
+def _unit_vectors( theta, phi ):
+    """Returns the radial unit vector and theta-hat, phi-hat at the 
+    directions *theta*, *phi*, each with a last axis of length 3."""
+
+    (ct, st, cp, sp_) = (np.cos(theta), np.sin(theta), 
+                         np.cos(phi), np.sin(phi))
+    r = np.stack((st * cp, st * sp_, ct), axis=-1)
+    t = np.stack((ct * cp, ct * sp_, -st), axis=-1)
+    p = np.stack((-sp_, cp, np.zeros(np.shape(cp))), axis=-1)
+
+    return (r, t, p)
+
+def _direction_angles( r ):
+    """Returns theta and phi of the unit vectors *r*."""
+
+    return (np.arctan2(np.hypot(r[..., 0], r[..., 1]), r[..., 2]), 
+            np.arctan2(r[..., 1], r[..., 0]))
+
+def peak_directivity( coefficients, oversample = 3, newton = 5,
+                      candidates = 8, precision = None, truncate = None ):
+    """Returns the peak directivity of the far-field pattern represented by 
+    *coefficients* along with the direction of the peak. The pattern is 
+    evaluated in coefficient space on a uniform grid that oversamples the 
+    band limit of the coefficients by a factor of *oversample*. The 
+    *candidates* largest local maxima of the grid and the *candidates* 
+    largest grid points are then refined with *newton* Newton steps on the 
+    intensity. Each step fits the gradient and Hessian on a 7 point stencil
+    in the plane tangent to the sphere, so the poles need no special care, 
+    and the stencil shrinks with the step. A candidate is dropped once the 
+    quadratic model puts its peak clearly below the best intensity found 
+    for its set, or once it reaches the same peak as a better candidate. 
+    The best result is returned.
+
+    Example::
+
+        >>> (d, theta, phi) = nearside.spherical.peak_directivity(c)
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients of the
+      far-field pattern.
+
+      oversample (int, optional): Oversampling factor of the search grid.
+
+      newton (int, optional): Number of Newton steps, 0 turns the refinement
+      off. With the default the peak is converged to the round off of the 
+      pattern.
+
+      candidates (int, optional): Number of local maxima, and of largest 
+      grid points, that are refined.
+
+      precision (str, optional): double or single, None uses get_precision().
+
+      truncate (None, 'auto' or float, optional): See directivity. The search
+      grid shrinks with the truncated nmax and mmax.
+
+    Returns:
+      tuple: (directivity, theta, phi) at the peak. Each has the shape of the 
+      stack.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+    """
+
+    coefficients = _truncated( coefficients, truncate )
+    (vec1, vec2, nmax, mmax) = _coefficient_vectors( coefficients )
+
+    nrows = int(oversample * (nmax + 1)) + 1
+    ncols = int(oversample * (2 * mmax + 2))
+
+    (et, ep) = low_level.pattern_on_grid(vec1, vec2, nmax, mmax, 
+                                         nrows, ncols, precision)
+
+    lead = vec1.shape[:-1]
+    grid = np.abs(et) ** 2 + np.abs(ep) ** 2
+
+    # the largest local maxima of the grid (one per lobe) are refined along
+    # with the largest grid points, which catch a peak between the samples 
+    # of a curved lobe
+    pad = np.full(lead + (1, ncols), -np.inf)
+    above = np.concatenate((pad, grid[..., :-1, :]), axis=-2)
+    below = np.concatenate((grid[..., 1:, :], pad), axis=-2)
+    local = np.ones(grid.shape, dtype=bool)
+    for g in (grid, above, below):
+        for shift in (-1, 0, 1):
+            local &= grid >= np.roll(g, shift, axis=-1)
+
+    # each pole is one direction, its copies along phi are ranked last so 
+    # they don't take the places of the other candidates
+    copies = np.zeros((nrows, ncols), dtype=bool)
+    copies[[0, -1], 1:] = True
+    v1 = vec1.reshape((-1, vec1.shape[-1]))
+    v2 = vec2.reshape((-1, vec2.shape[-1]))
+    S = v1.shape[0]
+    rank = np.where(copies, -np.inf, grid).reshape((S, -1))
+    top = np.max(rank, axis=-1, keepdims=True)
+    score = rank + np.where(local.reshape(rank.shape), top + 1.0, 0.0)
+
+    C = min(candidates, rank.shape[-1])
+    idx = np.sort(np.concatenate(
+                  (np.argpartition(score, -C, axis=-1)[:, -C:],
+                   np.argpartition(rank, -C, axis=-1)[:, -C:]), axis=-1),
+                  axis=-1)
+    W = idx.shape[-1]
+
+    # a grid point that is in both lists is refined once
+    active = np.ones(idx.shape, dtype=bool)
+    active[:, 1:] = idx[:, 1:] != idx[:, :-1]
+    peak = np.where(active, np.take_along_axis(rank, idx, axis=-1), -np.inf)
+    peak = peak.astype(np.float64)
+    r = _unit_vectors( np.pi * (idx // ncols) / (nrows - 1),
+                       2.0 * np.pi * (idx % ncols) / ncols )[0]
+    at = r.copy()
+
+    # the stencil starts at a quarter of the grid spacing and shrinks with 
+    # the steps, down to where the round off of the pattern takes over from
+    # the truncation error of the differences
+    spacing = np.pi / (nrows - 1)
+    h = np.full(idx.shape, 0.25 * spacing)
+    hmin = spacing * np.finfo(low_level.real_dtype(precision)).eps ** 0.25
+    (sa_, sb_) = (_stencil_a, _stencil_b)
+    for it in range(newton + 1):
+        (s, j) = np.nonzero(active)
+        if len(s) == 0:
+            break
+        (rc, hc) = (r[s, j], h[s, j])
+        (_, t, p) = _unit_vectors( *_direction_angles( rc ) )
+        if it < newton:
+            pts = rc[:, None, :] + hc[:, None, None] * (
+                  sa_[:, None] * t[:, None, :] + sb_[:, None] * p[:, None, :])
+            pts /= np.linalg.norm(pts, axis=-1)[..., None]
+        else:
+            pts = rc[:, None, :]
+        (tt, pp) = _direction_angles( pts )
+        (et, ep) = low_level.evaluate_pattern_each(v1[s], v2[s], nmax, mmax,
+                                                   tt, pp, precision)
+        f = (np.abs(et) ** 2 + np.abs(ep) ** 2).astype(np.float64)
+        k = np.argmax(f, axis=-1)
+        n = np.arange(len(k))
+        up = f[n, k] > peak[s, j]
+        peak[s[up], j[up]] = f[n[up], k[up]]
+        at[s[up], j[up]] = pts[n[up], k[up]]
+        if it == newton:
+            break
+
+        f0 = f[:, 0]
+        ga = (f[:, 1] - f[:, 2]) / (2.0 * hc)
+        gb = (f[:, 3] - f[:, 4]) / (2.0 * hc)
+        haa = (f[:, 1] - 2.0 * f0 + f[:, 2]) / hc ** 2
+        hbb = (f[:, 3] - 2.0 * f0 + f[:, 4]) / hc ** 2
+        hab = (f[:, 5] + f[:, 6] - f[:, 1] - f[:, 2] - f[:, 3] - f[:, 4] + 
+               2.0 * f0) / (2.0 * hc ** 2)
+
+        # Newton step along the eigenvectors of the Hessian with negative
+        # curvature and an ascent step along the others (a ring shaped peak
+        # has no curvature along the ring)
+        rad = np.hypot(0.5 * (haa - hbb), hab)
+        lam1 = 0.5 * (haa + hbb) + rad
+        lam2 = 0.5 * (haa + hbb) - rad
+        ang = 0.5 * np.arctan2(2.0 * hab, haa - hbb)
+        (ca, cb) = (np.cos(ang), np.sin(ang))
+        tau = 1e-3 * (np.abs(lam1) + np.abs(lam2)) + np.finfo(np.float64).tiny
+        g1 = ca * ga + cb * gb
+        g2 = ca * gb - cb * ga
+        s1 = np.where(lam1 < -tau, -g1 / np.minimum(lam1, -tau), 
+                      g1 / (np.abs(lam1) + tau))
+        s2 = np.where(lam2 < -tau, -g2 / np.minimum(lam2, -tau), 
+                      g2 / (np.abs(lam2) + tau))
+        da = ca * s1 - cb * s2
+        db = cb * s1 + ca * s2
+
+        # no step is longer than the grid spacing
+        step = np.hypot(da, db)
+        inside = step <= spacing
+        scale = np.where(inside, 1.0, spacing / np.where(inside, 1.0, step))
+        (da, db) = (scale * da, scale * db)
+        model = f0 + ga * da + gb * db + 0.5 * (haa * da ** 2 + 
+                                                2.0 * hab * da * db + 
+                                                hbb * db ** 2)
+        rn = rc + da[:, None] * t + db[:, None] * p
+        r[s, j] = rn / np.linalg.norm(rn, axis=-1)[:, None]
+        h[s, j] = np.clip(scale * step, hmin, 0.25 * hc)
+
+        # drop the candidates whose peak is clearly below the best intensity
+        # of their set, and those that reach the same peak as a better one
+        best = np.max(peak, axis=-1)
+        active[s, j] = ~((lam1 < -tau) & inside & 
+                         (model < 0.95 * best[s]))
+        many = np.nonzero(np.sum(active, axis=-1) > 1)[0]
+        rm = r[many]
+        close = np.matmul(rm, np.swapaxes(rm, -1, -2)) > \
+                np.cos(0.125 * spacing)
+        pm = peak[many]
+        worse = (pm[:, :, None] < pm[:, None, :]) | (
+                (pm[:, :, None] == pm[:, None, :]) & 
+                (np.arange(W)[:, None] > np.arange(W)[None, :]))
+        am = active[many]
+        active[many] = am & ~np.any(close & worse & am[:, None, :], axis=-1)
+
+    k = np.argmax(peak, axis=-1)
+    n = np.arange(S)
+    (theta, phi) = _direction_angles( at[n, k] )
+    peak = peak[n, k].reshape(lead)
+    theta = theta.reshape(lead)
+    phi = np.mod(phi, 2.0 * np.pi).reshape(lead)
+
+    power = radiated_power( coefficients )
+    d = 4.0 * np.pi * peak / power
+
+    return (d[()], theta[()], phi[()])
+
+def gain( coefficients, efficiency, theta = 0.0, phi = 0.0, 
+          precision = None, truncate = None ):
+    """Returns the gain of the far-field pattern represented by 
+    *coefficients* in the direction(s) *theta*, *phi*. The gain is the 
+    directivity times the radiation *efficiency* of the antenna.
+
+    Example::
+
+        >>> g = nearside.spherical.gain(c, 0.92)
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients of the
+      far-field pattern.
+
+      efficiency (float or numpy.array): Radiation efficiency (linear). An
+      array must broadcast against the shape of the stack (e.g. one value
+      per frequency).
+
+      theta (float or numpy.array): Polar angle(s) of the directions.
+
+      phi (float or numpy.array): Azimuthal angle(s) of the directions.
+
+      precision (str, optional): double or single, see directivity.
+
+      truncate (None, 'auto' or float, optional): See directivity.
+
+    Returns:
+      float or numpy.array: The gain (linear, not dB), shaped like the output
+      of directivity.
+
+    """
+
+    d = directivity( coefficients, theta, phi, precision, truncate )
+
+    eff = np.asarray(efficiency, dtype=np.float64)
+    dshape = np.broadcast(np.asarray(theta), np.asarray(phi)).shape
+    eff = eff.reshape(eff.shape + (1,) * len(dshape))
+
+    return (eff * d)[()]
+
+def transmission( transmitter, receiver, kA, theta = 0.0, phi = 0.0, 
+                  chi = 0.0 ):
+    """Evaluates the transmission formula, the signal received by 
+    *receiver* from *transmitter* for a set of geometries. The receiver is 
+    at distance A in the direction theta, phi of the transmitter frame, 
+    looks back at the transmitter and is rotated by chi about the line 
+    between them, exactly like the probe of a spherical measurement. Other
+    orientations are handled by rotating either set of coefficients first 
+    (see rotate).
+
+    kA, theta, phi and chi are broadcast against one another and every 
+    geometry is evaluated in one vectorized call. The receiver is translated
+    once for every distinct kA, with the radial functions cached per kr, 
+    and the angular sums are computed once for every distinct direction. 
+    For a mu = +-1 receiver, chi = 0 and chi = pi / 2 give the two
+    components of probe_response.
+
+    Example::
+
+        >>> kA = k * np.linspace(1.0, 5.0, 200)
+        >>> s21 = nearside.spherical.transmission(aut, horn, kA, theta, 0.0)
+
+    Args:
+      transmitter (VectorCoefs): Coefficients of the transmitting antenna.
+
+      receiver (VectorCoefs): Coefficients of the receiving antenna, in the
+      probe frame of translate_symmetric_probe.
+
+      kA (array_like): Electrical separation, it must be larger than the 
+      sum of the minimum sphere radii of the two antennas.
+
+      theta (array_like, optional): Direction of the receiver.
+
+      phi (array_like, optional): Direction of the receiver.
+
+      chi (array_like, optional): Rotation of the receiver about its axis.
+
+    Returns:
+      numpy.ndarray: The received signal for every geometry, with the 
+      broadcast shape of the inputs.
+
+    Raises:
+      TypeError: Is raised if transmitter or receiver isn't a VectorCoefs 
+      object.
+
+    """
+
+    if not ( isinstance( transmitter, sp.VectorCoefs) and 
+             isinstance( receiver, sp.VectorCoefs) ):
+        raise TypeError("transmitter and receiver must be VectorCoefs " + 
+                        "objects.")
+
+    (kA, theta, phi, chi) = np.broadcast_arrays( 
+                                        *[np.asarray( v, dtype=np.float64 ) 
+                                          for v in (kA, theta, phi, chi)] )
+    shape = kA.shape
+    NN = transmitter.nmax
+    M = receiver.mmax
+
+    (kr, ia) = np.unique( kA.ravel(), return_inverse=True )
+    F = np.array( [low_level.general_forward_matrices( 
+                        low_level.translate_probe( NN, receiver.scoef1._vec,
+                                                   receiver.scoef2._vec, 
+                                                   receiver.nmax, M, r ), 
+                        NN ) for r in kr] )
+
+    angles = np.stack( [theta.ravel(), phi.ravel()], axis=-1 )
+    (angles, ig) = np.unique( angles, axis=0, return_inverse=True )
+    Y = low_level.spin_pattern_sums( transmitter.scoef1._vec, 
+                                     transmitter.scoef2._vec, NN, 
+                                     transmitter.mmax, M, 
+                                     angles[:, 0], angles[:, 1] )
+
+    mu = np.arange( -M, M + 1 )
+    e = np.exp( -1j * np.outer( chi.ravel(), mu ) )
+    w = 0.5 * np.einsum( 'gu,gnuj,gujn->g', e, F[ia.ravel()], 
+                         Y[ig.ravel()] )
+
+    return w.reshape( shape )[()]
+
+def phase_flatness( coefficients, offsets, theta_max = np.pi / 6, 
+                    polarization = None, precision = None ):
+    """Returns the phase flatness of the co-polar pattern over the cone 
+    theta <= theta_max when the origin is moved to each of *offsets*. The 
+    flatness is |sum w E| / sum w |E| over a quadrature of the cone, it is 1
+    if the phase is constant and drops as the phase spreads.
+
+    The pattern is evaluated once in coefficient space. Moving the origin 
+    by o multiplies the far field by exp(1j o . r), so every offset only 
+    costs a phase update of the samples and a whole batch of offsets is
+    evaluated with one matrix product.
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients of the
+      far-field pattern.
+
+      offsets (array_like): Trial origins, electrical (k times the distance), 
+      with shape (..., 3).
+
+      theta_max (float, optional): Half angle of the cone around +z.
+
+      polarization (str, optional): 'x' or 'y', the Ludwig 3 co-polar 
+      component. None picks the one with more power in the cone.
+
+      precision (str, optional): double or single, see directivity.
+
+    Returns:
+      numpy.ndarray: The flatness of every offset; the stack shape is put in 
+      front of the offsets shape.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+    """
+
+    offsets = np.asarray( offsets, dtype=np.float64 )
+    o = offsets.reshape( (-1, 3) )
+
+    # the quadrature has to resolve the phase of the largest offset
+    extent = np.max( np.linalg.norm( o, axis=-1 ), initial=0.0 )
+    (f, w, dirs) = _cone_copolar( coefficients, theta_max, polarization, 
+                                  extent, precision )
+    lead = f.shape[:-1]
+
+    flat = low_level.phase_flatness( f, w, dirs, o )
+
+    return flat.reshape( lead + offsets.shape[:-1] )
+
+def phase_centre( coefficients, theta_max = np.pi / 6, axial = True, 
+                  polarization = None, extent = None, resolution = 1e-3, 
+                  precision = None ):
+    """Finds the phase centre of the far-field pattern, the origin about 
+    which the co-polar phase is flattest over the cone theta <= theta_max
+    (see phase_flatness).
+
+    The search is done on batches of trial offsets: a grid along z, then (if
+    *axial* is False) a grid across z, followed by a pattern search that 
+    halves its step until it is below *resolution*. The pattern is only 
+    evaluated once, so the whole search costs little more than a 
+    directivity calculation.
+
+    Example::
+
+        >>> (kr0, flat) = nearside.spherical.phase_centre(c, np.pi / 9)
+        >>> d = kr0[2] / k
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients of the
+      far-field pattern.
+
+      theta_max (float, optional): Half angle of the cone around +z.
+
+      axial (bool, optional): Only search along the z-axis.
+
+      polarization (str, optional): See phase_flatness.
+
+      extent (float, optional): Largest electrical offset searched, the 
+      default is the radius of the minimum sphere, nmax + 1.
+
+      resolution (float, optional): Electrical resolution of the result.
+
+      precision (str, optional): double or single, see directivity.
+
+    Returns:
+      tuple: (offset, flatness). offset is the electrical position (k times 
+      x, y, z) of the phase centre, with shape (..., 3) for a stack.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+    """
+
+    (_, _, nmax, _) = _coefficient_vectors( coefficients )
+    if extent is None:
+        extent = nmax + 1.0
+
+    (f, w, dirs) = _cone_copolar( coefficients, theta_max, polarization, 
+                                  extent, precision )
+    lead = f.shape[:-1]
+
+    # about half of the half width of the main lobe of the flatness along z
+    # (the phase error spans o (1 - cos(theta_max))) and across z (it spans 
+    # +-o sin(theta_max)), so the grids can't step over the peak
+    step_z = min( np.pi / (1.0 - np.cos( theta_max )) / 2.0, extent / 4.0 )
+    step_t = min( 1.2 / np.sin( theta_max ), extent / 4.0 )
+
+    def best_of( o ):
+        flat = low_level.phase_flatness( f, w, dirs, o )
+        k = np.argmax( flat, axis=-1 )[..., None]
+        if o.ndim == 2:
+            o = np.broadcast_to( o, lead + o.shape )
+        best = np.take_along_axis( o, k[..., None], axis=-2 )[..., 0, :]
+        return (best, np.take_along_axis( flat, k, axis=-1 )[..., 0])
+
+    z = np.arange( -extent, extent + step_z / 2.0, step_z )
+    grid = np.zeros( (len(z), 3) )
+    grid[:, 2] = z
+    (centre, flat) = best_of( grid )
+
+    if axial:
+        stencil = np.array([[0, 0, -1], [0, 0, 0], [0, 0, 1]], 
+                           dtype=np.float64)
+    else:
+        t = np.arange( -extent, extent + step_t / 2.0, step_t )
+        (x, y) = np.meshgrid( t, t, indexing='ij' )
+        grid = np.zeros( (x.size, 3) )
+        grid[:, 0] = x.ravel()
+        grid[:, 1] = y.ravel()
+        (centre, flat) = best_of( centre[..., None, :] + grid )
+
+        s = np.array([-1, 0, 1], dtype=np.float64)
+        stencil = np.stack( np.meshgrid( s, s, s, indexing='ij' ), 
+                            axis=-1 ).reshape( (-1, 3) )
+
+    steps = np.array([step_t, step_t, step_z])
+    while np.max( steps ) > resolution:
+        steps = steps / 2.0
+        (centre, flat) = best_of( centre[..., None, :] + stencil * steps )
+
+    return (centre[()], flat[()])
+
+def _cone_copolar( coefficients, theta_max, polarization, extent, 
+                   precision ):
+    """Samples the Ludwig 3 co-polar pattern over the cone theta <= 
+    theta_max. Returns (f, weights, directions). The rule resolves the 
+    pattern times the phase of an offset of up to *extent*."""
+
+    (vec1, vec2, nmax, mmax) = _coefficient_vectors( coefficients )
+
+    if polarization not in (None, 'x', 'y'):
+        raise ValueError("polarization must be 'x', 'y' or None")
+
+    L = nmax + int( np.ceil( extent ) )
+    ntheta = int( L * theta_max / np.pi ) + 6
+    nphi = 2 * ( mmax + int( np.ceil( extent * np.sin( theta_max ) ) ) ) + 4
+    (theta, phi, w) = low_level.cap_quadrature( ntheta, nphi, theta_max )
+
+    (et, ep) = low_level.evaluate_pattern( vec1, vec2, nmax, mmax, 
+                                           theta, phi, precision )
+    et = np.asarray( et, dtype=np.complex128 )
+    ep = np.asarray( ep, dtype=np.complex128 )
+
+    fx = et * np.cos( phi ) - ep * np.sin( phi )
+    fy = et * np.sin( phi ) + ep * np.cos( phi )
+
+    if polarization == 'x':
+        f = fx
+    elif polarization == 'y':
+        f = fy
+    else:
+        px = np.sum( w * np.abs( fx ) ** 2, axis=-1 )[..., None]
+        py = np.sum( w * np.abs( fy ) ** 2, axis=-1 )[..., None]
+        f = np.where( px >= py, fx, fy )
+
+    return (f, w, low_level.directions( theta, phi ))
+
+def mode_budget( kr0, error = auto_truncation_error, krho0 = None, 
+                 probe_kr = None ):
+    """Picks the truncation of the spherical wave expansion from the size of 
+    the antenna under test instead of by hand. 
+
+    Example::
+
+        >>> (NN, mmax, probe_nmax) = nearside.spherical.mode_budget(
+        ...                                   k * r0, 1e-4, probe_kr = k * a)
+        >>> R = nearside.spherical.translate_symmetric_probe(NN, p, k * d)
+
+    Args:
+      kr0 (float): Electrical radius of the minimum sphere (centered on the 
+      coordinate origin) that encloses the AUT.
+
+      error (float, optional): Target relative field error.
+
+      krho0 (float, optional): Electrical radius of the minimum cylinder 
+      about the z-axis that encloses the AUT. Limits mmax, which otherwise 
+      equals NN.
+
+      probe_kr (float, optional): Electrical radius of the minimum sphere 
+      that encloses the probe.
+
+    Returns:
+      tuple: (NN, mmax, probe_nmax). NN is the nmax of the AUT and the 
+      multipole limit for translate_symmetric_probe. probe_nmax is None if
+      probe_kr isn't given.
+
+    """
+
+    NN = low_level.excess_bandwidth_nmax( kr0, error )
+
+    if krho0 is None:
+        mmax = NN
+    else:
+        mmax = min( NN, low_level.excess_bandwidth_nmax( krho0, error ) )
+
+    if probe_kr is None:
+        probe_nmax = None
+    else:
+        probe_nmax = low_level.excess_bandwidth_nmax( probe_kr, error )
+
+    return (NN, mmax, probe_nmax)
+
+def truncation_orders( coefficients, error = auto_truncation_error ):
+    """Returns the smallest (nmax, mmax) that keeps the relative field error
+    of *coefficients* below *error*, measured from the modal power. For a 
+    stack the orders cover every set in it.
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients.
+
+      error (float, optional): Relative (rms) field error, the power left 
+      out is at most error**2 times the total power.
+
+    Returns:
+      tuple: (nmax, mmax)
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+    """
+
+    (vec1, vec2, nmax, mmax) = _coefficient_vectors( coefficients )
+
+    (pn, pm) = low_level.modal_power( vec1, vec2, nmax, mmax )
+
+    # the power is split between the two orders
+    e = error / np.sqrt(2.0)
+    new_nmax = max( 1, low_level.truncation_order( pn, e ) )
+    new_mmax = min( new_nmax, low_level.truncation_order( pm, e ) )
+
+    return (new_nmax, new_mmax)
+
+def truncate_coefs( coefficients, error = auto_truncation_error, 
+                    nmax = None, mmax = None ):
+    """Trims *coefficients* to the modes that carry power. 
+
+    Example::
+
+        >>> small = nearside.spherical.truncate_coefs(c, 1e-4)
+        >>> small = nearside.spherical.truncate_coefs(c, nmax = 20, mmax = 5)
+
+    Args:
+      coefficients (VectorCoefs or VectorCoefsStack): The coefficients.
+
+      error (float, optional): Relative field error, see truncation_orders.
+
+      nmax (int, optional): Use this nmax instead of the measured one.
+
+      mmax (int, optional): Use this mmax instead of the measured one.
+
+    Returns:
+      VectorCoefs or VectorCoefsStack: The truncated coefficients. The input
+      is returned unchanged if nothing can be trimmed.
+
+    Raises:
+      TypeError: Is raised if coefficients isn't a VectorCoefs or 
+      VectorCoefsStack object.
+
+      ValueError: Is raised if nmax or mmax is larger than the one of the 
+      coefficients or if mmax > nmax.
+
+    """
+
+    (vec1, vec2, old_nmax, old_mmax) = _coefficient_vectors( coefficients )
+
+    if nmax is None or mmax is None:
+        (n, m) = truncation_orders( coefficients, error )
+        nmax = n if nmax is None else nmax
+        mmax = min( m, nmax ) if mmax is None else mmax
+
+    if nmax == old_nmax and mmax == old_mmax:
+        return coefficients
+
+    idx = low_level.truncation_indices( old_nmax, old_mmax, nmax, mmax )
 
     if isinstance( coefficients, sp.VectorCoefs):
-                                                                                 
-        R = translated_probe_data
-        tsh = coefficients
-        psh = tsh.copy()
+        return sp.VectorCoefs( vec1[idx], vec2[idx], nmax, mmax )
+    else:
+        return VectorCoefsStack( vec1[..., idx], vec2[..., idx], nmax, mmax )
+
+def _truncation_error( truncate ):
+
+    if truncate == 'auto':
+        return auto_truncation_error
+    else:
+        return float( truncate )
+
+def _truncated( coefficients, truncate ):
+    """Applies the truncate option of the operations."""
 
-        # correct each mode individually
-        for n in range(1, tsh.nmax + 1):
-            for m in range( -n, n + 1 ):
-                if ( abs(m) <= tsh.mmax ):
-                    M = low_level.make_forward_R_matrix(R, n)
-                    psh[n,m] = list(np.dot( M, tsh[n, m] ))
+    if truncate is None:
+        return coefficients
+    else:
+        return truncate_coefs( coefficients, _truncation_error( truncate ) )
+
+def truncated_sphere_coefs( pattern, nmax, mmax = None, theta_max = np.pi,
+                            damp = 1e-3, tol = 1e-6, maxiter = 200,
+                            precision = None ):
+    """Estimates the coefficients from a scan that only covers the rows
+    theta <= theta_max of the uniform grid, e.g. a scan that stops at
+    150 degrees because of the mast.
+
+    The coefficients are the damped least squares fit to the measured rows,
+    weighted by the solid angle of each cell, and are found with CGLS. The
+    operator is matrix-free: one FFT in phi and one product with a
+    precomputed block of Legendre tables per m. Only the blocks of the
+    measured rows with m >= 0 are stored (about 0.8 GB for nmax = 500 and
+    400 rows). Modes that are mostly seen in the missing region are
+    damped towards zero instead of blowing up.
 
-        responded_coefficients = psh
+    Example::
+
+        >>> c = nearside.spherical.truncated_sphere_coefs(meas, 40,
+        ...                           theta_max = np.radians(150))
+
+    Args:
+      pattern (SphericalMeasurementTransverseUniform, TransversePatternUniform
+      or tuple): The measurement. A tuple (E_theta, E_phi) of arrays with
+      shape (..., nrows, ncols) is a stack of measurements.
 
-        return responded_coefficients
+      nmax (int): nmax of the result.
 
+      mmax (int, optional): mmax of the result, nmax by default.
+
+      theta_max (float, optional): The last measured theta.
+
+      damp (float, optional): Tikhonov damping, relative to the (unit)
+      response of a mode that is seen on the whole sphere.
+
+      tol (float, optional): The iteration stops once the gradient is
+      reduced by tol.
+
+      maxiter (int, optional): Limit on the number of iterations.
+
+      precision (str, optional): double or single, used for the tables and
+      the operator.
+
+    Returns:
+      VectorCoefs or VectorCoefsStack: The estimated coefficients.
+
+    Raises:
+      ValueError: Is raised if the grid has fewer than 2 * mmax + 1 columns.
+
+    """
+
+    if isinstance( pattern, tuple ):
+        (et, ep) = pattern
+    else:
+        (et, ep) = ( pattern.theta, pattern.phi )
+    et = np.asarray( et )
+    ep = np.asarray( ep )
+
+    if mmax is None:
+        mmax = nmax
+    (nrows, ncols) = et.shape[-2:]
+    if ncols < 2 * mmax + 1:
+        raise ValueError("ncols must be at least 2 * mmax + 1")
+
+    theta = np.linspace( 0, np.pi, nrows )
+    rows = theta <= theta_max + 1e-12 * np.pi
+
+    blocks = low_level.legendre_blocks( nmax, mmax, theta[rows], precision )
+    weights = low_level.cell_weights( theta[rows], theta[1] )
+
+    (vec1, vec2, _) = low_level.cgls_coefs( et[..., rows, :],
+                                            ep[..., rows, :], blocks,
+                                            weights, nmax, mmax, damp, tol,
+                                            maxiter, precision )
+
+    if vec1.ndim == 1:
+        return sp.VectorCoefs( np.asarray( vec1, dtype=np.complex128 ),
+                               np.asarray( vec2, dtype=np.complex128 ),
+                               nmax, mmax )
     else:
-        TypeError("no probe response for this object.")
+        return VectorCoefsStack( vec1, vec2, nmax, mmax )
 
 def transform_to_vcoeffs( transverse_uniform ):
     pass
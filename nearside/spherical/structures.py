@@ -33,18 +33,15 @@ from __future__ import absolute_import
 from six.moves import range  #use range instead of xrange
 #-----------------------------------------------------------------------------
 
-#---------------------------------------------------------------------Built-ins
-
-import json
-from os.path import dirname
-
 #--------------------------------------------------------------------3rd Party
 import numpy as np
-import spherepy as sp
 
 #------------------------------------------------------------------------Custom
+from nearside._lazy import lazy_module
 import nearside.probe as pb
 
+sp = lazy_module('spherepy')
+
 #==============================================================================
 # Global Declarations
 #==============================================================================
@@ -53,6 +50,17 @@ err_msg = {}
 err_msg['not_tpu'] = "transverse_pattern_uniform must be a " + \
                                     "spherepy.TransversePatternUniform object"
 err_msg['not_probe'] = "probe must be a valid probe object or None"
+err_msg['vec1_s_vec2'] = "shape of vec1 and vec2 must be the same"
+err_msg['nmax_g_mmax'] = "nmax must be greater than or equal to mmax"
+err_msg['vcoef_size'] = "the last axis of vec1 and vec2 must have length " + \
+                        "nmax + 1 + mmax * (2 * (nmax + 1) - mmax - 1)"
+err_msg['no_stack'] = "cannot stack an empty sequence of VectorCoefs"
+err_msg['stack_sz'] = "all VectorCoefs in a stack must have the same " + \
+                      "nmax and mmax"
+err_msg['nu_size'] = "theta, phi and the samples (along the last axis) " + \
+                     "must have the same length"
+err_msg['chan_size'] = "channel coefficients must have shape " + \
+                       "(..., 2 * mumax + 1, NC)"
 
 #=============================================================================
 # Objects
@@ -69,6 +77,228 @@ class SphericalScalarCoeffs(object):
 class SphericalVectorCoeffs(object):
     pass
 
+class VectorCoefsStack(object):
+    """Holds a stack of vector spherical harmonic coefficient sets that share
+    the same *nmax* and *mmax* (e.g. one set per frequency or per AUT state).
+
+    The coefficients are stored in two arrays, *vec1* and *vec2*, whose last
+    axis uses the same ordering as the vectors within spherepy.VectorCoefs.
+    All of the leading axes index the stack, so operations that are applied
+    to a VectorCoefsStack are applied to every set at once.
+
+    Example::
+
+        >>> c = [spherepy.random_coefs(10, 8, coef_type=spherepy.vector) 
+        ...      for k in range(5)]
+        >>> s = nearside.spherical.stack_coefs(c)
+        >>> s.shape
+        (5,)
+        >>> s[2]
+        VectorCoefs(nmax = 10, mmax = 8)
+    """
+    def __init__(self, vec1, vec2, nmax, mmax):
+
+        vec1 = np.asarray(vec1)
+        vec2 = np.asarray(vec2)
+
+        if vec1.shape != vec2.shape:
+            raise ValueError(err_msg['vec1_s_vec2'])
+
+        if mmax > nmax:
+            raise ValueError(err_msg['nmax_g_mmax'])
+
+        N = nmax + 1
+        NC = N + mmax * (2 * N - mmax - 1)
+        if vec1.ndim == 0 or vec1.shape[-1] != NC:
+            raise ValueError(err_msg['vcoef_size'])
+
+        self._vec1 = vec1
+        self._vec2 = vec2
+        self._nmax = nmax
+        self._mmax = mmax
+
+    @property
+    def nmax(self):
+        """Largest n value."""
+        return self._nmax
+
+    @property
+    def mmax(self):
+        """Largest abs(m) value."""
+        return self._mmax
+
+    @property
+    def size(self):
+        """The number of modes in each set of coefficients."""
+        return self._vec1.shape[-1]
+
+    @property
+    def shape(self):
+        """The shape of the stack (not including the mode axis)."""
+        return self._vec1.shape[:-1]
+
+    @property
+    def dtype(self):
+        """The complex type of the coefficients (complex128 or complex64)."""
+        return self._vec1.dtype
+
+    @property
+    def vec1(self):
+        """Array holding the first (scoef1) coefficients of every set."""
+        return self._vec1
+
+    @property
+    def vec2(self):
+        """Array holding the second (scoef2) coefficients of every set."""
+        return self._vec2
+
+    def copy(self):
+        """Make a deep copy of this object."""
+        return VectorCoefsStack(np.copy(self._vec1), np.copy(self._vec2),
+                                self.nmax, self.mmax)
+
+    def astype(self, dtype):
+        """Return a copy of the stack with coefficients of type *dtype* 
+        (e.g. numpy.complex64 for the single precision path)."""
+        return VectorCoefsStack(self._vec1.astype(dtype), 
+                                self._vec2.astype(dtype),
+                                self.nmax, self.mmax)
+
+    def to_list(self):
+        """Return the stack as a flat list of spherepy.VectorCoefs objects."""
+        v1 = self._vec1.reshape(-1, self.size)
+        v2 = self._vec2.reshape(-1, self.size)
+        return [sp.VectorCoefs(np.array(v1[k], dtype=np.complex128), 
+                               np.array(v2[k], dtype=np.complex128),
+                               self.nmax, self.mmax) 
+                for k in range(v1.shape[0])]
+
+    def __len__(self):
+        return self._vec1.shape[0]
+
+    def __repr__(self):
+        return "VectorCoefsStack(shape = {0}, nmax = {1}, mmax = {2})".format(
+                                            self.shape, self.nmax, self.mmax)
+
+    def __getitem__(self, arg):
+        v1 = self._vec1[arg]
+        v2 = self._vec2[arg]
+        if v1.ndim == 1:
+            return sp.VectorCoefs(np.array(v1, dtype=np.complex128), 
+                                  np.array(v2, dtype=np.complex128),
+                                  self.nmax, self.mmax)
+        else:
+            return VectorCoefsStack(v1, v2, self.nmax, self.mmax)
+
+def stack_coefs(coefficients):
+    """Stack a sequence of spherepy.VectorCoefs objects into a single
+    VectorCoefsStack. Every set must have the same *nmax* and *mmax*.
+
+    Example::
+
+        >>> c = [spherepy.random_coefs(6, 6, coef_type=spherepy.vector) 
+        ...      for k in range(3)]
+        >>> s = nearside.spherical.stack_coefs(c)
+
+    Args:
+      coefficients (list): The VectorCoefs objects to be stacked.
+
+    Returns:
+      VectorCoefsStack: The stacked coefficients, with shape (len(c),).
+
+    Raises:
+      ValueError: If the sequence is empty or the sizes don't match.
+
+    """
+    coefficients = list(coefficients)
+
+    if len(coefficients) == 0:
+        raise ValueError(err_msg['no_stack'])
+
+    nmax = coefficients[0].nmax
+    mmax = coefficients[0].mmax
+
+    for c in coefficients:
+        if (c.nmax != nmax) or (c.mmax != mmax):
+            raise ValueError(err_msg['stack_sz'])
+
+    vec1 = np.array([c.scoef1._vec for c in coefficients], 
+                    dtype=np.complex128)
+    vec2 = np.array([c.scoef2._vec for c in coefficients], 
+                    dtype=np.complex128)
+
+    return VectorCoefsStack(vec1, vec2, nmax, mmax)
+
+class ChannelCoefs(object):
+    """Holds the coefficients of the response of a probe with azimuthal 
+    modes mu = -mumax..mumax. A probe rotated by chi about its own axis 
+    measures w(chi) = 1/2 sum_mu exp(-1j mu chi) w_mu, and each channel w_mu 
+    is expanded in the spin weighted harmonics 
+    sqrt((2n+1)/4pi) d^n_{m,-mu}(theta) exp(1j m phi). 
+
+    The coefficients are stored in *u* with the channel (mu + mumax) on the
+    second to last axis and the modes, ordered like a VectorCoefs of size
+    *nmax*, *mmax*, on the last axis. Leading axes index a stack. For a 
+    mu = +-1 probe, the channels are the combinations vec1 -+ vec2 of the 
+    VectorCoefs returned by probe_response.
+    """
+    def __init__(self, u, nmax, mmax):
+
+        u = np.asarray(u)
+
+        if mmax > nmax:
+            raise ValueError(err_msg['nmax_g_mmax'])
+
+        N = nmax + 1
+        NC = N + mmax * (2 * N - mmax - 1)
+        if u.ndim < 2 or u.shape[-1] != NC or u.shape[-2] % 2 != 1:
+            raise ValueError(err_msg['chan_size'])
+
+        self._u = u
+        self._nmax = nmax
+        self._mmax = mmax
+
+    @property
+    def nmax(self):
+        """Largest n value."""
+        return self._nmax
+
+    @property
+    def mmax(self):
+        """Largest abs(m) value."""
+        return self._mmax
+
+    @property
+    def mumax(self):
+        """Largest abs(mu) value of the probe."""
+        return (self._u.shape[-2] - 1) // 2
+
+    @property
+    def shape(self):
+        """The shape of the stack (not including the channel and mode axes).
+        """
+        return self._u.shape[:-2]
+
+    @property
+    def u(self):
+        """Array holding the coefficients of every channel."""
+        return self._u
+
+    def channel(self, mu):
+        """The coefficients of channel *mu*."""
+        if abs(mu) > self.mumax:
+            raise ValueError("mu must be between -mumax and mumax")
+        return self._u[..., mu + self.mumax, :]
+
+    def copy(self):
+        """Make a deep copy of this object."""
+        return ChannelCoefs(np.copy(self._u), self.nmax, self.mmax)
+
+    def __repr__(self):
+        return ("ChannelCoefs(shape = {0}, mumax = {1}, nmax = {2}, " + 
+                "mmax = {3})").format(self.shape, self.mumax, self.nmax, 
+                                      self.mmax)
+
 #-=-=-=-=-=-=-=-=-=-=-= MEASURED ON UNIFORM GRID =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 # These objects use the algorithms that require data to be equally spaced in
 # the theta direction and in the phi direction.
@@ -77,24 +307,65 @@ class SphericalMeasurementScalarUniform(object):
     pass
 
 class SphericalMeasurementTransverseUniform(object):
+    """Holds a transverse pattern measured on the uniform grid 
+    theta = linspace(0, pi, nrows), phi = 2 pi k / ncols.
+
+    With a *symmetry* (a nearside.spherical.Symmetry) only the columns
+    symmetry.unique_columns(ncols) are measured and stored: 
+    *transverse_pattern_uniform* is then the tuple (etheta, ephi) of those
+    columns, shape (nrows, len(unique_columns)), and *ncols* is the number
+    of columns of the full grid. pattern() rebuilds the full grid on 
+    demand and coefficients() returns the SymmetricCoefs of the unique 
+    modes.
+
+    Example::
+
+        >>> s = nearside.spherical.e_and_h_planes
+        >>> cols = s.unique_columns(72)      # phi from 0 to 90 degrees
+        >>> m = SphericalMeasurementTransverseUniform((et[:, cols], 
+        ...                                            ep[:, cols]),
+        ...                                           symmetry = s, 
+        ...                                           ncols = 72)
+        >>> c = m.coefficients(35)
+    """
     def __init__(self, transverse_pattern_uniform, 
                        frequency_ghz = None,
                        radius_meters = None, 
-                       probe = None):
-
-        if ( isinstance(transverse_pattern_uniform,
-                        sp.TransversePatternUniform) ):
+                       probe = None,
+                       symmetry = None,
+                       ncols = None):
+
+        self._symmetry = symmetry
+        self._tp = None
+        self._unique = None
+
+        if symmetry is not None:
+            (et, ep) = transverse_pattern_uniform
+            et = np.asarray(et)
+            ep = np.asarray(ep)
+            if ncols is None:
+                raise ValueError("ncols of the full grid is needed with a " +
+                                 "symmetry")
+            if (et.shape != ep.shape or et.ndim != 2 or 
+                et.shape[1] != len(symmetry.unique_columns(ncols))):
+                raise ValueError("the pattern must hold the columns " + 
+                                 "symmetry.unique_columns(ncols)")
+            self._unique = (et, ep)
+            self._ncols = ncols
+
+        elif ( isinstance(transverse_pattern_uniform,
+                          sp.TransversePatternUniform) ):
 
             self._tp = transverse_pattern_uniform
         else:
-            ValueError(err_msg['not_tpu'])
+            raise ValueError(err_msg['not_tpu'])
 
-        if ( isinstance(probe, pb.VectorProbe) 
-             or probe == None):
+        if ( probe is None or 
+             isinstance(probe, pb.VectorProbeSingleFrequency) ):
 
             self._probe = probe
         else:
-            ValueError(err_msg['not_probe'])
+            raise ValueError(err_msg['not_probe'])
 
         self._radius_meters = radius_meters
 
@@ -106,30 +377,76 @@ class SphericalMeasurementTransverseUniform(object):
 
     @probe.setter
     def probe(self, value):
-        if ( isinstance(probe, pb.VectorProbe) or probe == None):
+        if ( value is None or 
+             isinstance(value, pb.VectorProbeSingleFrequency) ):
             self._probe = value
         else:
-            ValueError("probe must be a valid probe object or None")
+            raise ValueError("probe must be a valid probe object or None")
+
+    @property
+    def symmetry(self):
+        """The Symmetry of the AUT, None if the full grid is stored."""
+        return self._symmetry
 
     @property
     def nrows(self):
-        self._tp.nrows
+        if self._unique is not None:
+            return self._unique[0].shape[0]
+        return self._tp.nrows
 
     @property
     def ncols(self):
-        self._tp.nrows
+        """Number of phi columns of the full grid."""
+        if self._unique is not None:
+            return self._ncols
+        return self._tp.ncols
 
     @property
     def shape(self):
-        return self._tp.shape
+        return (self.nrows, self.ncols)
+
+    @property
+    def unique_pattern(self):
+        """(etheta, ephi) of the measured columns."""
+        if self._unique is not None:
+            return self._unique
+        return self._tp.array
+
+    def pattern(self):
+        """The TransversePatternUniform of the full grid."""
+        if self._unique is not None:
+            (et, ep) = self._symmetry.expand_pattern(self._unique[0], 
+                                                     self._unique[1], 
+                                                     self._ncols)
+            return sp.TransversePatternUniform(et, ep)
+        return self._tp
 
     @property
     def theta(self):
-        return self._tp.theta
+        return self.pattern().theta
 
     @property
     def phi(self):
-        return self._tp.phi
+        return self.pattern().phi
+
+    def coefficients(self, nmax, mmax = None):
+        """The coefficients of the pattern, the SymmetricCoefs of the unique
+        modes with a symmetry, else a VectorCoefs."""
+
+        from nearside.spherical import low_level, symmetry
+
+        if mmax is None:
+            mmax = nmax
+        if self._unique is not None:
+            return symmetry.symmetric_coefs_from_pattern(self._unique[0], 
+                                                         self._unique[1],
+                                                         nmax, mmax, 
+                                                         self._symmetry,
+                                                         self._ncols)
+
+        (et, ep) = self._tp.array
+        (vec1, vec2) = low_level.vcoefs_from_pattern(et, ep, nmax, mmax)
+        return sp.VectorCoefs(vec1, vec2, nmax, mmax)
 
 #-=-=-=-=-=-=-=-=-=-=-= MEASURED ON NON UNIFORM GRID =-=-=-=-=-=-=-=-=-=-=-=-=
 # These objects use the algorithms that DO NOT require data to be equally
@@ -139,5 +456,44 @@ class SphericalMeasurementScalarNonUniform(object):
     pass
 
 class SphericalMeasurementTransverseNonUniform(object):
-    pass
+    """Holds the two transverse components (etheta, ephi) of a spherical 
+    measurement taken at arbitrary directions (theta, phi), e.g. along the
+    spiral trajectory of a range that moves both axes at once (see 
+    SpiralGridding). The samples may be stacked along leading axes (e.g.
+    frequency); the points are along the last axis.
+    """
+    def __init__(self, theta, phi, etheta, ephi):
+
+        self._theta = np.asarray(theta, dtype=np.float64).ravel()
+        self._phi = np.asarray(phi, dtype=np.float64).ravel()
+        self._etheta = np.asarray(etheta)
+        self._ephi = np.asarray(ephi)
+
+        J = len(self._theta)
+        if (len(self._phi) != J or self._etheta.shape != self._ephi.shape or
+            self._etheta.ndim == 0 or self._etheta.shape[-1] != J):
+            raise ValueError(err_msg['nu_size'])
+
+    @property
+    def theta(self):
+        """theta of the sample points."""
+        return self._theta
+
+    @property
+    def phi(self):
+        """phi of the sample points."""
+        return self._phi
+
+    @property
+    def etheta(self):
+        """The measured theta component."""
+        return self._etheta
+
+    @property
+    def ephi(self):
+        """The measured phi component."""
+        return self._ephi
+
+    def __len__(self):
+        return len(self._theta)
 
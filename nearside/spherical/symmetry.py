@@ -0,0 +1,418 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+             symmetry: AUTs with planes of symmetry
+
+A pattern that is symmetric about the xz plane (phi -> -phi) or the yz
+plane (phi -> pi - phi) is fixed by its values on half of the phi range,
+and by a quarter if it is symmetric about both. In coefficient space the
+modes with m < 0 follow from the ones with m > 0, and with both planes
+every other m vanishes. A body of revolution fed by a linearly polarized
+feed only radiates abs(m) = 1, which is fixed by two phi cuts.
+
+Only the unique phi columns are measured (unique_columns), only the unique
+modes are stored and processed (SymmetricCoefs), and the full set is
+rebuilt on demand.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#--------------------------------------------------------------------3rd Party
+import numpy as np
+
+#------------------------------------------------------------------------Custom
+from nearside._lazy import lazy_module
+from . import low_level
+from .structures import VectorCoefsStack
+
+sp = lazy_module('spherepy')
+
+#=============================================================================
+# Objects
+#=============================================================================
+
+class Symmetry(object):
+    """Symmetries of a pattern (E_theta, E_phi).
+
+    *xz* = +1 (-1) means the pattern is even (odd) under the mirror
+    y -> -y: E_theta(theta, -phi) = xz E_theta(theta, phi) and
+    E_phi(theta, -phi) = -xz E_phi(theta, phi). *yz* is the same for the
+    mirror x -> -x (phi -> pi - phi), 0 means no symmetry. With *m* set the
+    pattern only has the azimuthal modes abs(m) = *m*.
+
+    An AUT polarized along x is even about the xz plane (its E-plane) and
+    odd about the yz plane (its H-plane), see the constants e_plane,
+    h_plane, e_and_h_planes and body_of_revolution.
+
+    Example::
+
+        >>> s = nearside.spherical.Symmetry(xz = 1)
+        >>> s.unique_columns(72)        # phi from 0 to 180 degrees
+    """
+    def __init__(self, xz=0, yz=0, m=None):
+
+        if xz not in (-1, 0, 1) or yz not in (-1, 0, 1):
+            raise ValueError("xz and yz must be -1, 0 or 1")
+        if m is not None and m < 0:
+            raise ValueError("m must not be negative")
+
+        self._xz = xz
+        self._yz = yz
+        self._m = m
+
+    @property
+    def xz(self):
+        """Parity about the xz plane (0 if not symmetric)."""
+        return self._xz
+
+    @property
+    def yz(self):
+        """Parity about the yz plane (0 if not symmetric)."""
+        return self._yz
+
+    @property
+    def m(self):
+        """The only abs(m) of the pattern, None for any."""
+        return self._m
+
+    def __eq__(self, other):
+        return (isinstance(other, Symmetry) and
+                (self._xz, self._yz, self._m) ==
+                (other._xz, other._yz, other._m))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self._xz, self._yz, self._m))
+
+    def __repr__(self):
+        return "Symmetry(xz = {0}, yz = {1}, m = {2})".format(self._xz,
+                                                             self._yz,
+                                                             self._m)
+
+    def kept_modes(self, nmax, mmax):
+        """Positions (within a coefficient vector of size nmax, mmax) of the
+        modes that are stored: m >= 0 with a plane of symmetry, only the m
+        that don't vanish with two planes, only abs(m) = m for a body of
+        revolution."""
+
+        (n, m) = low_level.mode_numbers(nmax, mmax)
+        keep = np.ones(len(n), dtype=bool)
+        if self._m is not None:
+            keep &= np.abs(m) == self._m
+        if self._xz or self._yz:
+            keep &= m >= 0
+        if self._xz and self._yz:
+            keep &= (-1) ** np.abs(m) == self._xz * self._yz
+
+        return np.nonzero(keep)[0]
+
+    def mirror_modes(self, nmax, mmax):
+        """Returns (src, f1, f2) such that the coefficients of mode (n, -m)
+        are f1 vec1[src] and f2 vec2[src], for each kept mode (n, m) and
+        the reduced vectors vec1, vec2. For m = 0 this is a condition on 
+        the mode itself: a factor of -1 means the mode vanishes."""
+
+        kept = self.kept_modes(nmax, mmax)
+        (n, m) = low_level.mode_numbers(nmax, mmax)
+        (n, m) = (n[kept], m[kept])
+        s = (-1.0) ** np.abs(m)
+
+        if self._xz:
+            (f1, f2) = (-self._xz * s, self._xz * s)
+        elif self._yz:
+            (f1, f2) = (-self._yz * np.ones(len(m)),
+                        self._yz * np.ones(len(m)))
+        else:
+            (f1, f2) = (np.ones(len(m)), np.ones(len(m)))
+
+        if self._xz or self._yz:
+            src = np.arange(len(kept))
+        else:
+            pos = -np.ones((nmax + 1, 2 * mmax + 1), dtype=np.int64)
+            pos[n, m + mmax] = np.arange(len(kept))
+            src = pos[n, -m + mmax]
+
+        return (src, f1, f2)
+
+    def unique_columns(self, ncols):
+        """Indices of the columns phi = 2 pi k / ncols that have to be
+        measured: phi in [0, pi] for the xz plane, [-pi/2, pi/2] for the yz
+        plane, [0, pi/2] for both, and only phi = 0, pi / (2 m) for a body
+        of revolution (phi = 0 for m = 0).
+
+        Raises:
+          ValueError: Is raised if ncols doesn't fit the symmetry.
+
+        """
+
+        k = np.arange(ncols)
+        if self._m == 0:
+            return np.array([0])
+        if self._m:
+            if ncols % (4 * self._m) != 0:
+                raise ValueError("ncols must be a multiple of 4 m")
+            return np.array([0, ncols // (4 * self._m)])
+        if self._yz and ncols % 2 != 0:
+            raise ValueError("ncols must be even for the yz plane")
+
+        phi = 2 * np.pi * k / ncols
+        keep = np.ones(ncols, dtype=bool)
+        if self._xz:
+            keep &= np.sin(phi) >= -1e-12
+        if self._yz:
+            keep &= np.cos(phi) >= -1e-12
+
+        return k[keep]
+
+    def expand_pattern(self, et, ep, ncols):
+        """Rebuilds the full grid (..., nrows, ncols) of the pattern from
+        the unique columns et, ep (..., nrows, len(unique_columns(ncols)))."""
+
+        cols = self.unique_columns(ncols)
+        et = np.asarray(et)
+        ep = np.asarray(ep)
+        if et.shape[-1] != len(cols) or et.shape != ep.shape:
+            raise ValueError("et and ep must hold the " + str(len(cols)) +
+                             " unique columns")
+
+        if self._m == 0:
+            return (np.repeat(et, ncols, axis=-1), 
+                    np.repeat(ep, ncols, axis=-1))
+        if self._m:
+            # only exp(+-1j m phi): E(phi) = E(0) cos(m phi) +
+            # E(pi / 2m) sin(m phi)
+            phi = 2 * np.pi * np.arange(ncols) / ncols
+            (c, s) = (np.cos(self._m * phi), np.sin(self._m * phi))
+            return (et[..., :1] * c + et[..., 1:] * s,
+                    ep[..., :1] * c + ep[..., 1:] * s)
+
+        pos = -np.ones(ncols, dtype=np.int64)
+        pos[cols] = np.arange(len(cols))
+
+        # the column each k is copied from and the signs of E_theta, E_phi
+        (xz, yz) = (self._xz, self._yz)
+        src = np.zeros(ncols, dtype=np.int64)
+        st = np.ones(ncols)
+        sp_ = np.ones(ncols)
+        for k in range(ncols):
+            candidates = [(k, 1, 1)]
+            if xz:
+                candidates.append(((-k) % ncols, xz, -xz))
+            if yz:
+                candidates.append(((ncols // 2 - k) % ncols, yz, -yz))
+            if xz and yz:
+                candidates.append(((k + ncols // 2) % ncols, xz * yz,
+                                   xz * yz))
+            for (j, a, b) in candidates:
+                if pos[j] >= 0:
+                    (src[k], st[k], sp_[k]) = (pos[j], a, b)
+                    break
+
+        return (et[..., src] * st, ep[..., src] * sp_)
+
+e_plane = Symmetry(xz=1)
+h_plane = Symmetry(yz=-1)
+e_and_h_planes = Symmetry(xz=1, yz=-1)
+body_of_revolution = Symmetry(xz=1, yz=-1, m=1)
+
+class SymmetricCoefs(object):
+    """The unique coefficients of a pattern with the Symmetry *symmetry*:
+    vec1 and vec2 hold the modes kept_modes(nmax, mmax) of a coefficient
+    vector of size nmax, mmax along the last axis; leading axes index a
+    stack. reciprocity, rotate_around_y_by_pi, probe_correct and
+    probe_response only process these modes. full() rebuilds the complete
+    set.
+
+    Example::
+
+        >>> s = nearside.spherical.reduce_coefs(c,
+        ...                            nearside.spherical.e_and_h_planes)
+        >>> r = nearside.spherical.probe_correct(s, R)
+        >>> r.full()
+        VectorCoefs(nmax = 60, mmax = 60)
+    """
+    def __init__(self, vec1, vec2, nmax, mmax, symmetry):
+
+        vec1 = np.asarray(vec1)
+        vec2 = np.asarray(vec2)
+
+        if vec1.shape != vec2.shape:
+            raise ValueError("shape of vec1 and vec2 must be the same")
+        if mmax > nmax:
+            raise ValueError("nmax must be greater than or equal to mmax")
+
+        self._modes = symmetry.kept_modes(nmax, mmax)
+        if vec1.ndim == 0 or vec1.shape[-1] != len(self._modes):
+            raise ValueError("the last axis of vec1 and vec2 must have " +
+                             "length len(symmetry.kept_modes(nmax, mmax))")
+
+        self._vec1 = vec1
+        self._vec2 = vec2
+        self._nmax = nmax
+        self._mmax = mmax
+        self._symmetry = symmetry
+
+    @property
+    def nmax(self):
+        """Largest n value."""
+        return self._nmax
+
+    @property
+    def mmax(self):
+        """Largest abs(m) value."""
+        return self._mmax
+
+    @property
+    def symmetry(self):
+        """The Symmetry of the pattern."""
+        return self._symmetry
+
+    @property
+    def modes(self):
+        """Positions of the stored modes within a full coefficient vector."""
+        return self._modes
+
+    @property
+    def shape(self):
+        """The shape of the stack (not including the mode axis)."""
+        return self._vec1.shape[:-1]
+
+    @property
+    def vec1(self):
+        """The stored first (scoef1) coefficients."""
+        return self._vec1
+
+    @property
+    def vec2(self):
+        """The stored second (scoef2) coefficients."""
+        return self._vec2
+
+    def copy(self):
+        """Make a deep copy of this object."""
+        return SymmetricCoefs(np.copy(self._vec1), np.copy(self._vec2),
+                              self._nmax, self._mmax, self._symmetry)
+
+    def __repr__(self):
+        return ("SymmetricCoefs(shape = {0}, nmax = {1}, mmax = {2}, " +
+                "{3})").format(self.shape, self._nmax, self._mmax,
+                               self._symmetry)
+
+    def full_vectors(self):
+        """The complete coefficient vectors (vec1, vec2)."""
+
+        (nmax, mmax) = (self._nmax, self._mmax)
+        (n, m) = low_level.mode_numbers(nmax, mmax)
+        idx = low_level._mode_index_table(nmax, mmax)
+        (src, f1, f2) = self._symmetry.mirror_modes(nmax, mmax)
+        (nk, mk) = (n[self._modes], m[self._modes])
+
+        shape = self.shape + (len(n),)
+        vec1 = np.zeros(shape, dtype=np.result_type(self._vec1, 1j))
+        vec2 = np.zeros(shape, dtype=vec1.dtype)
+        mirror = idx[nk, -mk + mmax]
+        vec1[..., mirror] = f1 * self._vec1[..., src]
+        vec2[..., mirror] = f2 * self._vec2[..., src]
+
+        # m = 0 is its own mirror image, the odd part vanishes
+        z = (mk == 0)
+        vec1[..., self._modes] = self._vec1 * np.where(z, (1 + f1) / 2, 1)
+        vec2[..., self._modes] = self._vec2 * np.where(z, (1 + f2) / 2, 1)
+
+        return (vec1, vec2)
+
+    def full(self):
+        """The complete coefficients, a VectorCoefs (or a VectorCoefsStack
+        for a stack)."""
+
+        (vec1, vec2) = self.full_vectors()
+        if vec1.ndim == 1:
+            return sp.VectorCoefs(vec1.astype(np.complex128),
+                                  vec2.astype(np.complex128),
+                                  self._nmax, self._mmax)
+        else:
+            return VectorCoefsStack(vec1, vec2, self._nmax, self._mmax)
+
+#=============================================================================
+# Operations
+#=============================================================================
+
+def _vectors(coefficients):
+
+    if isinstance(coefficients, VectorCoefsStack):
+        return (coefficients.vec1, coefficients.vec2)
+    elif isinstance(coefficients, sp.VectorCoefs):
+        return (coefficients.scoef1._vec, coefficients.scoef2._vec)
+    else:
+        raise TypeError("coefficients must be a VectorCoefs or a " +
+                        "VectorCoefsStack object")
+
+def _reduce(vec1, vec2, nmax, mmax, symmetry):
+    """The SymmetricCoefs of the full vectors; the m = 0 modes that the
+    symmetry forbids are set to zero."""
+
+    kept = symmetry.kept_modes(nmax, mmax)
+    (_, f1, f2) = symmetry.mirror_modes(nmax, mmax)
+    (_, m) = low_level.mode_numbers(nmax, mmax)
+    z = (m[kept] == 0)
+
+    return SymmetricCoefs(vec1[..., kept] * np.where(z, (1 + f1) / 2, 1),
+                          vec2[..., kept] * np.where(z, (1 + f2) / 2, 1),
+                          nmax, mmax, symmetry)
+
+def reduce_coefs(coefficients, symmetry):
+    """Keeps only the unique modes of *coefficients* (a VectorCoefs or
+    VectorCoefsStack), see SymmetricCoefs. The other modes are dropped,
+    use symmetry_error to check that the pattern has the symmetry."""
+
+    (vec1, vec2) = _vectors(coefficients)
+
+    return _reduce(vec1, vec2, coefficients.nmax, coefficients.mmax,
+                   symmetry)
+
+def symmetry_error(coefficients, symmetry):
+    """Relative (power) size of the part of *coefficients* that doesn't
+    have the Symmetry *symmetry*, for each set of a stack."""
+
+    (vec1, vec2) = _vectors(coefficients)
+    (w1, w2) = reduce_coefs(coefficients, symmetry).full_vectors()
+    err = (np.sum(np.abs(vec1 - w1) ** 2, axis=-1) +
+           np.sum(np.abs(vec2 - w2) ** 2, axis=-1))
+    tot = np.sum(np.abs(vec1) ** 2, axis=-1) + np.sum(np.abs(vec2) ** 2,
+                                                      axis=-1)
+
+    return np.sqrt(err / tot)
+
+def symmetric_coefs_from_pattern(et, ep, nmax, mmax, symmetry, ncols):
+    """The SymmetricCoefs of a pattern measured on the unique columns
+    symmetry.unique_columns(ncols) of the grid theta = linspace(0, pi,
+    nrows), phi = 2 pi k / ncols. et and ep may be stacked along leading
+    axes."""
+
+    (ft, fp) = symmetry.expand_pattern(et, ep, ncols)
+    (vec1, vec2) = low_level.vcoefs_from_pattern(ft, fp, nmax, mmax)
+
+    return _reduce(vec1, vec2, nmax, mmax, symmetry)
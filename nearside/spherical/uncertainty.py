@@ -0,0 +1,214 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+          uncertainty: Monte Carlo measurement uncertainty budgets
+
+The perturbations of every trial (noise, probe coefficient errors and a
+measurement radius error) are drawn as stacked arrays. The coupling tables of
+the probe translation are computed once, and a whole batch of trials is
+pushed through the probe correction and the pattern evaluation at once.
+
+***************************************************************************"""
+
+#--------------------------Place in each *.py file----------------------------
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from six.moves import range  #use range instead of xrange
+#-----------------------------------------------------------------------------
+
+#--------------------------------------------------------------------3rd Party
+import numpy as np
+
+#------------------------------------------------------------------------Custom
+from nearside._lazy import lazy_module
+from . import low_level
+from . import standard_operations as so
+from .structures import VectorCoefsStack
+
+sp = lazy_module('spherepy')
+
+#=============================================================================
+# Operations
+#=============================================================================
+
+def monte_carlo_uncertainty( measured, probe, kr, trials = 1000,
+                             noise = 0.0, probe_error = 0.0,
+                             radius_error = 0.0, efficiency = 1.0,
+                             cut_phi = 0.0, ntheta = None,
+                             percentiles = (2.5, 50.0, 97.5), batch = 250,
+                             seed = None, region = so.external,
+                             precision = None ):
+    """Propagates measurement errors through probe_correct and reports
+    percentile bands of the gain along a pattern cut, of the peak gain on 
+    that cut and of the sidelobe level.
+
+    Every trial perturbs the inputs with
+      * complex Gaussian noise on the measured coefficients (white noise on
+        the samples of a uniform grid is white in coefficient space),
+      * complex Gaussian errors on the mu = +-1 probe coefficients,
+      * a Gaussian error of the electrical measurement radius kr, applied
+        to first order through the derivative of the coupling tables.
+
+    The bc_comp coupling tables (and their derivatives) are computed once.
+    The translated probe of every trial is then a matrix product, and
+    *batch* trials are corrected and evaluated together.
+
+    Example::
+
+        >>> r = nearside.spherical.monte_carlo_uncertainty(meas, probe, kr,
+        ...                      noise = 1e-3, probe_error = 0.01,
+        ...                      radius_error = k * 0.5e-3)
+        >>> r['cut_peak_gain']
+        array([ 21.98,  22.01,  22.04])
+
+    Args:
+      measured (VectorCoefs): The measured (uncorrected) coefficients.
+
+      probe (VectorCoefs): The probe coefficients, see
+      translate_symmetric_probe.
+
+      kr (float): Electrical radius of the measurement sphere.
+
+      trials (int, optional): Number of Monte Carlo trials.
+
+      noise (float, optional): Standard deviation of the noise, relative to
+      the rms of the measured coefficients.
+
+      probe_error (float, optional): Standard deviation of the probe
+      coefficient errors, relative to the rms of the mu = +-1 coefficients.
+
+      radius_error (float, optional): Standard deviation of kr.
+
+      efficiency (float, optional): Radiation efficiency used for the gain.
+
+      cut_phi (float, optional): The cut runs from theta = -pi to pi in the
+      plane phi = cut_phi.
+
+      ntheta (int, optional): Number of points of the cut, the default
+      resolves the lobes of the corrected pattern.
+
+      percentiles (sequence, optional): The percentiles that are reported.
+
+      batch (int, optional): Number of trials evaluated together.
+
+      seed (int, optional): Seed of the random numbers.
+
+      region (int, optional): external or internal.
+
+      precision (str, optional): double or single, see probe_correct.
+
+    Returns:
+      dict: 'percentiles', 'theta' (the cut), 'gain' (percentiles by theta,
+      dBi), 'cut_peak_gain' (the maximum of the cut, not the peak gain of 
+      the pattern, dBi), 'sidelobe_level' (dB below the peak of the cut, nan
+      if the cut has no sidelobes) and the per trial values 
+      'cut_peak_gain_trials' and 'sidelobe_level_trials'.
+
+    Raises:
+      TypeError: Is raised if measured or probe isn't a VectorCoefs object.
+
+    """
+
+    if not ( isinstance( measured, sp.VectorCoefs) and
+             isinstance( probe, sp.VectorCoefs) ):
+        raise TypeError("measured and probe must be VectorCoefs objects.")
+
+    rng = np.random.RandomState( seed )
+    nmax = measured.nmax
+    mmax = measured.mmax
+
+    # fixed part, shared by all trials
+    pn = probe.nmax
+    (B, C, dB, dC) = low_level.bc_tables( pn, nmax, kr, region )
+    mu1 = np.column_stack( probe[:, 1] )
+    muneg1 = np.column_stack( probe[:, -1] )
+    prms = np.sqrt( np.mean( np.abs( np.concatenate( [mu1, muneg1] ) ) ** 2 ))
+
+    v1 = measured.scoef1._vec
+    v2 = measured.scoef2._vec
+    mrms = np.sqrt( ( np.mean( np.abs( v1 ) ** 2 ) +
+                      np.mean( np.abs( v2 ) ** 2 ) ) / 2.0 )
+
+    if ntheta is None:
+        ntheta = 8 * (nmax + 1) + 1
+    t = np.linspace( -np.pi, np.pi, ntheta )
+    theta = np.abs( t )
+    phi = cut_phi + np.where( t < 0, np.pi, 0.0 )
+
+    def cnormal( shape ):
+        return ( rng.standard_normal( shape ) +
+                 1j * rng.standard_normal( shape ) ) / np.sqrt( 2.0 )
+
+    gains = []
+    for start in range( 0, trials, batch ):
+        T = min( batch, trials - start )
+
+        dk = radius_error * rng.standard_normal( T )[:, None, None]
+        R = low_level.translate_mu_plus_minus_one_probe_tables(
+                                    B + dk * dB, C + dk * dC,
+                                    muneg1 + probe_error * prms *
+                                             cnormal( (T,) + muneg1.shape ),
+                                    mu1 + probe_error * prms *
+                                          cnormal( (T,) + mu1.shape ) )
+
+        t1 = v1 + noise * mrms * cnormal( (T, len( v1 )) )
+        t2 = v2 + noise * mrms * cnormal( (T, len( v2 )) )
+
+        (c1, c2) = low_level.apply_mode_matrices(
+                                low_level.inverse_R_matrices( R, nmax ),
+                                t1, t2, nmax, mmax, precision )
+
+        d = so.directivity( VectorCoefsStack( c1, c2, nmax, mmax ),
+                            theta, phi, precision )
+        gains.append( 10.0 * np.log10( efficiency * d ) )
+
+    gain = np.concatenate( gains )
+    (peak, sidelobe) = _peak_and_sidelobe( gain )
+
+    return {'percentiles': np.asarray( percentiles ),
+            'theta': t,
+            'gain': np.percentile( gain, percentiles, axis=0 ),
+            'cut_peak_gain': np.percentile( peak, percentiles ),
+            'sidelobe_level': np.nanpercentile( sidelobe, percentiles ),
+            'cut_peak_gain_trials': peak,
+            'sidelobe_level_trials': sidelobe}
+
+def _peak_and_sidelobe( gain ):
+    """Peak of each cut gain[trial, :] (dB) and the level of the highest
+    sidelobe relative to it. The main lobe ends at the first local minimum
+    on either side of the peak."""
+
+    K = gain.shape[-1]
+    k = np.arange( K )
+    p = np.argmax( gain, axis=-1 )[:, None]
+    peak = np.take_along_axis( gain, p, axis=-1 )[:, 0]
+
+    minimum = np.zeros( gain.shape, dtype=bool )
+    minimum[:, 1:-1] = ( (gain[:, 1:-1] <= gain[:, :-2]) &
+                         (gain[:, 1:-1] <= gain[:, 2:]) )
+
+    left = np.max( np.where( minimum & (k < p), k, -1 ), axis=-1 )[:, None]
+    right = np.min( np.where( minimum & (k > p), k, K ), axis=-1 )[:, None]
+
+    outside = (k <= left) | (k >= right)
+    side = np.max( np.where( outside, gain, -np.inf ), axis=-1 )
+    side = np.where( np.isfinite( side ), side - peak, np.nan )
+
+    return (peak, side)
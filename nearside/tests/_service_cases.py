@@ -0,0 +1,133 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+      _service_cases: the test cases of test_service (Python 3.7+ only)
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+import asyncio
+import os
+import shutil
+import tempfile
+
+from six.moves import range  #use range instead of xrange
+
+import numpy as np
+import spherepy as sp
+import nearside.file_handler as fh
+import nearside.service as nsv
+
+from test_pipeline import write_scan
+
+
+class TestService(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for d in ('sph', 'pla', 'staging'):
+            os.makedirs(os.path.join(self.dir, d))
+
+        nmax = 6
+        self.aut = sp.random_coefs(nmax, nmax, coef_type=sp.vector)
+        probe = sp.random_coefs(3, 1, coef_type=sp.vector)
+        self.probe = os.path.join(self.dir, 'probe')
+        self.f = [1e9, 1.5e9]
+        fh.write_probe_data(self.probe, self.f, [probe] * 2)
+
+        # the spherical exports are moved into the chamber directory
+        self.spherical = write_scan(os.path.join(self.dir, 'staging'),
+                                    self.aut, probe, 0.2, self.f, nmax)
+
+        (x, y) = np.meshgrid(np.linspace(-0.1, 0.1, 9),
+                             np.linspace(-0.1, 0.1, 9), indexing='ij')
+        e = np.exp(-(x ** 2 + y ** 2) / 0.002).ravel()
+        self.planar = np.column_stack([x.ravel(), y.ravel(), e, 0 * e,
+                                       0 * e, 0 * e])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, f, rows):
+        with open(name, 'w') as fp:
+            fp.write('# Frequency: {0:.6e}\n'.format(f))
+            np.savetxt(fp, rows)
+
+    def _arrive(self, k):
+        name = self.spherical[k]
+        os.rename(name, os.path.join(self.dir, 'sph',
+                                     os.path.basename(name)))
+
+    def _chambers(self):
+        return [nsv.Chamber('sph', os.path.join(self.dir, 'sph'),
+                            os.path.join(self.dir, 'sph_out'),
+                            probe=self.probe, radius=0.2),
+                nsv.Chamber('pla', os.path.join(self.dir, 'pla'),
+                            os.path.join(self.dir, 'pla_out'),
+                            kind=nsv.planar, concurrency=1)]
+
+    def test_drain(self):
+        """:: Test processing the files of two chambers"""
+        for k in range(len(self.spherical)):
+            self._arrive(k)
+        self._write(os.path.join(self.dir, 'pla', 'p.txt'), 3e9,
+                    self.planar)
+        self._write(os.path.join(self.dir, 'pla', 'bad.txt'), 3e9,
+                    self.planar[:-1])
+
+        s = nsv.Service(self._chambers(), jobs=2)
+        asyncio.run(s.drain())
+
+        self.assertEqual(s.stats['sph']['files'], 2)
+        self.assertEqual(s.stats['pla']['files'], 1)
+        self.assertEqual(s.stats['pla']['failed'], 1)
+
+        store = fh.CoefficientStore(os.path.join(self.dir, 'sph_out'))
+        self.assertEqual(sorted(store.frequencies), self.f)
+        c = store.read(0, states=[0])
+        self.assertTrue(np.allclose(c.vec1[0], self.aut.scoef1._vec, 0,
+                                    1e-9 * np.max(np.abs(
+                                    self.aut.scoef1._vec))))
+
+        with np.load(os.path.join(self.dir, 'pla_out', 'p.npz')) as d:
+            self.assertEqual(d['spectrum'].shape[0], 2)
+
+    def test_watch(self):
+        """:: Test that files arriving while the service runs are taken"""
+        s = nsv.Service(self._chambers()[:1], jobs=1, poll=0.02)
+
+        async def scenario():
+            stop = asyncio.Event()
+            task = asyncio.ensure_future(s.run(stop))
+            for k in range(len(self.spherical)):
+                await asyncio.sleep(0.05)
+                self._arrive(k)
+            for k in range(500):
+                await asyncio.sleep(0.02)
+                if s.stats['sph']['files'] == 2:
+                    break
+            stop.set()
+            await task
+
+        asyncio.run(scenario())
+        self.assertEqual(s.stats['sph']['files'], 2)
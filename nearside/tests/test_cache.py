@@ -0,0 +1,144 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+            test_cache: test the stage cache
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from six.moves import range  #use range instead of xrange
+
+import numpy as np
+import spherepy as sp
+import nearside.spherical as nss
+from nearside.cache import StageCache
+
+
+class TestStageCache(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_tiers(self):
+        """:: Test the LRU memory tier and the size limited disk tier"""
+        c = StageCache(memory_bytes=3 * 800, path=self.dir,
+                       disk_bytes=4 * 1200)
+        a = [np.full(100, k, dtype=np.float64) for k in range(6)]
+        for k in range(3):
+            c.put(str(k), a[k])
+        c.get('0')
+        c.put('3', a[3])
+        # '1' was the least recently used
+        self.assertEqual(len(c), 3)
+        self.assertNotIn('1', c._entries)
+
+        c.clear()
+        self.assertTrue(np.all(c.get('1') == a[1]))
+        self.assertEqual((c.hits, c.misses), (2, 0))
+
+        for k in range(4, 6):
+            c.put(str(k), a[k])
+        self.assertLessEqual(sum(os.path.getsize(os.path.join(self.dir, n))
+                                 for n in os.listdir(self.dir)), 4 * 1200)
+        self.assertIsNone(StageCache(path=self.dir).get('missing'))
+
+    def test_wrap(self):
+        """:: Test caching translate_symmetric_probe and probe_correct"""
+        c = StageCache(path=self.dir)
+        probe = sp.random_coefs(3, 1, coef_type=sp.vector)
+        aut = sp.random_coefs(10, 10, coef_type=sp.vector)
+
+        translate = c.wrap(nss.translate_symmetric_probe)
+        correct = c.wrap(nss.probe_correct)
+        R = translate(10, probe, 12.0)
+        m = correct(aut, R)
+        self.assertEqual(c.misses, 2)
+
+        # a new process only sees the disk tier
+        c2 = StageCache(path=self.dir)
+        m2 = c2.wrap(nss.probe_correct)(aut, 
+                 c2.wrap(nss.translate_symmetric_probe)(10, probe, 12.0))
+        self.assertEqual((c2.hits, c2.misses), (2, 0))
+        self.assertTrue(np.all(m2.scoef1._vec == m.scoef1._vec))
+        self.assertIsInstance(m2, sp.VectorCoefs)
+
+        # different parameters are different entries
+        translate(10, probe, 12.5)
+        self.assertEqual(c.misses, 3)
+
+    def test_symmetric(self):
+        """:: Test SymmetricCoefs results on the disk tier"""
+        aut = sp.random_coefs(8, 8, coef_type=sp.vector)
+        for sym in [nss.e_plane, nss.body_of_revolution]:
+            r = nss.reduce_coefs(aut, sym)
+            StageCache(path=self.dir).call('id', lambda x: x, r)
+
+            # a fresh cache reads the result back from the disk tier
+            c = StageCache(path=self.dir)
+            r2 = c.call('id', lambda x: x, r)
+            self.assertEqual((c.hits, c.misses), (1, 0))
+            self.assertIsInstance(r2, nss.SymmetricCoefs)
+            self.assertEqual(r2.symmetry, sym)
+            self.assertEqual((r2.nmax, r2.mmax), (r.nmax, r.mmax))
+            self.assertTrue(np.all(r2.vec1 == r.vec1))
+            self.assertTrue(np.all(r2.vec2 == r.vec2))
+
+    def test_keys(self):
+        """:: Test that different inputs never share a cache entry"""
+        c = StageCache()
+        total = c.wrap(lambda *args: sum(float(np.sum(np.abs(a))) 
+                                         for a in _arrays(args)), 'total')
+
+        u = np.ones((3, 3, 16))
+        self.assertEqual(total(nss.ChannelCoefs(u, 3, 3)), 144.0)
+        self.assertEqual(total(nss.ChannelCoefs(0 * u, 3, 3)), 0.0)
+
+        # numpy abbreviates the repr of large arrays with '...'
+        a = np.zeros(2000)
+        b = np.zeros(2000)
+        b[1000] = 1.0
+        self.assertEqual(total([a]), 0.0)
+        self.assertEqual(total([b]), 1.0)
+        self.assertEqual(total({'x': (a,)}), 0.0)
+        self.assertEqual(total({'x': (b,)}), 1.0)
+        self.assertEqual(c.misses, 6)
+
+        with self.assertRaises(TypeError):
+            total(object())
+
+
+def _arrays(value):
+    if isinstance(value, np.ndarray):
+        return [value]
+    elif isinstance(value, nss.ChannelCoefs):
+        return [value.u]
+    elif isinstance(value, dict):
+        value = list(value.values())
+    return [a for v in value for a in _arrays(v)]
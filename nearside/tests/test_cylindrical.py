@@ -0,0 +1,65 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+       test_cylindrical: test the helical scan mode spectrum
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+
+from six.moves import range  #use range instead of xrange
+
+import numpy as np
+import nearside.cylindrical as ncy
+
+
+class TestCylindrical(TestCase):
+
+    def test_helical_mode_spectrum(self):
+        """:: Test the spectrum of a helical scan of a single mode
+
+        E = exp(3j phi) exp(-z^2 / 2) has c_3(h) = sqrt(2 pi) exp(-h^2 / 2)
+        and nothing else.
+        """
+        (phi, z, w) = ncy.helical_points(160, 64, 0.1, -7.5)
+        E = np.exp(3j * phi) * np.exp(-z ** 2 / 2.0)
+        m = ncy.CylindricalMeasurementTransverseNonUniform(phi, z, E, 
+                                                           2 * E, w)
+
+        (n, h, c) = ncy.cylindrical_mode_spectrum(m, 8, 5.0)
+        self.assertEqual(c.shape, (2, 17, len(h)))
+
+        ref = np.zeros((17, len(h)), dtype=np.complex128)
+        ref[n == 3] = np.sqrt(2 * np.pi) * np.exp(-h ** 2 / 2.0)
+        self.assertLess(np.max(np.abs(c[0] - ref)), 1e-9)
+        self.assertLess(np.max(np.abs(c[1] - 2 * ref)), 1e-9)
+
+        # against the direct sum, for a stack of two frequencies
+        m = ncy.CylindricalMeasurementTransverseNonUniform(
+                        phi, z, np.stack([E, E * z]), np.stack([E, E]), w)
+        (n, h, c) = ncy.cylindrical_mode_spectrum(m, 8, 5.0)
+        d = np.einsum('j,nhj->nh', w * E * z, 
+                      np.exp(-1j * (n[:, None, None] * phi + 
+                                    h[None, :, None] * z))) / (2 * np.pi)
+        self.assertEqual(c.shape, (2, 2, 17, len(h)))
+        self.assertLess(np.max(np.abs(c[0, 1] - d)), 1e-9)
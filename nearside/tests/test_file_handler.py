@@ -0,0 +1,209 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+            test_file_handler: test the ASCII measurement readers
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from six.moves import range  #use range instead of xrange
+
+import numpy as np
+import nearside.file_handler as fh
+import nearside.planar as npl
+import nearside
+
+
+def _write(filename, header, rows):
+    with open(filename, 'w') as f:
+        f.write(header)
+        for r in rows:
+            f.write(' '.join('{0:.15e}'.format(v) for v in r) + '\n')
+
+
+class TestFileHandler(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+        (x, y) = np.meshgrid(np.linspace(-1, 1, 5), np.linspace(-2, 2, 7),
+                             indexing='ij')
+        (self.x, self.y) = (x.ravel(), y.ravel())
+        rs = np.random.RandomState(3)
+        self.ex = rs.randn(35) + 1j * rs.randn(35)
+        self.ey = rs.randn(35) + 1j * rs.randn(35)
+        self.header = ("# Frequency: 10e9\n! Probe = WR90\n" + 
+                       "x y ex_re ex_im ey_re ey_im\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_real_imag_blocks(self):
+        """:: Test the block parser, with lines split across blocks"""
+        name = os.path.join(self.dir, 'scan.txt')
+        _write(name, self.header, np.column_stack([self.x, self.y, 
+                         self.ex.real, self.ex.imag, 
+                         self.ey.real, self.ey.imag]))
+
+        old = fh.block_size
+        try:
+            for size in (37, 1 << 20):
+                fh.block_size = size
+                (h, d) = fh.read_ascii_columns(name, {'x': 0, 'ex': (2, 3),
+                                                      'ey': (4, 5)})
+                self.assertEqual(h['frequency'], 10e9)
+                self.assertEqual(h['probe'], 'WR90')
+                self.assertTrue(np.allclose(d['x'], self.x, 0, 1e-14))
+                self.assertTrue(np.allclose(d['ex'], self.ex, 0, 1e-14))
+                self.assertTrue(np.allclose(d['ey'], self.ey, 0, 1e-14))
+        finally:
+            fh.block_size = old
+
+        with open(name, 'a') as f:
+            f.write('1 2 3\n')
+        with self.assertRaises(ValueError):
+            fh.read_ascii_columns(name, {'x': 0})
+
+    def test_bad_lines(self):
+        """:: Test comment lines in the data and lines of the wrong length"""
+        name = os.path.join(self.dir, 'scan.txt')
+        rows = np.column_stack([self.x, self.y, self.ex.real, self.ex.imag,
+                                self.ey.real, self.ey.imag])
+
+        with open(name, 'w') as f:
+            f.write(self.header)
+            for (k, r) in enumerate(rows):
+                if k == 10:
+                    f.write('# end\n\n')
+                f.write(' '.join('{0:.15e}'.format(v) for v in r) + '\n')
+
+        old = fh.block_size
+        try:
+            for size in (37, 1 << 20):
+                fh.block_size = size
+                (h, d) = fh.read_ascii_columns(name, {'x': 0, 'ey': (4, 5)})
+                self.assertEqual(len(d['x']), 35)
+                self.assertTrue(np.allclose(d['ey'], self.ey, 0, 1e-14))
+        finally:
+            fh.block_size = old
+
+        # a short and a long line that add up to two lines of values
+        for bad in ('5 6 7\n8 9 10 11 12\n', '1 2 3 4\n5 6 7\n8 9 10 11 12\n',
+                    '1 2 x 4\n'):
+            with open(name, 'w') as f:
+                f.write('1 2 3 4\n' + bad + '13 14 15 16\n')
+            with self.assertRaises(ValueError):
+                fh.read_ascii_columns(name, {'x': 0})
+
+    def test_amplitude_phase_threads(self):
+        """:: Test dB / degree columns and the threaded multi-file read"""
+        names = []
+        for n in range(3):
+            e = self.ex * (n + 1)
+            names.append(os.path.join(self.dir, 'f{0}.txt'.format(n)))
+            _write(names[-1], self.header, np.column_stack([self.x, self.y,
+                          20 * np.log10(np.abs(e)), np.degrees(np.angle(e)),
+                          self.ey.real, self.ey.imag]))
+
+        res = fh.read_ascii_files(names, {'ex': (2, 3)}, fh.amplitude_phase,
+                                  amplitude_unit='db', threads=2)
+        for (n, (h, d)) in enumerate(res):
+            self.assertTrue(np.allclose(d['ex'], self.ex * (n + 1), 0, 
+                                        1e-12))
+
+    def test_measurements(self):
+        """:: Test the conversion to planar and spherical measurements"""
+        name = os.path.join(self.dir, 'scan.txt')
+        _write(name, self.header, np.column_stack([self.x, self.y, 
+                         self.ex.real, self.ex.imag, 
+                         self.ey.real, self.ey.imag]))
+
+        m = fh.read_planar_measurement(name)
+        self.assertIsInstance(m, npl.PlanarMeasurementTransverseNonUniform)
+        self.assertTrue(np.allclose(m.weights, 0.5 * 0.666666666666667))
+        self.assertTrue(np.allclose(m.ey, self.ey, 0, 1e-14))
+
+        s = fh.read_spherical_measurement(name)
+        self.assertIsInstance(s, nearside.SphericalMeasurementTransverseNonUniform)
+        self.assertTrue(np.allclose(s.theta, np.radians(self.x)))
+        self.assertTrue(np.allclose(s.etheta, self.ex, 0, 1e-14))
+
+        _write(name, self.header, np.column_stack([self.x[:-1], self.y[:-1],
+                         self.ex.real[:-1], self.ex.imag[:-1], 
+                         self.ey.real[:-1], self.ey.imag[:-1]]))
+        with self.assertRaises(ValueError):
+            fh.read_planar_measurement(name)
+
+    def test_coefficient_store(self):
+        """:: Test appending to and reading from a CoefficientStore"""
+        (nmax, mmax, ns) = (6, 4, 5)
+        NC = nmax + 1 + mmax * (2 * (nmax + 1) - mmax - 1)
+        rs = np.random.RandomState(1)
+        v1 = rs.randn(4, ns, NC) + 1j * rs.randn(4, ns, NC)
+        v2 = rs.randn(4, ns, NC) + 1j * rs.randn(4, ns, NC)
+        f = np.array([1e9, 2e9, 3e9, 4e9])
+
+        path = os.path.join(self.dir, 'store')
+        s = fh.CoefficientStore.create(path, nmax, mmax, ns, state_chunk=2)
+        s.append(f[0], nearside.VectorCoefsStack(v1[0], v2[0], nmax, mmax))
+        s.append(f[1:], nearside.VectorCoefsStack(v1[1:], v2[1:], nmax, 
+                                                  mmax))
+
+        s = fh.CoefficientStore(path)
+        self.assertEqual(len(s), 4)
+        self.assertTrue(np.all(s.frequencies == f))
+        self.assertEqual(s.nearest(2.9e9), 2)
+
+        c = s.read(2, states=[4, 1])
+        self.assertEqual(c.shape, (2,))
+        self.assertTrue(np.all(c.vec1 == v1[2, [4, 1]]))
+        self.assertTrue(np.all(c.vec2 == v2[2, [4, 1]]))
+        c = s.read(slice(1, None))
+        self.assertEqual(c.shape, (3, ns))
+        self.assertTrue(np.all(c.vec2 == v2[1:]))
+
+        with self.assertRaises(IOError):
+            s.append(f[0], nearside.VectorCoefsStack(v1[0], v2[0], nmax, 
+                                                     mmax))
+
+        # an interrupted append (data without a frequency) is ignored
+        with open(os.path.join(path, 'index.bin'), 'ab') as d:
+            d.write(np.zeros(6, dtype='<i8').tobytes())
+        s = fh.CoefficientStore(path, 'a')
+        self.assertEqual(len(s), 4)
+        s.append(5e9, nearside.VectorCoefsStack(v1[3], v2[3], nmax, mmax))
+        self.assertTrue(np.all(fh.CoefficientStore(path).read(4).vec1 == 
+                               v1[3]))
+
+        # a stored frequency is replaced, not added again
+        s.update(f[1], nearside.VectorCoefsStack(v1[0], v2[0], nmax, mmax))
+        s.update(6e9, nearside.VectorCoefsStack(v1[2], v2[2], nmax, mmax))
+        s = fh.CoefficientStore(path)
+        self.assertEqual(len(s), 6)
+        self.assertTrue(np.all(s.read(1).vec1 == v1[0]))
+        self.assertTrue(np.all(s.read(2).vec2 == v2[2]))
+        self.assertTrue(np.all(s.read(5).vec1 == v1[2]))
@@ -0,0 +1,158 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+            test_pipeline: test the batch processing pipeline
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from six.moves import range  #use range instead of xrange
+
+import numpy as np
+import spherepy as sp
+import nearside.file_handler as fh
+import nearside.pipeline as npp
+import nearside.spherical as nss
+from nearside import cli
+
+
+def write_scan(directory, aut, probe, radius, frequencies, nmax):
+    """Writes the probe response to aut at each frequency as an export on 
+    the smallest grid for nmax, returns the file names."""
+
+    (nrows, ncols) = (nmax + 2, 2 * nmax + 2)
+    (theta, phi) = np.meshgrid(np.linspace(0, 180, nrows), 
+                               360.0 * np.arange(ncols) / ncols, 
+                               indexing='ij')
+    names = []
+    for f in frequencies:
+        kr = 2 * np.pi * f / npp.c0 * radius
+        R = nss.translate_symmetric_probe(nmax, probe, kr)
+        m = nss.probe_response(aut, R)
+        (et, ep) = nss.low_level.pattern_on_grid(m.scoef1._vec, 
+                                                 m.scoef2._vec, nmax, nmax,
+                                                 nrows, ncols)
+        names.append(os.path.join(directory, '{0:.0f}.txt'.format(f)))
+        with open(names[-1], 'w') as fp:
+            fp.write('# Frequency: {0:.6e}\n'.format(f))
+            np.savetxt(fp, np.column_stack([theta.ravel(), phi.ravel(),
+                                            et.real.ravel(), et.imag.ravel(),
+                                            ep.real.ravel(), 
+                                            ep.imag.ravel()]))
+
+    return names
+
+
+class TestPipeline(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.nmax = 8
+        self.f = [2e9, 2.5e9, 3e9]
+
+        self.aut = sp.random_coefs(self.nmax, self.nmax, 
+                                   coef_type=sp.vector)
+        self.probe = sp.random_coefs(3, 1, coef_type=sp.vector)
+        self.probe_path = os.path.join(self.dir, 'probe')
+        fh.write_probe_data(self.probe_path, self.f, [self.probe] * 3)
+        self.files = write_scan(self.dir, self.aut, self.probe, 0.1, 
+                                self.f, self.nmax)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _check(self, path):
+        s = fh.CoefficientStore(path)
+        self.assertTrue(np.allclose(s.frequencies, self.f))
+        c = s.read(slice(None), states=[0])
+        a = self.aut.scoef1._vec
+        self.assertTrue(np.allclose(c.vec1[:, 0], a, 0, 1e-9 * np.max(
+                                    np.abs(a))))
+
+    def test_run(self):
+        """:: Test that the pipeline undoes the probe response"""
+        out = os.path.join(self.dir, 'out')
+        stats = npp.run(self.files, self.probe_path, 0.1, out, jobs=2)
+        self.assertEqual(stats['files'], 3)
+        self.assertIn('translate', npp.throughput(stats))
+        self._check(out)
+
+    def test_cli(self):
+        """:: Test the process command of the console script"""
+        out = os.path.join(self.dir, 'cli')
+        code = cli.main(['process'] + self.files + 
+                        ['--probe', self.probe_path, '--radius', '0.1', 
+                         '--output', out])
+        self.assertEqual(code, 0)
+        self._check(out)
+
+    def test_checkpoint(self):
+        """:: Test resuming a run from a checkpoint"""
+        out = os.path.join(self.dir, 'out')
+        ckpt = os.path.join(self.dir, 'ckpt')
+
+        # a run that stopped after two frequencies
+        npp.run(self.files[:2], self.probe_path, 0.1, out, checkpoint=ckpt)
+        stats = npp.run(self.files, self.probe_path, 0.1, out, 
+                        checkpoint=ckpt)
+        self.assertEqual(stats['skipped'], 2)
+        self._check(out)
+
+        stats = npp.run(self.files, self.probe_path, 0.1, out, jobs=2,
+                        checkpoint=ckpt)
+        self.assertEqual(stats['skipped'], 3)
+        self.assertEqual(len(fh.CoefficientStore(out)), 3)
+
+        # a changed export is recomputed and replaces the stored set
+        write_scan(self.dir, 2.0 * self.aut, self.probe, 0.1, self.f[:1],
+                   self.nmax)
+        stats = npp.run(self.files, self.probe_path, 0.1, out, 
+                        checkpoint=ckpt)
+        self.assertEqual(stats['skipped'], 2)
+        s = fh.CoefficientStore(out)
+        self.assertTrue(np.allclose(s.frequencies, self.f))
+        c = s.read(s.nearest(self.f[0]), states=[0])
+        a = 2.0 * self.aut.scoef1._vec
+        self.assertTrue(np.allclose(c.vec1[0], a, 0, 1e-9 * np.max(
+                                    np.abs(a))))
+
+        # the probe data R of every frequency was recorded once
+        self.assertEqual(len([n for n in os.listdir(ckpt) 
+                              if n.startswith('R_')]), 3)
+
+    def test_stage_cache(self):
+        """:: Test that a rerun with a stage cache only hits the cache"""
+        from nearside.cache import StageCache
+
+        cache = StageCache(path=os.path.join(self.dir, 'cache'))
+        npp.run(self.files, self.probe_path, 0.1, 
+                os.path.join(self.dir, 'a'), cache=cache)
+        self.assertEqual(cache.misses, 9)
+        npp.run(self.files, self.probe_path, 0.1, 
+                os.path.join(self.dir, 'b'), cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (9, 9))
+        self._check(os.path.join(self.dir, 'b'))
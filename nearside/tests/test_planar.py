@@ -0,0 +1,84 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+            test_planar: test the non-uniform planar transforms
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+
+from six.moves import range  #use range instead of xrange
+
+import numpy as np
+import nearside.planar as npl
+
+
+class TestPlanar(TestCase):
+
+    def test_nufft_direct(self):
+        """:: Test both NUFFT types and kernels against the direct sums"""
+        pll = npl.low_level
+
+        rnd = np.random.RandomState(0)
+        J = 300
+        tx = rnd.uniform(-np.pi, np.pi, J)
+        ty = rnd.uniform(-np.pi, np.pi, J)
+        c = rnd.normal(size=(2, J)) + 1j * rnd.normal(size=(2, J))
+        F = rnd.normal(size=(2, 16, 12)) + 1j * rnd.normal(size=(2, 16, 12))
+
+        kx = np.arange(-8, 8)
+        ky = np.arange(-6, 6)
+        E = np.exp(-1j * (kx[:, None, None] * tx + ky[None, :, None] * ty))
+
+        for kernel in [pll.gaussian, pll.kaiser_bessel]:
+            p = pll.nufft_plan(tx, ty, (16, 12), 1e-10, kernel)
+            self.assertIs(p, pll.nufft_plan(tx, ty, (16, 12), 1e-10, kernel))
+
+            d1 = np.einsum('xyj,bj->bxy', E, c)
+            d2 = np.einsum('xyj,bxy->bj', E.conj(), F)
+            self.assertLess(np.max(np.abs(p.type1(c) - d1)), 
+                            1e-9 * np.max(np.abs(d1)))
+            self.assertLess(np.max(np.abs(p.type2(F) - d2)), 
+                            1e-9 * np.max(np.abs(d2)))
+
+    def test_plane_wave_spectrum(self):
+        """:: Spectrum of a Gaussian aperture field from a plane-polar scan
+        """
+        s = 0.8
+        (x, y, w) = npl.plane_polar_points(np.linspace(0, 8, 161), 128)
+        E = np.exp(-(x ** 2 + y ** 2) / (2 * s ** 2))
+        m = npl.PlanarMeasurementTransverseNonUniform(x, y, E, 0.5 * E, w)
+
+        (kx, ky, A) = npl.plane_wave_spectrum(m, 6.0)
+        self.assertEqual(A.shape, (2, len(kx), len(ky)))
+
+        (KX, KY) = np.meshgrid(kx, ky, indexing='ij')
+        ref = 2 * np.pi * s ** 2 * np.exp(-s ** 2 * (KX ** 2 + KY ** 2) / 2)
+        self.assertLess(np.max(np.abs(A[0] - ref)), 1e-3 * np.max(ref))
+        self.assertLess(np.max(np.abs(A[1] - 0.5 * ref)), 1e-3 * np.max(ref))
+
+        b = npl.near_field_from_spectrum(kx, ky, ref, x[:400], y[:400])
+        self.assertLess(np.max(np.abs(b - E[:400])), 1e-5)
+
+        with self.assertRaises(ValueError):
+            npl.PlanarMeasurementScalarNonUniform(x, y[:-1], E, w)
@@ -0,0 +1,38 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+            test_service: test the watch-folder service
+
+The service is written with async def and asyncio.run, so its test cases 
+live in _service_cases and are only imported on Python 3.7 and later; 
+older interpreters skip this module without compiling them.
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import SkipTest
+import sys
+
+if sys.version_info < (3, 7):
+    raise SkipTest("the watch-folder service needs Python 3.7 or later")
+
+from _service_cases import TestService
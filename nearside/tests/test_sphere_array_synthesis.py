@@ -0,0 +1,85 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+      test_sphere_array_synthesis: test array pattern superposition
+
+Test ElementArray against the array factor of identical elements.
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+
+from six.moves import range  #use range instead of xrange
+
+import numpy as np
+import nearside.spherical as nss
+import spherepy as sp
+
+
+class TestSphereArraySynthesis(TestCase):
+
+    def test_array_factor(self):
+        """:: Test a steered beam of identical elements
+
+        For identical elements the array pattern is the element pattern 
+        times the array factor.
+        """
+        sll = nss.low_level
+
+        c = sp.random_coefs(2, 2, coef_type=sp.vector)
+        x = np.pi * np.arange(-2, 3)
+        pos = np.zeros((5, 3))
+        pos[:, 0] = x
+
+        a = nss.ElementArray([c] * 5, pos)
+        self.assertEqual(len(a), 5)
+
+        w = a.steering_weights([0.3, 0.5, 0.7], 0.0)
+        beams = a.synthesize(w)
+        self.assertEqual(beams.shape, (3,))
+
+        theta = np.array([0.1, 0.5, 1.2, 2.0])
+        phi = np.array([0.0, 0.3, 2.0, 4.0])
+        r = sll.directions(theta, phi)
+        (et0, ep0) = sll.evaluate_pattern(c.scoef1._vec, c.scoef2._vec, 
+                                          2, 2, theta, phi)
+        for k in range(3):
+            b = beams[k]
+            (et, ep) = sll.evaluate_pattern(b.scoef1._vec, b.scoef2._vec,
+                                            b.nmax, b.mmax, theta, phi)
+            af = np.dot(np.exp(-1j * np.dot(r, pos.T)), w[k])
+            self.assertLess(np.max(np.abs(et - et0 * af)), 1e-5)
+            self.assertLess(np.max(np.abs(ep - ep0 * af)), 1e-5)
+
+    def test_rotated_elements(self):
+        """:: Test that element rotations are applied before the move
+        """
+
+        c = sp.random_coefs(3, 3, coef_type=sp.vector)
+        pos = np.array([[0, 0, 0], [2.0, 1.0, 0.5]])
+        rot = np.array([[0, 0, 0], [0.4, 1.2, -0.3]])
+
+        a = nss.ElementArray([c, c], pos, rot, nmax = 20)
+        e = nss.translate(nss.rotate(c, 0.4, 1.2, -0.3), -pos[1], nmax = 20)
+
+        self.assertLess(sp.LInf_coef(a.synthesize([0, 1]) - e), 1e-12)
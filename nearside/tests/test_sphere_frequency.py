@@ -0,0 +1,117 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+     test_sphere_frequency: test frequency interpolation and time gating
+
+Each mode is given a response made of a few delayed echoes, 
+X(f) = sum a exp(1j 2 pi f tau), whose delays fall on the time grid.
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+
+from six.moves import range  #use range instead of xrange
+
+import numpy as np
+import nearside.spherical as nss
+
+
+def echoes(f, a, tau):
+    """ Coefficients sum_k a[k] exp(1j 2 pi f tau[k]), shape (F, NC). """
+    return np.einsum('kj,fk->fj', a, np.exp(2j * np.pi * np.outer(f, tau)))
+
+class TestSphereFrequency(TestCase):
+
+    def setUp(self):
+        self.nmax = 4
+        NC = (self.nmax + 1) ** 2
+        self.f = 2e9 + 50e6 * np.arange(40)
+        T = 1.0 / (40 * 50e6)
+        self.tau = T * np.array([-3, 1, 12])
+        rnd = np.random.RandomState(3)
+        self.a1 = rnd.normal(size=(3, NC)) + 1j * rnd.normal(size=(3, NC))
+        self.a2 = rnd.normal(size=(3, NC)) + 1j * rnd.normal(size=(3, NC))
+
+    def stack(self, f, sl=slice(None)):
+        return nss.VectorCoefsStack(echoes(f, self.a1[sl], self.tau[sl]),
+                                    echoes(f, self.a2[sl], self.tau[sl]),
+                                    self.nmax, self.nmax)
+
+    def test_time_round_trip(self):
+        """:: Test the time responses and the transform back"""
+        
+        s = self.stack(self.f)
+        (h, t) = nss.frequency_to_time(s, self.f, nfft=160)
+        self.assertEqual(h.shape, (160,))
+
+        # the echoes are the largest samples, at their delays
+        k = np.argmax(np.abs(h.vec1[:, 0]))
+        self.assertAlmostEqual(t[k] / self.tau[np.argmax(
+                                   np.abs(self.a1[:, 0]))], 1.0, places=10)
+
+        b = nss.time_to_frequency(h, len(self.f))
+        self.assertTrue(np.allclose(b.vec1, s.vec1, atol=1e-12))
+        self.assertTrue(np.allclose(b.vec2, s.vec2, atol=1e-12))
+
+        with self.assertRaises(ValueError):
+            nss.frequency_to_time(s, self.f[::-1])
+
+    def test_time_gate(self):
+        """:: The gate removes the late echo"""
+
+        s = self.stack(self.f)
+        g = nss.time_gate(s, self.f, -2e-9, 1.5e-9)
+        r = self.stack(self.f, slice(0, 2))
+
+        self.assertTrue(np.allclose(g.vec1, r.vec1, atol=1e-12))
+        self.assertTrue(np.allclose(g.vec2, r.vec2, atol=1e-12))
+
+    def test_interpolate_frequency(self):
+        """:: Band limited interpolation is exact for the echoes"""
+
+        for F in [40, 39]:
+            f = self.f[:F]
+            T = 1.0 / (F * 50e6)
+            self.tau = T * np.array([-3, 1, 12])
+            (fine, ff) = nss.interpolate_frequency(self.stack(f), f, 5)
+            self.assertEqual(len(ff), 5 * (F - 1) + 1)
+
+            r = self.stack(ff)
+            self.assertTrue(np.allclose(fine.vec1, r.vec1, atol=1e-10))
+            self.assertTrue(np.allclose(fine.vec2, r.vec2, atol=1e-10))
+
+    def test_interpolate_frequency_identity(self):
+        """:: A factor of 1 returns the input for odd and even F"""
+
+        rnd = np.random.RandomState(5)
+        NC = (self.nmax + 1) ** 2
+        for F in [40, 39]:
+            f = self.f[:F]
+            v1 = rnd.normal(size=(F, NC)) + 1j * rnd.normal(size=(F, NC))
+            v2 = rnd.normal(size=(F, NC)) + 1j * rnd.normal(size=(F, NC))
+            s = nss.VectorCoefsStack(v1, v2, self.nmax, self.nmax)
+
+            (same, ff) = nss.interpolate_frequency(s, f, 1)
+            self.assertTrue(np.allclose(ff, f, rtol=0, atol=1e-3))
+            self.assertTrue(np.allclose(same.vec1, v1, atol=1e-12))
+            self.assertTrue(np.allclose(same.vec2, v2, atol=1e-12))
@@ -38,6 +38,7 @@ from six.moves import range  #use range instead of xrange
 import numpy as np
 import nearside.spherical as ns
 import nearside.spherical.low_level
+import spherepy as sp
 
 
 class TestSphereLowLevelProbeCorrect(TestCase):
@@ -437,3 +438,130 @@ class TestSphereLowLevelProbeCorrect(TestCase):
         
 
 
+
+    def test_evaluate_pattern_matches_vispht(self):
+        """:: Test evaluate_pattern and pattern_on_grid against vispht
+
+        The coefficient space evaluators must produce the same pattern as 
+        the transform within spherepy.
+        """
+        sll = ns.low_level 
+
+        for (nmax, mmax) in [(12, 9), (15, 15), (7, 1)]:
+            c = sp.random_coefs(nmax, mmax, coef_type=sp.vector)
+            nrows = nmax + 6
+            ncols = 2 * mmax + 4
+            p = sp.vispht(c, nrows, ncols)
+
+            (et, ep) = sll.pattern_on_grid(c.scoef1._vec, c.scoef2._vec,
+                                           nmax, mmax, nrows, ncols)
+
+            self.assertLess(np.max(np.abs(et - p.theta)), 1e-12)
+            self.assertLess(np.max(np.abs(ep - p.phi)), 1e-12)
+
+            theta = np.linspace(0, np.pi, nrows)[:, None] * np.ones(ncols)
+            phi = 2 * np.pi * np.arange(ncols) / ncols * np.ones((nrows, 1))
+            (et, ep) = sll.evaluate_pattern(c.scoef1._vec, c.scoef2._vec,
+                                            nmax, mmax, theta, phi)
+
+            self.assertLess(np.max(np.abs(et.reshape(nrows, ncols) - 
+                                          p.theta)), 1e-12)
+            self.assertLess(np.max(np.abs(ep.reshape(nrows, ncols) - 
+                                          p.phi)), 1e-12)
+
+    def test_wigner_d(self):
+        """:: Test the cached Wigner d(pi/2) tables and wigner_d
+
+        The tables must be orthogonal and wigner_d must match the closed 
+        form of d^1 and reduce to the identity at beta = 0.
+        """
+        sll = ns.low_level 
+
+        for n in [1, 2, 7, 60]:
+            D = sll.wigner_d_pi2(n)
+            diff = np.max(np.abs(np.dot(D, D.T) - np.eye(2 * n + 1)))
+            self.assertLess(diff, 1e-13)
+
+            d0 = sll.wigner_d(n, 0.0)[0]
+            self.assertLess(np.max(np.abs(d0 - np.eye(2 * n + 1))), 1e-13)
+
+        b = 0.77
+        c = np.cos(b)
+        s = np.sin(b)
+        r2 = np.sqrt(2)
+        d1 = np.array([[(1 + c) / 2, s / r2, (1 - c) / 2], 
+                       [-s / r2, c, s / r2], 
+                       [(1 - c) / 2, -s / r2, (1 + c) / 2]])
+        diff = np.max(np.abs(sll.wigner_d(1, b)[0] - d1))
+        self.assertLess(diff, 1e-14)
+
+    def test_translate_probe_mu_plus_minus_one(self):
+        """:: Test translate_probe against translate_mu_plus_minus_one_probe
+
+        For a mu = +-1 probe the general channels are the combinations 
+        vec1 -+ vec2 of the symmetric probe response.
+        """
+        sll = ns.low_level 
+
+        NN = 12
+        p = sp.random_coefs(4, 1, coef_type=sp.vector)
+        p.scoef1._vec[0:5] = 0
+        p.scoef2._vec[0:5] = 0
+        R = sll.translate_mu_plus_minus_one_probe(NN, 
+                                                  np.column_stack(p[:, -1]), 
+                                                  np.column_stack(p[:, 1]), 
+                                                  15.0)
+        P = sll.translate_probe(NN, p.scoef1._vec, p.scoef2._vec, 4, 1, 15.0)
+
+        c = sp.random_coefs(NN, 9, coef_type=sp.vector)
+        (v1, v2) = sll.probe_response(R, c.scoef1._vec, c.scoef2._vec, NN, 9)
+        u = sll.probe_response_general(P, c.scoef1._vec, c.scoef2._vec, 
+                                       NN, 9)
+
+        self.assertLess(np.max(np.abs(u[2] - (v1 - v2))), 1e-12)
+        self.assertLess(np.max(np.abs(u[0] - (v1 + v2))), 1e-12)
+        self.assertLess(np.max(np.abs(u[1])), 1e-12)
+
+    def test_legendre_blocks_operator(self):
+        """:: Test blocks_forward against pattern_on_grid and its adjoint"""
+        sll = ns.low_level
+
+        (nmax, mmax, nrows, ncols) = (10, 7, 22, 18)
+        c = sp.random_coefs(nmax, mmax, coef_type=sp.vector)
+        v1 = c.scoef1._vec
+        v2 = c.scoef2._vec
+
+        theta = np.linspace(0, np.pi, nrows)
+        blocks = sll.legendre_blocks(nmax, mmax, theta, chunk=5)
+        (et, ep) = sll.blocks_forward(v1, v2, blocks, nmax, mmax, ncols)
+        (gt, gp) = sll.pattern_on_grid(v1, v2, nmax, mmax, nrows, ncols)
+        self.assertLess(np.max(np.abs(et - gt)), 1e-13)
+        self.assertLess(np.max(np.abs(ep - gp)), 1e-13)
+
+        r = np.random.normal(size=(2, nrows, ncols, 2)).view(np.complex128)
+        (a1, a2) = sll.blocks_adjoint(r[0, ..., 0], r[1, ..., 0], blocks, 
+                                      nmax, mmax)
+        lhs = np.vdot(et, r[0, ..., 0]) + np.vdot(ep, r[1, ..., 0])
+        rhs = np.vdot(v1, a1) + np.vdot(v2, a2)
+        self.assertLess(abs(lhs - rhs), 1e-10 * abs(lhs))
+
+    def test_phi_fft(self):
+        """:: Test phi_fft in both precisions and with small blocks"""
+        sll = ns.low_level
+
+        g = np.random.normal(size=(3, 5, 16, 2)).view(np.complex128)[..., 0]
+        ref = np.fft.ifft(g, axis=-1) * 16
+        block = sll._fft_block
+        try:
+            sll._fft_block = 20
+            a = sll.phi_fft(g, True)
+            b = sll.phi_fft(g, True, sll.single)
+            c = sll.phi_fft(a, False)
+        finally:
+            sll._fft_block = block
+
+        self.assertEqual(a.dtype, np.complex128)
+        self.assertEqual(b.dtype, np.complex64)
+        self.assertLess(np.max(np.abs(a - ref)), 1e-12)
+        self.assertLess(np.max(np.abs(b - ref)), 1e-5 * np.max(np.abs(ref)))
+        self.assertLess(np.max(np.abs(c / 16 - g)), 1e-12)
@@ -0,0 +1,75 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+           test_sphere_spiral: test spiral scan processing
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+
+from six.moves import range  #use range instead of xrange
+
+import os
+import tempfile
+import numpy as np
+import nearside
+import nearside.spherical as nss
+import spherepy as sp
+
+
+class TestSphereSpiral(TestCase):
+
+    def test_spiral_coefs(self):
+        """:: Test the coefficients of a spiral scan and the saved gridding
+        """
+        sll = nss.low_level
+
+        nmax = 8
+        c = sp.random_coefs(nmax, nmax, coef_type=sp.vector)
+        (theta, phi) = nss.spiral_points(80, 128)
+        (et, ep) = sll.evaluate_pattern(c.scoef1._vec, c.scoef2._vec, 
+                                        nmax, nmax, theta, phi)
+
+        m = nearside.SphericalMeasurementTransverseNonUniform(theta, phi, 
+                                                              et, ep)
+        r = nss.spiral_coefs(m, nmax)
+        self.assertLess(sp.LInf_coef(r - c), 1e-3)
+
+        g = nss.SpiralGridding(theta, phi, nmax + 2, 2 * nmax + 2)
+        (fd, name) = tempfile.mkstemp(suffix='.npz')
+        os.close(fd)
+        try:
+            g.save(name)
+            g2 = nss.SpiralGridding.load(name)
+        finally:
+            os.remove(name)
+
+        # a stack of two frequencies through the reloaded gridding
+        m = nearside.SphericalMeasurementTransverseNonUniform(
+                      theta, phi, np.stack([et, 2 * et]), np.stack([ep, 2 * ep]))
+        s = nss.spiral_coefs(m, nmax, gridding=g2)
+        self.assertEqual(s.shape, (2,))
+        self.assertLess(sp.LInf_coef(s[1] - 2 * r), 1e-12)
+
+        with self.assertRaises(ValueError):
+            nss.SpiralGridding(theta[::-1], phi[::-1], 10, 18)
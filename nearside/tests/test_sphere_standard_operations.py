@@ -37,6 +37,7 @@ from six.moves import range  #use range instead of xrange
 
 import numpy as np
 import os
+import time
 import nearside.spherical as ns
 import spherepy as sp
 import spherepy.file as fl
@@ -363,8 +364,450 @@ class TestSphereStandardOperations(TestCase):
 
                 self.assertLess(diff, 1e-12)
 
+    def test_probe_correct_stack(self):
+        """:: Test probe_correct on a stack against single corrections
+        """
+
+        p_m = sp.random_coefs(5, 1, coef_type=sp.vector)
+        R_python = nss.translate_symmetric_probe(30, p_m, 27,
+                                                 region = nss.external)
+
+        cs = [sp.random_coefs(20, 15, coef_type=sp.vector) for k in range(6)]
+        stack = nss.stack_coefs(cs)
+
+        corrected = nss.probe_correct(stack, R_python)
+        responded = nss.probe_response(corrected, R_python)
+
+        self.assertEqual(corrected.shape, (6,))
+        for k in range(6):
+            diff = sp.LInf_coef(corrected[k] - nss.probe_correct(cs[k], 
+                                                                 R_python))
+            self.assertLess(diff, 1e-12)
+            diff = sp.LInf_coef(responded[k] - cs[k])
+            self.assertLess(diff, 1e-12)
+
+    def test_single_precision(self):
+        """:: Test the single precision path against double precision
+        """
+
+        p_m = sp.random_coefs(5, 1, coef_type=sp.vector)
+        R_python = nss.translate_symmetric_probe(40, p_m, 27,
+                                                 region = nss.external)
+
+        cs = [sp.random_coefs(30, 30, coef_type=sp.vector) for k in range(4)]
+        stack = nss.stack_coefs(cs)
+        stack32 = stack.astype(np.complex64)
+
+        c64 = nss.probe_correct(stack, R_python)
+        c32 = nss.probe_correct(stack32, R_python, precision = nss.single)
+        self.assertEqual(c32.dtype, np.complex64)
 
+        err = np.max(np.abs(c64.vec1 - c32.vec1)) / np.max(np.abs(c64.vec1))
+        self.assertLess(err, 1e-5)
+
+        theta = np.linspace(0, np.pi, 31)
+        d64 = nss.directivity(stack, theta, 0.4)
+        d32 = nss.directivity(stack32, theta, 0.4, precision = nss.single)
+        self.assertLess(np.max(np.abs(d64 - d32)) / np.max(d64), 1e-5)
+
+        p64 = nss.radiated_power(stack)
+        p32 = nss.radiated_power(stack32)
+        self.assertLess(np.max(np.abs(p64 - p32) / p64), 1e-6)
+
+    def test_truncate_coefs(self):
+        """:: Test truncate_coefs and truncate = 'auto'
         
-             
-           
-                    
\ No newline at end of file
+        A pattern with nmax = 8, mmax = 4 is embedded in a larger set of 
+        coefficients, truncation must find it again.
+        """
+
+        c = sp.zeros_coefs(30, 30, coef_type=sp.vector)
+        small = sp.random_coefs(8, 4, coef_type=sp.vector)
+        for n in range(1, 9):
+            for m in range(-min(n, 4), min(n, 4) + 1):
+                c[n, m] = small[n, m]
+
+        self.assertEqual(nss.truncation_orders(c), (8, 4))
+
+        t = nss.truncate_coefs(c)
+        self.assertEqual((t.nmax, t.mmax), (8, 4))
+        self.assertLess(sp.LInf_coef(t - small), 1e-15)
+
+        s = nss.truncate_coefs(nss.stack_coefs([c, c]), nmax = 10, mmax = 6)
+        self.assertEqual((s.nmax, s.mmax, s.shape), (10, 6, (2,)))
+
+        d = nss.directivity(c, 0.3, 0.2)
+        dt = nss.directivity(c, 0.3, 0.2, truncate = 'auto')
+        self.assertAlmostEqual(d, dt, places=12)
+
+    def test_mode_budget(self):
+        """:: Test mode_budget
+        """
+
+        (NN, mmax, pn) = nss.mode_budget(30, 1e-6)
+        self.assertEqual(NN, mmax)
+        self.assertGreater(NN, 30)
+        self.assertIsNone(pn)
+
+        (NN2, mmax2, pn2) = nss.mode_budget(30, 1e-3, krho0 = 5, 
+                                            probe_kr = 2)
+        self.assertLess(NN2, NN)
+        self.assertLess(mmax2, NN2)
+        self.assertLess(pn2, NN2)
+
+    def test_radiated_power_parseval(self):
+        """:: Test radiated_power against an integral of the pattern
+
+        The pattern is integrated over the sphere with Gauss-Legendre 
+        quadrature in theta and uniform sampling in phi.
+        """
+
+        c = sp.random_coefs(12, 10, coef_type=sp.vector)
+
+        (x, w) = np.polynomial.legendre.leggauss(30)
+        phi = 2 * np.pi * np.arange(32) / 32
+        (T, P) = np.meshgrid(np.arccos(x), phi, indexing='ij')
+        (et, ep) = nss.low_level.evaluate_pattern(c.scoef1._vec, 
+                                                  c.scoef2._vec, 12, 10, T, P)
+        I = (np.abs(et) ** 2 + np.abs(ep) ** 2).reshape(30, 32)
+        power = np.sum(np.sum(I, axis=1) * w) * 2 * np.pi / 32
+
+        self.assertAlmostEqual(nss.radiated_power(c) / power, 1, places=12)
+
+    def test_directivity_dipole(self):
+        """:: Test directivity and peak_directivity of a Hertzian dipole
+
+        A z directed dipole has a directivity of 1.5 at theta = 90 deg and
+        no radiation at boresight.
+        """
+
+        c = sp.zeros_coefs(5, 5, coef_type=sp.vector)
+        c.scoef2[1, 0] = 1.0
+
+        self.assertAlmostEqual(nss.directivity(c, np.pi / 2, 0.3), 1.5, 
+                               places=13)
+        self.assertAlmostEqual(nss.directivity(c), 0, places=13)
+
+        (d, theta, phi) = nss.peak_directivity(c)
+        self.assertAlmostEqual(d, 1.5, places=13)
+        self.assertAlmostEqual(theta, np.pi / 2, places=13)
+
+        self.assertAlmostEqual(nss.gain(c, 0.5, np.pi / 2), 0.75, places=13)
+
+    def test_directivity_stack(self):
+        """:: Test directivity and peak_directivity on a VectorCoefsStack
+
+        Results for a stack must match the results for the individual sets
+        and the peak must agree with a densely sampled pattern.
+        """
+
+        c = [sp.random_coefs(10, 8, coef_type=sp.vector) for k in range(4)]
+        s = nss.stack_coefs(c)
+
+        theta = np.linspace(0, np.pi, 7)
+        d = nss.directivity(s, theta, 0.2)
+        self.assertEqual(d.shape, (4, 7))
+
+        (dp, tp, pp) = nss.peak_directivity(s)
+
+        for k in range(4):
+            dk = nss.directivity(c[k], theta, 0.2)
+            self.assertLess(np.max(np.abs(d[k] - dk)), 1e-12)
+
+            p = sp.vispht(c[k], 200, 400)
+            I = np.abs(p.theta) ** 2 + np.abs(p.phi) ** 2
+            dense = 4 * np.pi * np.max(I) / nss.radiated_power(c[k])
+            self.assertLess(np.abs(dp[k] - dense) / dense, 1e-2)
+            self.assertGreaterEqual(dp[k], dense * (1 - 1e-9))
+
+            self.assertAlmostEqual(dp[k], nss.directivity(c[k], tp[k], pp[k]),
+                                   places=12)
+
+    def test_peak_directivity_large_stack(self):
+        """:: Test peak_directivity on a stack of 1000 sets
+
+        The peaks must match a brute force search on a dense grid and the 
+        whole stack must take a few seconds at most.
+        """
+
+        np.random.seed(7)
+        c = [sp.random_coefs(10, 8, coef_type=sp.vector) for k in range(1000)]
+        s = nss.stack_coefs(c)
+
+        t = time.time()
+        (dp, tp, pp) = nss.peak_directivity(s)
+        self.assertLess(time.time() - t, 10.0)
+        self.assertEqual(dp.shape, (1000,))
+
+        for k in range(0, 1000, 50):
+            p = sp.vispht(c[k], 200, 400)
+            I = np.abs(p.theta) ** 2 + np.abs(p.phi) ** 2
+            dense = 4 * np.pi * np.max(I) / nss.radiated_power(c[k])
+            self.assertGreaterEqual(dp[k], dense * (1 - 1e-9))
+            self.assertLess(dp[k], dense * (1 + 1e-2))
+            self.assertAlmostEqual(dp[k], nss.directivity(c[k], tp[k], pp[k]),
+                                   places=12)
+
+
+    def test_probe_correct_general(self):
+        """:: Test probe correction with a higher order probe 
+
+        The response of a probe with modes up to mu = 3 is sampled on a grid
+        in theta, phi and chi; correcting the sampled data must give the 
+        original coefficients back.
+        """
+
+        p = sp.random_coefs(5, 3, coef_type=sp.vector)
+        P = nss.translate_probe(16, p, 20.0)
+        self.assertEqual(P.shape, (7, 17, 2))
+
+        cs = [sp.random_coefs(16, 12, coef_type=sp.vector) for k in range(2)]
+        stack = nss.stack_coefs(cs)
+
+        u = nss.probe_response_general(stack, P)
+        data = nss.grid_from_channel_coefs(u, 8, 20, 28)
+        self.assertEqual(data.shape, (2, 8, 20, 28))
+
+        um = nss.channel_coefs_from_grid(data, 16, 12, 3)
+        self.assertLess(np.max(np.abs(um.u - u.u)), 1e-11)
+
+        corrected = nss.probe_correct_general(um, P)
+        for k in range(2):
+            n1 = cs[k].scoef1._vec[1:]
+            self.assertLess(np.max(np.abs(corrected.vec1[k, 1:] - n1)), 1e-10)
+            n2 = cs[k].scoef2._vec[1:]
+            self.assertLess(np.max(np.abs(corrected.vec2[k, 1:] - n2)), 1e-10)
+
+        single = nss.probe_correct_general(nss.ChannelCoefs(um.u[0], 16, 12),
+                                           P)
+        diff = np.max(np.abs(single.scoef1._vec - corrected.vec1[0]))
+        self.assertLess(diff, 1e-12)
+
+    def test_rotate(self):
+        """:: Test rotate against rotate_around_y_by_pi and its inverse
+        """
+
+        c = sp.random_coefs(25, 18, coef_type=sp.vector)
+
+        r = nss.rotate(c, 0, np.pi, 0)
+        self.assertEqual(r.mmax, 18)
+        self.assertLess(sp.LInf_coef(r - nss.rotate_around_y_by_pi(c)), 1e-12)
+
+        r = nss.rotate(c, 0.3, 1.1, -0.8)
+        self.assertEqual(r.mmax, 25)
+        b = nss.rotate(r, 0.8, -1.1, -0.3)
+        bt = nss.truncate_coefs(b, nmax = 25, mmax = 18)
+        self.assertLess(sp.LInf_coef(bt - c), 1e-12)
+        diff = nss.radiated_power(b) - nss.radiated_power(bt)
+        self.assertLess(abs(diff) / nss.radiated_power(b), 1e-12)
+
+        stack = nss.stack_coefs([c, c * 2])
+        rs = nss.rotate(stack, 0.3, 1.1, -0.8)
+        self.assertLess(sp.LInf_coef(rs[1] - r * 2), 1e-12)
+
+    def test_translate_z(self):
+        """:: Test translate_z on an offset antenna
+
+        A small antenna moved off the origin needs many modes; moving the 
+        origin back onto it must recover the original compact coefficients.
+        """
+
+        c = sp.random_coefs(3, 2, coef_type=sp.vector)
+        kd = 8.0
+
+        offset = nss.translate_z(c, -kd)
+        self.assertGreater(offset.nmax, 10)
+
+        theta = np.linspace(0, np.pi, 7)
+        phi = np.linspace(0, 2 * np.pi, 7)
+        (et0, ep0) = nss.low_level.evaluate_pattern(c.scoef1._vec, 
+                                                    c.scoef2._vec, 3, 2, 
+                                                    theta, phi)
+        (et1, ep1) = nss.low_level.evaluate_pattern(offset.scoef1._vec, 
+                                                    offset.scoef2._vec,
+                                                    offset.nmax, 2, 
+                                                    theta, phi)
+        ph = np.exp(-1j * kd * np.cos(theta))
+        self.assertLess(np.max(np.abs(et1 - et0 * ph)), 1e-10)
+        self.assertLess(np.max(np.abs(ep1 - ep0 * ph)), 1e-10)
+
+        back = nss.translate_z(nss.stack_coefs([offset, offset]), kd,
+                               truncate = 'auto')
+        self.assertEqual((back.nmax, back.mmax), (3, 2))
+        self.assertLess(sp.LInf_coef(back[1] - c), 1e-6)
+
+    def test_phase_centre(self):
+        """:: Test phase_centre on a Huygens source moved along z
+        """
+
+        c = sp.zeros_coefs(1, 1, coef_type=sp.vector)
+        c.scoef1[1, -1] = 1
+        c.scoef1[1, 1] = 1j
+        c.scoef2[1, -1] = -1
+        c.scoef2[1, 1] = 1j
+
+        flat = nss.phase_flatness(c, [[0, 0, 0], [0, 0, 3.0]], np.pi / 4)
+        self.assertAlmostEqual(flat[0], 1.0, places = 12)
+        self.assertLess(flat[1], 0.99)
+
+        stack = nss.stack_coefs([nss.translate_z(c, -3.7, nmax = 20), 
+                                 nss.translate_z(c, 2.1, nmax = 20)])
+        (kr0, flat) = nss.phase_centre(stack, np.pi / 4)
+        self.assertLess(np.max(np.abs(kr0[:, 2] - [3.7, -2.1])), 1e-3)
+        self.assertLess(np.max(np.abs(kr0[:, 0:2])), 1e-12)
+
+        (kr0, flat) = nss.phase_centre(stack[0], np.pi / 4, axial = False)
+        self.assertLess(np.max(np.abs(kr0 - [0, 0, 3.7])), 1e-3)
+        self.assertGreater(flat, 1 - 1e-8)
+
+    def test_phase_flatness_large_offsets(self):
+        """:: Test phase_flatness of large offsets against a dense midpoint
+        rule over the cone
+        """
+
+        # a displaced Huygens source, |E| has no nulls in the cone
+        h = sp.zeros_coefs(1, 1, coef_type=sp.vector)
+        h.scoef1[1, -1] = 1
+        h.scoef1[1, 1] = 1j
+        h.scoef2[1, -1] = -1
+        h.scoef2[1, 1] = 1j
+        c = nss.translate(h, [1.0, -0.5, 2.0], nmax = 10)
+        offsets = np.array([[5.0, 0, 0], [40.0, 0, 0], [0, 0, 150.0], 
+                            [0, 30.0, -80.0]])
+        theta_max = np.pi / 6
+
+        N = 400
+        theta = (np.arange(N) + 0.5) * theta_max / N
+        phi = (np.arange(2 * N) + 0.5) * np.pi / N
+        (theta, phi) = [a.ravel() for a in np.meshgrid(theta, phi, 
+                                                       indexing = 'ij')]
+        (et, ep) = ns.low_level.evaluate_pattern(c.scoef1._vec, 
+                                                 c.scoef2._vec, 10, 10,
+                                                 theta, phi)
+        fx = et * np.cos(phi) - ep * np.sin(phi)
+        fy = et * np.sin(phi) + ep * np.cos(phi)
+        w = np.sin(theta)
+        if np.sum(w * np.abs(fx) ** 2) >= np.sum(w * np.abs(fy) ** 2):
+            f = fx
+        else:
+            f = fy
+        r = np.stack([np.sin(theta) * np.cos(phi), 
+                      np.sin(theta) * np.sin(phi), np.cos(theta)], axis = -1)
+
+        flat = nss.phase_flatness(c, offsets, theta_max)
+        for k in range(len(offsets)):
+            g = f * np.exp(1j * np.dot(r, offsets[k]))
+            ref = np.abs(np.sum(w * g)) / np.sum(w * np.abs(g))
+            self.assertLess(np.abs(flat[k] - ref), 1e-4)
+
+    def test_translate(self):
+        """:: Test translate against rotate, translate_z, rotate
+        """
+
+        c = sp.random_coefs(10, 6, coef_type=sp.vector)
+        (b, a, kd) = (0.7, 1.9, 3.0)
+
+        r = nss.rotate(c, 0, -b, -a)
+        r = nss.rotate(nss.translate_z(r, kd, nmax = 30), a, b, 0)
+        kr0 = kd * np.array([np.sin(b) * np.cos(a), np.sin(b) * np.sin(a), 
+                             np.cos(b)])
+        t = nss.translate(c, kr0, nmax = 30)
+        self.assertLess(sp.LInf_coef(t - r), 1e-11)
+
+        s = nss.translate(nss.stack_coefs([c, c]), [kr0, -kr0], nmax = 30)
+        self.assertLess(sp.LInf_coef(s[0] - t), 1e-12)
+
+    def test_modal_filter(self):
+        """:: Test that the filter keeps the AUT and removes a reflection
+
+        The reflection only has modes beyond the mode limit of the AUT about
+        its centre, so filtering the sum must give the AUT back.
+        """
+        p = np.array([1.0, -2.0, 3.0])
+        nfilter = ns.low_level.excess_bandwidth_nmax(3.0, 
+                                                     nss.auto_truncation_error)
+
+        r = sp.random_coefs(14, 14, coef_type=sp.vector)
+        (n, _) = ns.low_level.mode_numbers(14, 14)
+        r.scoef1._vec[n <= nfilter] = 0
+        r.scoef2._vec[n <= nfilter] = 0
+
+        aut = nss.translate(sp.random_coefs(4, 4, coef_type=sp.vector), -p,
+                            nmax = 26)
+        refl = nss.translate(r, -p, nmax = 26)
+        self.assertGreater(sp.LInf_coef(refl), 0.1)
+
+        f = nss.modal_filter(aut, p, 3.0)
+        self.assertLess(sp.LInf_coef(f - aut), 1e-12)
+
+        g = nss.modal_filter(aut + refl, p, 3.0)
+        self.assertLess(sp.LInf_coef(g - aut), 1e-12)
+
+        # a sweep, each frequency with its own centre and mode limit
+        s = nss.modal_filter(nss.stack_coefs([aut + refl, aut]),
+                             [p, 1.5 * p], [3.0, 4.5])
+        self.assertLess(sp.LInf_coef(s[0] - aut), 1e-12)
+        self.assertLess(sp.LInf_coef(s[1] - nss.modal_filter(aut, 1.5 * p,
+                                                             4.5)), 1e-12)
+
+        # the factors of a sweep are computed once
+        ns.low_level._modal_filter_cache.clear()
+        nss.modal_filter(nss.stack_coefs([aut, aut]), [p, 1.5 * p], 
+                         [3.0, 4.5])
+        nss.modal_filter(nss.stack_coefs([refl, refl]), [p, 1.5 * p], 
+                         [3.0, 4.5])
+        self.assertEqual(len(ns.low_level._modal_filter_cache), 1)
+
+    def test_truncated_sphere_coefs(self):
+        """:: Test the truncated sphere solver on complete and partial scans
+        """
+        nmax = 12
+        c = sp.random_coefs(nmax, nmax, coef_type=sp.vector)
+        p = sp.vispht(c, 2 * nmax + 4, 2 * nmax + 4)
+
+        r = nss.truncated_sphere_coefs(p, nmax)
+        self.assertLess(sp.LInf_coef(r - c), 1e-4)
+
+        r = nss.truncated_sphere_coefs(p, nmax, theta_max=np.radians(150),
+                                       damp=1e-6, tol=1e-9)
+        self.assertLess(sp.LInf_coef(r - c), 1e-6)
+
+        s = nss.truncated_sphere_coefs((np.stack([p.theta, 2 * p.theta]),
+                                        np.stack([p.phi, 2 * p.phi])), nmax,
+                                       theta_max=np.radians(150), 
+                                       damp=1e-6, tol=1e-9)
+        self.assertLess(sp.LInf_coef(s[1] - 2 * c), 2e-6)
+
+    def test_transmission(self):
+        """:: Test the transmission formula against probe_response
+
+        For a mu = +-1 receiver, chi = 0 and chi = pi / 2 must give the two
+        components of the probe response, for a general receiver the 
+        sampled channel response.
+        """
+        sll = nss.low_level
+
+        aut = sp.random_coefs(12, 10, coef_type=sp.vector)
+        pr = sp.random_coefs(3, 1, coef_type=sp.vector)
+        pr.scoef1._vec[0:4] = 0
+        pr.scoef2._vec[0:4] = 0
+
+        resp = nss.probe_response(aut, nss.translate_symmetric_probe(12, pr, 
+                                                                     30.0))
+        theta = np.array([0.3, 1.2, 2.5])
+        phi = np.array([0.1, 2.0, 4.0])
+        (et, ep) = sll.evaluate_pattern(resp.scoef1._vec, resp.scoef2._vec,
+                                        12, 10, theta, phi)
+
+        w = nss.transmission(aut, pr, 30.0, theta, phi, 
+                             np.array([[0], [np.pi / 2]]))
+        self.assertEqual(w.shape, (2, 3))
+        self.assertLess(np.max(np.abs(w[0] - et)), 1e-12)
+        self.assertLess(np.max(np.abs(w[1] - ep)), 1e-12)
+
+        pr = sp.random_coefs(4, 3, coef_type=sp.vector)
+        u = nss.probe_response_general(aut, nss.translate_probe(12, pr, 30.0))
+        g = nss.grid_from_channel_coefs(u, 8, 15, 26)
+        w = nss.transmission(aut, pr, 30.0, np.pi * 4 / 14, 2 * np.pi * 7 / 26,
+                             2 * np.pi * 3 / 8)
+        self.assertLess(abs(w - g[3, 4, 7]), 1e-12)
@@ -0,0 +1,135 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+            test_sphere_symmetry: test the symmetry-aware operations
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+
+from six.moves import range  #use range instead of xrange
+
+import numpy as np
+import spherepy as sp
+import nearside
+import nearside.spherical as nss
+from nearside.spherical import low_level
+
+symmetries = [nss.e_plane, nss.h_plane, nss.e_and_h_planes,
+              nss.Symmetry(xz=-1), nss.Symmetry(yz=1),
+              nss.Symmetry(xz=-1, yz=-1), nss.body_of_revolution,
+              nss.Symmetry(m=0)]
+
+
+def symmetric_coefs(nmax, symmetry):
+    c = sp.random_coefs(nmax, nmax, coef_type=sp.vector)
+    return nss.reduce_coefs(c, symmetry)
+
+def vectors(c):
+    return (c.scoef1._vec, c.scoef2._vec)
+
+
+class TestSymmetry(TestCase):
+
+    def test_pattern_round_trip(self):
+        """:: Test the transform of the unique columns of a symmetric 
+        pattern"""
+
+        nmax = 9
+        (nrows, ncols) = (nmax + 2, 20)
+        for s in symmetries:
+            c = symmetric_coefs(nmax, s)
+            full = c.full()
+            self.assertLess(nss.symmetry_error(full, s), 1e-12)
+
+            (et, ep) = low_level.pattern_on_grid(full.scoef1._vec,
+                                                 full.scoef2._vec,
+                                                 nmax, nmax, nrows, ncols)
+            cols = s.unique_columns(ncols)
+            (et2, ep2) = s.expand_pattern(et[:, cols], ep[:, cols], ncols)
+            self.assertLess(np.abs(et2 - et).max(), 1e-12)
+            self.assertLess(np.abs(ep2 - ep).max(), 1e-12)
+
+            r = nss.symmetric_coefs_from_pattern(et[:, cols], ep[:, cols],
+                                                 nmax, nmax, s, ncols)
+            self.assertLess(np.abs(r.vec1 - c.vec1).max(), 1e-12)
+            self.assertLess(np.abs(r.vec2 - c.vec2).max(), 1e-12)
+
+    def test_operations(self):
+        """:: Test reciprocity and rotate_around_y_by_pi of SymmetricCoefs 
+        against the full coefficients"""
+
+        nmax = 8
+        for s in symmetries:
+            c = symmetric_coefs(nmax, s)
+            for op in [nss.reciprocity, nss.rotate_around_y_by_pi]:
+                a = vectors(op(c).full())
+                b = vectors(op(c.full()))
+                self.assertLess(np.abs(a[0] - b[0]).max(), 1e-12)
+                self.assertLess(np.abs(a[1] - b[1]).max(), 1e-12)
+
+    def test_probe_correct(self):
+        """:: Test probe_correct of SymmetricCoefs with a probe that has no
+        cross-polar part"""
+
+        nmax = 15
+        probe = symmetric_coefs(nmax, nss.Symmetry(xz=-1, yz=1)).full()
+        R = nss.translate_symmetric_probe(nmax, probe, 10.0)
+        for s in symmetries:
+            c = symmetric_coefs(nmax, s)
+            a = vectors(nss.probe_correct(c, R).full())
+            b = vectors(nss.probe_correct(c.full(), R))
+            self.assertLess(np.abs(a[0] - b[0]).max(), 1e-12)
+            self.assertLess(np.abs(a[1] - b[1]).max(), 1e-12)
+
+        # a probe with a cross-polar part mixes the symmetry classes
+        probe = sp.random_coefs(3, 1, coef_type=sp.vector)
+        R = nss.translate_symmetric_probe(nmax, probe, 10.0)
+        c = symmetric_coefs(nmax, nss.e_and_h_planes)
+        self.assertRaises(ValueError, nss.probe_correct, c, R)
+        self.assertRaises(ValueError, nss.probe_response, c, R)
+
+    def test_measurement(self):
+        """:: Test a measurement that stores only the unique columns"""
+
+        nmax = 9
+        (nrows, ncols) = (nmax + 2, 20)
+        s = nss.e_and_h_planes
+        c = symmetric_coefs(nmax, s)
+        full = c.full()
+        (et, ep) = low_level.pattern_on_grid(full.scoef1._vec,
+                                             full.scoef2._vec,
+                                             nmax, nmax, nrows, ncols)
+        cols = s.unique_columns(ncols)
+        m = nearside.SphericalMeasurementTransverseUniform(
+                (et[:, cols], ep[:, cols]), symmetry=s, ncols=ncols)
+
+        self.assertEqual(m.shape, (nrows, ncols))
+        self.assertEqual(m.unique_pattern[0].shape, (nrows, len(cols)))
+        self.assertLess(np.abs(m.pattern().array[0] - et).max(), 1e-12)
+        r = m.coefficients(nmax)
+        self.assertLess(np.abs(r.vec1 - c.vec1).max(), 1e-12)
+
+        with self.assertRaises(ValueError):
+            nearside.SphericalMeasurementTransverseUniform(
+                (et, ep), symmetry=s, ncols=ncols)
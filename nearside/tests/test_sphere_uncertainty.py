@@ -0,0 +1,88 @@
+# Copyright (C) 2015  Randy Direen <nearside@direentech.com>
+#
+# This file is part of NearSide.
+#
+# NearSide is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# NearSide is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with NearSide.  If not, see <http://www.gnu.org/licenses/>
+
+"""***************************************************************************
+
+        test_sphere_uncertainty: test the Monte Carlo uncertainty engine
+
+***************************************************************************"""
+
+
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from unittest import TestCase
+
+from six.moves import range  #use range instead of xrange
+
+import numpy as np
+import nearside.spherical as nss
+import spherepy as sp
+
+
+class TestSphereUncertainty(TestCase):
+
+    def setUp(self):
+        # a 4 by 4 uniform array of Huygens sources, about -12 dB sidelobes
+        c = sp.zeros_coefs(1, 1, coef_type=sp.vector)
+        c.scoef1[1, -1] = 1
+        c.scoef1[1, 1] = 1j
+        c.scoef2[1, -1] = -1
+        c.scoef2[1, 1] = 1j
+        x = np.pi * (np.arange(4) - 1.5)
+        (X, Y) = np.meshgrid(x, x)
+        pos = np.column_stack([X.ravel(), Y.ravel(), 0 * X.ravel()])
+        self.aut = nss.ElementArray([c] * 16, pos, nmax=14).synthesize(
+                                                              np.ones(16))
+
+        self.probe = sp.random_coefs(3, 1, coef_type=sp.vector)
+        self.kr = 30.0
+        R = nss.translate_symmetric_probe(14, self.probe, self.kr)
+        self.measured = nss.probe_response(self.aut, R)
+
+    def test_no_perturbation(self):
+        """:: Without errors every trial is the exact pattern"""
+
+        r = nss.monte_carlo_uncertainty(self.measured, self.probe, self.kr,
+                                        trials=5, batch=2, seed=0)
+
+        peak = 10 * np.log10(nss.directivity(self.aut, 0.0, 0.0))
+        self.assertAlmostEqual(np.max(np.abs(r['cut_peak_gain'] - peak)), 0, 
+                               places=8)
+        self.assertEqual(r['gain'].shape, (3, len(r['theta'])))
+        self.assertTrue(np.ptp(r['sidelobe_level']) < 1e-8)
+        self.assertTrue(-14 < r['sidelobe_level'][1] < -10)
+
+    def test_bands(self):
+        """:: The bands widen with the errors and are reproducible"""
+
+        args = (self.measured, self.probe, self.kr)
+        r1 = nss.monte_carlo_uncertainty(*args, trials=200, noise=1e-3,
+                                         probe_error=1e-3, seed=1)
+        r2 = nss.monte_carlo_uncertainty(*args, trials=200, noise=1e-2,
+                                         probe_error=1e-2, radius_error=0.1,
+                                         seed=1)
+        r3 = nss.monte_carlo_uncertainty(*args, trials=200, noise=1e-2,
+                                         probe_error=1e-2, radius_error=0.1,
+                                         seed=1)
+
+        w1 = np.ptp(r1['cut_peak_gain'])
+        w2 = np.ptp(r2['cut_peak_gain'])
+        self.assertTrue(0 < w1 < w2)
+        self.assertTrue(np.all(np.diff(r2['gain'], axis=0) >= 0))
+        self.assertEqual(len(r2['cut_peak_gain_trials']), 200)
+        self.assertTrue(np.array_equal(r2['cut_peak_gain'], r3['cut_peak_gain']))
@@ -31,12 +31,16 @@ Note about NumPy:
 
 import os
 import sys
-import json
 
 here = os.path.abspath(os.path.dirname(__file__))
 
-with open(os.path.join(here, 'nearside/pkg_info.json')) as fp:
-    _info = json.load(fp)
+# The package information lives in a python module so that nearside doesn't
+# need to read a data file when it is imported. It can't be imported here
+# (that would require the dependencies to be installed), so execute it.
+_pkg_info = {}
+with open(os.path.join(here, 'nearside/_pkg_info.py')) as fp:
+    exec(fp.read(), _pkg_info)
+_info = _pkg_info['info']
 
 def readme():
     with open('README.md') as f:
@@ -56,6 +60,18 @@ except ImportError:
           "setuptools")
     sys.exit(1)
 
+from setuptools.command.build_py import build_py
+
+class BuildPy(build_py):
+    """The watch-folder service is written with async def and asyncio.run, 
+    leave it out of builds for interpreters that can't compile it."""
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 7):
+            modules = [m for m in modules if m[:2] != ('nearside', 'service')]
+        return modules
+
 description = 'A package for processing antenna near-field measurements.'
  
 """ ***IMPORTANT*** note about distutils
@@ -90,12 +106,16 @@ setup(name='nearside',
       url='https://github.com/rdireen/nearside',  # url to github repo
       download_url=__download_url__,
       license='GPLv3',
-      install_requires=['six','spherepy'],
+      # concurrent.futures (the thread and process pools of file_handler,
+      # pipeline and service) is in the standard library from Python 3.2
+      install_requires=['six','spherepy',
+                        'futures; python_version < "3.2"'],
       keywords=['near-field antenna measurments planar spherical cylindrical'],
       packages=['nearside','nearside.spherical','nearside.planar','nearside.cylindrical'],
       package_dir={'nearside':'nearside', 'test':'nearside/test'},
-      package_data={'nearside':['pkg_info.json']},
       include_package_data=True,
+      cmdclass={'build_py': BuildPy},
+      entry_points={'console_scripts': ['nearside = nearside.cli:main']},
       test_suite='nose.collector',
       tests_require=['nose']
      )